@@ -1,8 +1,8 @@
 # -*- coding: utf-8 -*-
 # flake8: NOQA
-from parglare.parser import Parser, Token, pos_to_line_col, \
-    Node, NodeTerm, NodeNonTerm
-from parglare.tables import LALR, SLR, SHIFT, REDUCE, ACCEPT
+from parglare.parser import Parser, Token, TokenStream, pos_to_line_col, \
+    pos_to_line_cols, Node, NodeTerm, NodeNonTerm
+from parglare.tables import LALR, LALR_DP, SLR, SHIFT, REDUCE, ACCEPT
 from parglare.glr import GLRParser
 from parglare.grammar import Grammar, NonTerminal, Terminal, \
     RegExRecognizer, StringRecognizer, EMPTY, EOF, STOP
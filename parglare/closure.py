@@ -1,10 +1,11 @@
+from collections import deque
 from parglare.grammar import EMPTY, NonTerminal
 
 LR_0 = 0
 LR_1 = 1
 
 
-def closure(state, itemset_type, first_sets=None):
+def closure(state, itemset_type, first_sets=None, closure_cache=None):
     """
     For the given LRState calculates its LR(0)/LR(1) itemset closure.
 
@@ -12,57 +13,78 @@ def closure(state, itemset_type, first_sets=None):
     state(LRState):
     itemset_type(int): LR_0 or LR_1
     first_sets(dict of sets): Used in LR_1 itemsets calculation.
+    closure_cache(dict): Used to reuse LR(0) closures of states with the same
+        non-terminals after the dot in kernel items.
     """
     from parglare.tables import LRItem
 
-    while True:
-
-        has_additions = False
-        to_add = []
-        for item in state.items:
-            gs = item.symbol_at_position
-            if isinstance(gs, NonTerminal):
-                for p in state.grammar.productions:
-
-                    if p.symbol == gs:
-
-                        if itemset_type is LR_1:
-                            # Calculate follow set that is possible after the
-                            # non-terminal at the given position of the current
-                            # item.
-                            follow = _new_item_follow(item, first_sets)
-                            new_item = LRItem(p, 0, follow)
-                        else:
-                            new_item = LRItem(p, 0)
-
-                        if new_item not in state.items \
-                                and new_item not in to_add:
-
-                            # If the item doesn't exists yet add it.
-                            to_add.append(new_item)
-                            has_additions = True
-
-                        else:
-                            # If the item already exists, this newly created
-                            # item might still have a wider follows set. If so,
-                            # update with the current new item follows set if
-                            # we are building LR_1 items set.
-                            if itemset_type is LR_1:
-                                try:
-                                    existing_item = state.items[
-                                        state.items.index(new_item)]
-                                except ValueError:
-                                    existing_item = to_add[
-                                        to_add.index(new_item)]
-
-                                if not follow.issubset(existing_item.follow):
-                                    existing_item.follow.update(follow)
-                                    has_additions = True
-
-        if has_additions:
-            state.items.extend(to_add)
-        else:
-            break
+    productions_per_symbol = state.grammar.productions_per_symbol
+
+    # Non-kernel items depend only on the non-terminals at the position of
+    # kernel items and their order.
+    kernel_symbols = []
+    for item in state.items:
+        if item.is_kernel:
+            symbol = item.symbol_at_position
+            if isinstance(symbol, NonTerminal) \
+                    and symbol not in kernel_symbols:
+                kernel_symbols.append(symbol)
+    kernel_symbols = tuple(kernel_symbols)
+
+    closure_prods = None
+    if closure_cache is not None:
+        closure_prods = closure_cache.get(kernel_symbols)
+    if closure_prods is None:
+        closure_prods = _closure_productions(kernel_symbols,
+                                             productions_per_symbol)
+        if closure_cache is not None:
+            closure_cache[kernel_symbols] = closure_prods
+
+    # Non-kernel items are at position 0 so they are identified by production.
+    items_per_prod = dict((i.production.prod_id, i) for i in state.items
+                          if i.position == 0)
+    for prod in closure_prods:
+        if prod.prod_id not in items_per_prod:
+            new_item = LRItem(prod, 0)
+            items_per_prod[prod.prod_id] = new_item
+            state.items.append(new_item)
+
+    if itemset_type is LR_1:
+        # Propagate follow sets to the items created by the non-terminal at
+        # the position. Items whose follow set is changed are revisited.
+        to_visit = deque(state.items)
+        while to_visit:
+            item = to_visit.popleft()
+            symbol = item.symbol_at_position
+            if isinstance(symbol, NonTerminal):
+                # Calculate follow set that is possible after the
+                # non-terminal at the given position of the current item.
+                follow = _new_item_follow(item, first_sets)
+                for prod in productions_per_symbol[symbol]:
+                    new_item = items_per_prod[prod.prod_id]
+                    if not follow.issubset(new_item.follow):
+                        new_item.follow.update(follow)
+                        to_visit.append(new_item)
+
+
+def _closure_productions(symbols, productions_per_symbol):
+    """
+    Returns a list of productions of non-kernel items for the given
+    non-terminals found at the position of kernel items. Productions are in the
+    order items are added to the closure.
+    """
+    closure_prods = []
+    symbols = list(symbols)
+    visited = set(symbols)
+    for symbol in symbols:
+        for prod in productions_per_symbol[symbol]:
+            closure_prods.append(prod)
+            first_symbol = prod.rhs[0]
+            if isinstance(first_symbol, NonTerminal) \
+                    and first_symbol not in visited:
+                visited.add(first_symbol)
+                symbols.append(first_symbol)
+    return closure_prods
 
 
 def _new_item_follow(item, first_sets):
@@ -1,12 +1,18 @@
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals, print_function
+import re
 import sys
+from array import array
+from mmap import mmap
 from parglare.termui import s_attention as _a
 
+# Binary input is parsed as bytes, see `Parser.parse_file`.
 if sys.version < '3':
     text = unicode  # NOQA
+    binary = (bytearray, mmap)
 else:
     text = str
+    binary = (bytes, bytearray, mmap)
 
 
 class Location(object):
@@ -27,16 +33,17 @@ class Location(object):
     """
 
     __slots__ = ['file_name', 'start_position', 'end_position', '_line',
-                 '_column', 'input_str']
+                 '_column', 'input_str', 'line_starts']
 
     def __init__(self, context=None, file_name=None, start_position=None,
-                 end_position=None, input_str=None):
+                 end_position=None, input_str=None, line_starts=None):
 
         if not context:
             self.file_name = file_name
             self.start_position = start_position
             self.end_position = end_position
             self.input_str = input_str
+            self.line_starts = line_starts
         else:
             self.file_name = file_name if file_name else context.file_name
             self.start_position = start_position \
@@ -45,6 +52,8 @@ class Location(object):
                 if end_position is not None else context.end_position
             self.input_str = input_str \
                 if input_str is not None else context.input_str
+            self.line_starts = line_starts \
+                if line_starts is not None else context_line_starts(context)
 
         # Evaluate this only when string representation is needed.
         # E.g. during error reporting
@@ -67,7 +76,8 @@ class Location(object):
         if self.input_str and self.start_position is not None:
             from parglare.parser import pos_to_line_col
             self._line, self._column = pos_to_line_col(self.input_str,
-                                                       self.start_position)
+                                                       self.start_position,
+                                                       self.line_starts)
 
     def __str__(self):
         line, column = self.line, self.column
@@ -90,12 +100,75 @@ def position_context(input_str, position):
     Returns position context string.
     """
     start = max(position-10, 0)
-    c = text(input_str[start:position]) + _a("*") \
-        + text(input_str[position:position+10])
+    before = input_str[start:position]
+    after = input_str[position:position+10]
+    if isinstance(before, binary):
+        before = before.decode('utf-8', 'replace')
+        after = after.decode('utf-8', 'replace')
+    c = text(before) + _a("*") + text(after)
     c = c.replace("\n", "\\n")
     return c
 
 
+_NEWLINE = re.compile('\n')
+_NEWLINE_BYTES = re.compile(b'\n')
+
+
+class LineStarts(object):
+    """
+    Index of the start positions of the lines of the textual or binary input.
+    The index is kept by the owner of the input, e.g. the parsing context (see
+    `context_line_starts`), so that converting many positions to lines and
+    columns doesn't rescan the input. Newlines are searched only as far as
+    needed, doubling the searched part each time.
+
+    Attributes:
+    input_str(str or bytes): The indexed input.
+    """
+    __slots__ = ['input_str', '_starts', '_newline', '_searched']
+
+    def __init__(self, input_str):
+        self.input_str = input_str
+        self._starts = array('l', [0])
+        if type(input_str) is text:
+            self._newline = _NEWLINE
+        elif isinstance(input_str, binary):
+            self._newline = _NEWLINE_BYTES
+        else:
+            self._newline = None
+        # Newlines are found in the input up to this position.
+        self._searched = 0
+
+    def starts(self, position):
+        """
+        Returns the array of line start positions which has all lines starting
+        up to the given position, or `None` for other than textual or binary
+        input.
+        """
+        if self._newline is None:
+            return None
+        searched = self._searched
+        if position > searched:
+            end = min(max(position, 2 * searched, 4096), len(self.input_str))
+            self._starts.extend(
+                m.end() for m in self._newline.finditer(self.input_str,
+                                                        searched, end))
+            self._searched = end
+        return self._starts
+
+
+def context_line_starts(context):
+    """
+    Returns the line start index of the input of the given parsing context.
+    The index is kept in the context as long as its input is the same.
+    """
+    input_str = getattr(context, 'input_str', None)
+    line_starts = getattr(context, 'line_starts', None)
+    if line_starts is None or line_starts.input_str is not input_str:
+        line_starts = context.line_starts = LineStarts(input_str)
+    return line_starts
+
+
 def load_python_module(mod_name, mod_path):
     """
     Loads Python module from an arbitrary location.
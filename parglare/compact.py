@@ -0,0 +1,275 @@
+# -*- coding: utf-8 -*-
+"""
+Compact LR tables.
+
+LR table states are rather big objects as they keep LR items, follow sets and
+dicts of `Action` objects. For LR parsing only a single action per state and
+terminal is needed so the table can be encoded in a few integer arrays.
+
+Terminals and non-terminals are numbered densely. ACTION and GOTO tables are
+sparse matrices whose rows (states) are packed in a single array by row
+displacement: each distinct row gets a base offset such that its entries don't
+collide with entries of other rows. The entry for the column `c` of the row
+`r` is at `base[r] + c` and it is valid only if `check[base[r] + c] == c`.
+"""
+from __future__ import unicode_literals
+from array import array
+from .tables import SHIFT, REDUCE, ACCEPT
+from .termui import prints, a_print, h_print
+
+# The number of free slots tried for a row before it is placed at the end.
+DISPLACEMENT_TRIES = 64
+
+# Actions are encoded as integers. Two lowest bits are for the action type
+# (SHIFT, REDUCE or ACCEPT + 1) while the rest is for the target state id or
+# production id. Zero is reserved for errors (no action).
+ACTION_BITS = 2
+ACTION_MASK = 3
+
+
+def encode_action(action, target):
+    return (target << ACTION_BITS) | (action + 1)
+
+
+def decode_action(code):
+    """
+    Returns a tuple (action, target) for the given action code.
+    """
+    return (code & ACTION_MASK) - 1, code >> ACTION_BITS
+
+
+class CompactTable(object):
+    """
+    LR table encoded in integer arrays. Used by LR parser for deterministic
+    parsing. It is created from LRTable by `create_compact_table`.
+
+    Attributes:
+    grammar(Grammar):
+    terminals(list of Terminal): Terminals indexed by their id.
+    terminal_ids(dict): Terminal ids keyed by Terminal.
+    nonterminals(list of NonTerminal): Non-terminals indexed by their id.
+    productions(list of Production): Grammar productions indexed by prod_id.
+    prod_lengths(array): RHS length of each production.
+    prod_symbols(array): Non-terminal id of each production LHS symbol.
+    state_terminals(list of tuples): Terminals expected in each state in the
+        order of recognition.
+    finish_flags(list of tuples): Finish flags of each state. Indexed the
+        same as `state_terminals`.
+    action_base, action_check, action_value(array): Row displaced ACTION
+        table. Values are action codes (see `decode_action`).
+    goto_base, goto_check, goto_value(array): Row displaced GOTO table.
+        Values are state ids.
+    default_actions(array): Action code of the default reduction of each
+        state or 0 (see `LRState.default_reduction`).
+    start_states(dict): Start state ids keyed by the start production id.
+    """
+    def __init__(self, grammar, terminals, nonterminals, state_terminals,
+                 finish_flags, actions, gotos, start_states,
+                 default_actions=None):
+        self.grammar = grammar
+        self.start_states = start_states
+        self.terminals = terminals
+        self.terminal_ids = dict((t, idx) for idx, t in enumerate(terminals))
+        self.nonterminals = nonterminals
+        self.productions = grammar.productions
+        nonterminal_ids = dict((n, idx) for idx, n in enumerate(nonterminals))
+        self.prod_lengths = array('i', [len(p.rhs)
+                                        for p in self.productions])
+        self.prod_symbols = array('i', [nonterminal_ids[p.symbol]
+                                        for p in self.productions])
+        self.state_terminals = state_terminals
+        self.finish_flags = finish_flags
+        self.action_base, self.action_check, self.action_value = \
+            displace_rows(actions, len(terminals))
+        self.goto_base, self.goto_check, self.goto_value = \
+            displace_rows(gotos, len(nonterminals))
+        self.default_actions = array('i', default_actions
+                                     or [0] * len(actions))
+
+        # Compact tables are built only for tables without unhandled
+        # conflicts.
+        self.sr_conflicts = []
+        self.rr_conflicts = []
+
+    @property
+    def states_count(self):
+        return len(self.action_base)
+
+    def action(self, state_id, terminal):
+        """
+        Returns the action code for the given state and terminal or 0 if there
+        is no action.
+        """
+        term_id = self.terminal_ids.get(terminal)
+        if term_id is None:
+            return 0
+        idx = self.action_base[state_id] + term_id
+        if self.action_check[idx] == term_id:
+            return self.action_value[idx]
+        return 0
+
+    def goto(self, state_id, nonterminal_id):
+        """
+        Returns the state id for the given state and non-terminal id or -1 if
+        there is no GOTO entry.
+        """
+        idx = self.goto_base[state_id] + nonterminal_id
+        if self.goto_check[idx] == nonterminal_id:
+            return self.goto_value[idx]
+        return -1
+
+    def print_debug(self):
+        a_print("*** COMPACT TABLE ***", new_line=True)
+        h_print("States:", self.states_count)
+        h_print("Terminals:", len(self.terminals))
+        h_print("Non-terminals:", len(self.nonterminals))
+        h_print("ACTION entries:", len(self.action_value))
+        h_print("GOTO entries:", len(self.goto_value))
+        names = {SHIFT: 'SHIFT', REDUCE: 'REDUCE', ACCEPT: 'ACCEPT'}
+        for state_id in range(self.states_count):
+            acts = []
+            for terminal in self.state_terminals[state_id]:
+                action, target = decode_action(self.action(state_id,
+                                                           terminal))
+                acts.append('{}->{}:{}'.format(terminal, names[action],
+                                               target))
+            prints('\tState {}: {}'.format(state_id, ', '.join(acts)))
+
+
+def create_compact_table(table):
+    """
+    Creates CompactTable from the given LRTable.
+
+    For each state and terminal only the action the LR parser would take is
+    kept, i.e. the first action or, if the first action is an EMPTY reduction,
+    the next one.
+    """
+    grammar = table.grammar
+    terminals = sorted(set(t for state in table.states
+                           for t in state.actions), key=lambda t: t.fqn)
+    terminal_ids = dict((t, idx) for idx, t in enumerate(terminals))
+    nonterminals = sorted(set(p.symbol for p in grammar.productions),
+                          key=lambda n: n.fqn)
+    nonterminal_ids = dict((n, idx) for idx, n in enumerate(nonterminals))
+
+    # Identical tuples are shared between states.
+    interned = {}
+
+    def intern(t):
+        return interned.setdefault(t, t)
+
+    state_terminals = []
+    finish_flags = []
+    actions = []
+    gotos = []
+    default_actions = []
+    for state in table.states:
+        state_terminals.append(intern(tuple(state.actions)))
+        finish_flags.append(intern(tuple(state.finish_flags)))
+        row = []
+        for terminal, acts in state.actions.items():
+            act = acts[0]
+            if len(acts) > 1 and act.action is REDUCE \
+                    and len(act.prod.rhs) == 0:
+                act = acts[1]
+            if act.action is REDUCE:
+                code = encode_action(REDUCE, act.prod.prod_id)
+            else:
+                code = encode_action(act.action, act.state.state_id)
+            row.append((terminal_ids[terminal], code))
+        actions.append(row)
+        gotos.append([(nonterminal_ids[n], target.state_id)
+                      for n, target in state.gotos.items()])
+        default_actions.append(
+            0 if state.default_reduction is None
+            else encode_action(REDUCE, state.default_reduction.prod_id))
+
+    start_states = dict((prod_id, state.state_id)
+                        for prod_id, state in table.start_states.items())
+
+    return CompactTable(grammar, terminals, nonterminals, state_terminals,
+                        finish_flags, actions, gotos, start_states,
+                        default_actions)
+
+
+def displace_rows(rows, columns):
+    """
+    Packs the given sparse rows by row displacement.
+
+    Args:
+    rows(list of lists): Each row is a list of (column, value) pairs.
+    columns(int): Number of columns.
+
+    Returns:
+    A tuple of arrays (base, check, value). Identical rows share the same
+    base. Arrays are padded so that `base[r] + c` is a valid index for each
+    row `r` and column `c < columns`.
+    """
+    base = array('i', [0] * len(rows))
+    check = array('i')
+    value = array('i')
+    # Occupied slots and used bases. Bytearrays are used for a fast search of
+    # free slots.
+    occupied = bytearray()
+    used_bases = bytearray()
+    bases_per_row = {}
+    # Rows with the same columns fit only after the last base used for
+    # the columns so the search continues from there.
+    next_base_per_columns = {}
+
+    # Place the rows with the most entries first as they are the hardest to
+    # fit.
+    order = sorted(range(len(rows)), key=lambda r: -len(rows[r]))
+    for row_idx in order:
+        row = tuple(sorted(rows[row_idx]))
+        if row in bases_per_row:
+            base[row_idx] = bases_per_row[row]
+            continue
+
+        # Find the first base where all columns are free. Bases must be unique
+        # as entries are checked only by the column. Candidate bases are
+        # those where the first column falls in a free slot. To keep
+        # packing fast the row is placed at the end if it doesn't fit in the
+        # first few free slots.
+        first_col = row[0][0] if row else 0
+        row_columns = tuple(c for c, _ in row)
+        slot = first_col + next_base_per_columns.get(row_columns, 0)
+        tries = 0
+        while True:
+            if slot < len(occupied):
+                if tries < DISPLACEMENT_TRIES:
+                    slot = occupied.find(b'\x00', slot)
+                    if slot < 0:
+                        slot = len(occupied)
+                else:
+                    slot = len(occupied)
+            row_base = slot - first_col
+            if row_base >= len(used_bases) or not used_bases[row_base]:
+                tries += 1
+                if all(row_base + c >= len(occupied)
+                       or not occupied[row_base + c] for c, _ in row):
+                    break
+            slot += 1
+
+        if row_base >= len(used_bases):
+            used_bases.extend(b'\x00' * (row_base + 1 - len(used_bases)))
+        used_bases[row_base] = 1
+        bases_per_row[row] = row_base
+        next_base_per_columns[row_columns] = row_base + 1
+        base[row_idx] = row_base
+        if row:
+            size = row_base + row[-1][0] + 1
+            if size > len(check):
+                check.extend([-1] * (size - len(check)))
+                value.extend([0] * (size - len(value)))
+                occupied.extend(b'\x00' * (size - len(occupied)))
+            for c, v in row:
+                check[row_base + c] = c
+                value[row_base + c] = v
+                occupied[row_base + c] = 1
+
+    size = (max(base) if len(base) else 0) + columns
+    if size > len(check):
+        check.extend([-1] * (size - len(check)))
+        value.extend([0] * (size - len(value)))
+    return base, check, value
@@ -11,7 +11,7 @@ class Error(object):
     of error recovery.
     """
     def __init__(self, position, length, message=None, input_str=None,
-                 expected_symbols=None,):
+                 expected_symbols=None, line_starts=None):
         """
         Either message should be given or input_str and expected_symbols.
 
@@ -22,19 +22,24 @@ class Error(object):
         :param input_str: The input string/list.
         :param expected_symbols: A set of expected grammar symbols at the
              location.
+        :param line_starts: The line start index of the input shared by the
+             errors (see `parglare.common.LineStarts`).
         """
         self.position = position
         self.length = length
         self.message = message
+        self.input_str = input_str
         self.expected_symbols = set(expected_symbols) \
             if expected_symbols else None
+        self.line_starts = line_starts
 
     def __str__(self):
         if self.message:
             return self.message
         else:
             from parglare import pos_to_line_col
-            line, col = pos_to_line_col(input, self.position)
+            line, col = pos_to_line_col(self.input_str, self.position,
+                                        self.line_starts)
             return "Unexpected input at position {}. Expected: {}"\
                 .format((line, col),
                         expected_symbols_str(self.expected_symbols))
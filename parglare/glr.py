@@ -4,9 +4,11 @@ import codecs
 from itertools import chain
 from parglare import Parser
 from parglare import termui as t
-from .exceptions import DisambiguationError, ParseError, expected_message
-from .parser import SHIFT, REDUCE, ACCEPT, pos_to_line_col, STOP, Context
-from .common import Location, position_context
+from .exceptions import DisambiguationError, ParseError, ParserInitError, \
+    expected_message
+from .parser import SHIFT, REDUCE, ACCEPT, pos_to_line_col, STOP, Context, \
+    TokenStream
+from .common import Location, context_line_starts, position_context
 from .tables import LALR
 from .export import dot_escape
 from .termui import prints, h_print, a_print
@@ -36,7 +38,9 @@ class GLRParser(Parser):
                  build_tree=False, call_actions_during_tree_build=False,
                  tables=LALR, layout=False, position=False, prefer_shifts=None,
                  prefer_shifts_over_empty=None, error_recovery=False,
-                 dynamic_filter=None, custom_lexical_disambiguation=None):
+                 dynamic_filter=None, custom_lexical_disambiguation=None,
+                 table_cache=None, lazy_table=False, table=None,
+                 lexer='context', lazy_values=False):
 
         # The default for GLR is not to use any strategy preferring shifts
         # over reduce thus investigating all possibilitites.
@@ -56,7 +60,9 @@ class GLRParser(Parser):
             prefer_shifts=prefer_shifts,
             prefer_shifts_over_empty=prefer_shifts_over_empty,
             error_recovery=error_recovery, dynamic_filter=dynamic_filter,
-            custom_lexical_disambiguation=custom_lexical_disambiguation)
+            custom_lexical_disambiguation=custom_lexical_disambiguation,
+            table_cache=table_cache, lazy_table=lazy_table, table=table,
+            lexer=lexer, lazy_values=lazy_values)
 
     def _check_parser(self):
         """
@@ -64,16 +70,34 @@ class GLRParser(Parser):
         """
         pass
 
+    def _complete_state(self, state):
+        self.table.complete_state(state)
+
+    def parse_stream(self, stream, **kwargs):
+        """
+        Streamed input is not supported as parser heads may be at different
+        positions and need the input before the current position.
+        """
+        raise ParserInitError(
+            'Streamed input can be parsed only by the LR parser.')
+
     def parse(self, input_str, position=0, file_name=None, context=None):
         """
         Parses the given input string.
         Args:
-            input_str(str): A string to parse.
+            input_str(str or TokenStream): A string to parse or its tokens
+                recognized by `tokenize`.
             position(int): Position to start from.
             file_name(str): File name if applicable. Used in error reporting.
             context(Context): An object used to keep parser context info.
         """
 
+        self._check_reduce_actions()
+
+        if self.lexer == 'pre' or isinstance(input_str, TokenStream):
+            input_str = self._pretokenize(input_str, position, file_name,
+                                          context)
+
         if self.debug:
             a_print("*** PARSING STARTED\n")
             self.debug_step = 1
@@ -94,6 +118,12 @@ class GLRParser(Parser):
         self.expected = set()
         self.empty_reductions_results = {}
 
+        # Layout and tokens are found once per position and shared by all
+        # heads. Layout is keyed by position, tokens by position and scanner.
+        # Results before the slowest active head are dropped.
+        self.layout_results = {}
+        self.tokens_results = {}
+
         context.parser = self
         context.input_str = input_str
         context.file_name = file_name
@@ -101,7 +131,7 @@ class GLRParser(Parser):
         position, layout_content = self._skipws(context, input_str, position)
 
         # We start with a single parser head in state 0.
-        start_head = GSSNode(self.table.states[0],
+        start_head = GSSNode(self.table.start_states[self.start_production],
                              start_position=position,
                              end_position=position,
                              layout_content=layout_content,
@@ -121,6 +151,9 @@ class GLRParser(Parser):
             self._do_reductions(context)
             if self.heads_for_shift:
                 self._do_shifts(context)
+            if self.heads_for_reduce:
+                self._drop_results(min(h.next_position
+                                       for h in self.heads_for_reduce))
             # If after shifting we don't have any heads for reduce
             # and we haven't found any final parse, do recovery.
             if self.error_recovery:
@@ -138,6 +171,9 @@ class GLRParser(Parser):
                                 self._trace_step_kill(h)
                                 self.debug_step += 1
 
+        self.layout_results = {}
+        self.tokens_results = {}
+
         if not self.finish_head:
             if self.debug and self.debug_trace:
                 self._export_dot_trace()
@@ -191,6 +227,8 @@ class GLRParser(Parser):
                 self.expected = set()
 
             state = head.state
+            if state.finish_flags is None:
+                self._complete_state(state)
             actions = state.actions
             self.expected.update(actions.keys())
 
@@ -488,7 +526,8 @@ class GLRParser(Parser):
                         .format(token.value, state.state_id) +
                         "at position " +
                         str(pos_to_line_col(self.input_str,
-                                            context.start_position)),
+                                            context.start_position,
+                                            context_line_starts(context))),
                         level=1, new_line=True)
                 self.debug_step += 1
 
@@ -550,7 +589,8 @@ class GLRParser(Parser):
             # self-reference create stack node loop.
             if debug:
                 a_print("Looping automata transition.", level=1)
-            result = self._call_reduce_action(production, subresults, context)
+            result = self._reduce_actions[production.prod_id](
+                context, subresults)
             old_head.parents.append((old_head, result, True, True))
 
         if all_empty and new_head in self.reducing_heads:
@@ -565,7 +605,8 @@ class GLRParser(Parser):
                     self._trace_step_kill(old_head)
             return
 
-        result = self._call_reduce_action(production, subresults, context)
+        result = self._reduce_actions[production.prod_id](context,
+                                                          subresults)
 
         for head in chain(self.heads_for_reduce,
                           [self.finish_head] if self.finish_head else []):
@@ -591,15 +632,48 @@ class GLRParser(Parser):
                 self._trace_step(old_head, new_head, root_head,
                                  "R:{}".format(dot_escape(production)))
 
+    def _skipws(self, context, input_str, position):
+        try:
+            return self.layout_results[position]
+        except KeyError:
+            result = self.layout_results[position] = \
+                super(GLRParser, self)._skipws(context, input_str, position)
+            return result
+
+    def _drop_results(self, position):
+        """
+        Drops layout and tokens found before the given position. Heads don't
+        go back in the input, so these are not needed once all active heads
+        are past them.
+        """
+        layout_results = self.layout_results
+        for old_position in [p for p in layout_results if p < position]:
+            del layout_results[old_position]
+        tokens_results = self.tokens_results
+        for key in [k for k in tokens_results if k[0] < position]:
+            del tokens_results[key]
+
     def _next_tokens(self, state, input_str, position):
+        scanner = state.scanner
+        if scanner is None:
+            scanner = state.scanner = self._get_scanner(
+                tuple(state.actions), tuple(state.finish_flags))
+        # States with the same expected terminals share the scanner and thus
+        # the tokens at the given position.
+        key = (position, scanner)
+        try:
+            return self.tokens_results[key]
+        except KeyError:
+            pass
         try:
-            tok = super(GLRParser, self)._next_token(state, input_str,
-                                                     position)
+            tok = self._scan_token(state.actions.keys(), state.finish_flags,
+                                   input_str, position, scanner)
             tokens = [tok]
         except DisambiguationError as e:
             # Lexical ambiguity will be handled by GLR
             tokens = e.tokens
 
+        self.tokens_results[key] = tokens
         return tokens
 
     def _do_recovery(self, context):
@@ -635,6 +709,8 @@ class GLRParser(Parser):
                         self, input_str, context.start_position, set(symbols))
 
                 if error:
+                    # Errors of the input share its line start index.
+                    error.line_starts = context_line_starts(context)
                     self.errors.append(error)
                     if debug:
                         a_print("Error: ", error, level=1)
@@ -660,7 +736,9 @@ class GLRParser(Parser):
                     head.next_position = position
                     if debug:
                         h_print("Advancing position to ",
-                                pos_to_line_col(input_str, position),
+                                pos_to_line_col(
+                                    input_str, position,
+                                    context_line_starts(context)),
                                 level=1)
                 elif debug:
                     h_print("Introducing token {}", repr(token), level=1)
@@ -683,7 +761,8 @@ class GLRParser(Parser):
                        expected_symbols=None,
                        layout_content=''):
         h_print("Position:",
-                pos_to_line_col(input_str, position), level=1)
+                pos_to_line_col(input_str, position,
+                                context_line_starts(self.context)), level=1)
         h_print("Context:", position_context(input_str, position), level=1)
         lc = layout_content.replace("\n", "\\n") \
             if type(layout_content) is str else layout_content
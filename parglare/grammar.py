@@ -7,14 +7,24 @@ import itertools
 from parglare.six import add_metaclass
 from parglare.exceptions import GrammarError, ParserInitError
 from parglare.actions import pass_single, pass_none, collect, collect_sep
-from parglare.common import Location, load_python_module
+from parglare.common import Location, load_python_module, binary
 from parglare.termui import prints, s_emph, s_header, a_print, h_print
 from parglare import termui
 
 if sys.version < '3':
     text = unicode  # NOQA
+    unichr = unichr  # NOQA
 else:
     text = str
+    unichr = chr
+
+try:
+    # Python 3.11+
+    from re import _parser as sre_parse
+    from re import _constants as sre_constants
+except ImportError:
+    import sre_parse
+    import sre_constants
 
 # Associativity
 ASSOC_NONE = 0
@@ -53,6 +63,10 @@ class GrammarSymbol(object):
     imported_with (PGFileImport): PGFileImport where this symbol is first time
         imported from. Used for FQN calculation.
     """
+    # Changed whenever an action of any symbol is replaced, so that parsers
+    # know when their reduce actions need to be created anew.
+    actions_version = 0
+
     def __init__(self, name, location=None, imported_with=None):
         self.name = escape(name)
         self.location = location
@@ -86,6 +100,11 @@ class GrammarSymbol(object):
     def __repr__(self):
         return "{}({})".format(type(self).__name__, str(self))
 
+    def __setattr__(self, name, value):
+        if name == 'action' and self.__dict__.get('action') is not value:
+            GrammarSymbol.actions_version += 1
+        super(GrammarSymbol, self).__setattr__(name, value)
+
     def __hash__(self):
         return self._hash
 
@@ -183,6 +202,21 @@ class Recognizer(object):
         self.name = name
         self.location = location
 
+    def first_chars(self):
+        """
+        Returns a tuple of the set of characters a recognized token may start
+        with and a flag telling if the token may start with any non-ASCII
+        character as well. Returns `None` if the token may start with any
+        character.
+        """
+        return None
+
+    def literal_prefix(self):
+        """
+        Returns a string every recognized token starts with.
+        """
+        return ''
+
 
 class StringRecognizer(Recognizer):
     def __init__(self, value, ignore_case=False, **kwargs):
@@ -190,14 +224,28 @@ class StringRecognizer(Recognizer):
         self.value = value
         self.ignore_case = ignore_case
         self.value_cmp = value.lower() if ignore_case else value
+        # Used for binary input. Case of ASCII characters only is ignored.
+        self.bytes_value = value.encode('utf-8')
+        self.bytes_value_cmp = self.bytes_value.lower() if ignore_case \
+            else self.bytes_value
 
     def __call__(self, in_str, pos):
+        if isinstance(in_str, binary):
+            value, value_cmp = self.bytes_value, self.bytes_value_cmp
+        else:
+            value, value_cmp = self.value, self.value_cmp
         if self.ignore_case:
-            if in_str[pos:pos+len(self.value)].lower() == self.value_cmp:
-                return self.value
+            if in_str[pos:pos+len(value)].lower() == value_cmp:
+                return value
         else:
-            if in_str[pos:pos+len(self.value)] == self.value_cmp:
-                return self.value
+            if in_str[pos:pos+len(value)] == value_cmp:
+                return value
+
+    def first_chars(self):
+        return _first_chars(self.value[:1], self.ignore_case)
+
+    def literal_prefix(self):
+        return '' if self.ignore_case else self.value
 
 
 def esc_control_characters(regex):
@@ -230,11 +278,193 @@ class RegExRecognizer(Recognizer):
             raise GrammarError(message.format(regex, str(ex)))
 
     def __call__(self, in_str, pos):
-        m = self.regex.match(in_str, pos)
+        regex = self.bytes_regex if isinstance(in_str, binary) else self.regex
+        m = regex.match(in_str, pos)
         if m:
             matched = m.group()
             return matched
 
+    @property
+    def bytes_regex(self):
+        """
+        The regex compiled from the UTF-8 encoded pattern, used for binary
+        input. It is compiled on the first use. Character classes and escapes
+        like `\\w` match single bytes, i.e. ASCII characters only.
+        """
+        try:
+            return self._bytes_regex
+        except AttributeError:
+            try:
+                self._bytes_regex = re.compile(self._regex.encode('utf-8'),
+                                               self.re_flags)
+            except re.error as ex:
+                regex = esc_control_characters(self._regex)
+                message = 'Regex compile error in /{}/ for binary input ' \
+                    '(report: "{}")'
+                raise GrammarError(message.format(regex, str(ex)))
+            return self._bytes_regex
+
+    def first_chars(self):
+        try:
+            return self._first_chars
+        except AttributeError:
+            self._first_chars = _regex_first_chars(self.regex)
+            return self._first_chars
+
+    def literal_prefix(self):
+        if self.regex.flags & re.IGNORECASE:
+            return ''
+        try:
+            parsed = sre_parse.parse(self.regex.pattern, self.regex.flags)
+        except re.error:
+            return ''
+        prefix = []
+        for op, av in parsed:
+            if op != sre_constants.LITERAL:
+                break
+            prefix.append(unichr(av))
+        return ''.join(prefix)
+
+
+def _first_chars(chars, ignore_case=False, non_ascii=False):
+    """
+    Returns the result of `Recognizer.first_chars` for the given characters.
+    Characters matched when ignoring case are added. As non-ASCII characters
+    may match other characters in many ways, any non-ASCII character is
+    accepted in that case if there is a non-ASCII character given.
+    """
+    chars = set(chars)
+    if ignore_case and chars:
+        for char in list(chars):
+            for variant in (char.lower(), char.upper(), char.swapcase(),
+                            char.lower().upper(), char.upper().lower()):
+                if len(variant) == 1:
+                    chars.add(variant)
+        if _NON_ASCII.search(''.join(chars)):
+            non_ascii = True
+        else:
+            char_class = re.compile('[{}]'.format(
+                ''.join(re.escape(c) for c in chars)),
+                re.IGNORECASE | re.UNICODE)
+            chars.update(c for c in _ascii_case_folds() if char_class.match(c))
+    return frozenset(chars), non_ascii
+
+
+_NON_ASCII = re.compile('[^\x00-\x7f]')
+_ASCII_CASE_FOLDS = []
+
+
+def _ascii_case_folds():
+    """
+    Returns non-ASCII characters matching ASCII characters when ignoring case,
+    e.g. 'ſ' matching 's'. These are found once in the Basic Multilingual
+    Plane.
+    """
+    if not _ASCII_CASE_FOLDS:
+        _ASCII_CASE_FOLDS.extend(re.findall(
+            '[\x00-\x7f]',
+            ''.join(unichr(code) for code in range(0x80, 0x10000)),
+            re.IGNORECASE | re.UNICODE))
+    return _ASCII_CASE_FOLDS
+
+
+# Characters of the regex categories.
+_ASCII = [unichr(code) for code in range(0x80)]
+_CATEGORIES = dict(
+    (getattr(sre_constants, 'CATEGORY_' + name),
+     [c for c in _ASCII if re.match(pattern, c, re.UNICODE)])
+    for name, pattern in [('DIGIT', r'\d'), ('NOT_DIGIT', r'\D'),
+                          ('SPACE', r'\s'), ('NOT_SPACE', r'\S'),
+                          ('WORD', r'\w'), ('NOT_WORD', r'\W')])
+
+_REPEATS = [getattr(sre_constants, name) for name in
+            ('MAX_REPEAT', 'MIN_REPEAT', 'POSSESSIVE_REPEAT')
+            if hasattr(sre_constants, name)]
+_ZERO_WIDTH = [sre_constants.AT, sre_constants.ASSERT,
+               sre_constants.ASSERT_NOT]
+
+
+def _regex_first_chars(regex):
+    """
+    Returns the result of `Recognizer.first_chars` for the compiled regex by
+    analysis of the parsed regex.
+    """
+    try:
+        parsed = sre_parse.parse(regex.pattern, regex.flags)
+        first = [set(), False, bool(regex.flags & re.IGNORECASE)]
+        _sre_first(parsed, first)
+    except (ValueError, re.error):
+        return None
+    chars, non_ascii, ignore_case = first
+    return _first_chars(chars, ignore_case, non_ascii)
+
+
+def _sre_first(items, first):
+    """
+    Collects the first characters of the parsed regex items into `first`
+    which is a list of the character set and the non-ASCII and ignore case
+    flags. Returns `True` if the items may match an empty string. Raises
+    `ValueError` if the first character can't be determined.
+    """
+    for op, av in items:
+        if op == sre_constants.LITERAL:
+            first[0].add(unichr(av))
+            return False
+        elif op == sre_constants.NOT_LITERAL:
+            first[0].update(c for c in _ASCII if c != unichr(av))
+            first[1] = True
+            return False
+        elif op == sre_constants.IN:
+            _sre_in_first(av, first)
+            return False
+        elif op == sre_constants.SUBPATTERN:
+            # Group, added and removed flags and pattern in Python 3.6+.
+            if len(av) == 4 and av[1] & re.IGNORECASE:
+                first[2] = True
+            if not _sre_first(av[-1], first):
+                return False
+        elif op == getattr(sre_constants, 'ATOMIC_GROUP', None):
+            if not _sre_first(av, first):
+                return False
+        elif op == sre_constants.BRANCH:
+            empty = [_sre_first(branch, first) for branch in av[1]]
+            if not any(empty):
+                return False
+        elif op in _REPEATS:
+            min_count, _, sub_items = av
+            if not _sre_first(sub_items, first) and min_count > 0:
+                return False
+        elif op not in _ZERO_WIDTH:
+            raise ValueError(op)
+    return True
+
+
+def _sre_in_first(items, first):
+    """
+    Collects the first characters of the parsed regex character set.
+    """
+    chars = set()
+    negate = False
+    for op, av in items:
+        if op == sre_constants.NEGATE:
+            negate = True
+        elif op == sre_constants.LITERAL:
+            chars.add(unichr(av))
+        elif op == sre_constants.RANGE:
+            low, high = av
+            chars.update(_ASCII[low:high + 1])
+            if high >= len(_ASCII):
+                first[1] = True
+        elif op == sre_constants.CATEGORY and av in _CATEGORIES:
+            chars.update(_CATEGORIES[av])
+            first[1] = True
+        else:
+            raise ValueError(op)
+    if negate:
+        chars = set(c for c in _ASCII if c not in chars)
+        first[1] = True
+    first[0].update(chars)
+
 
 def EMPTY_recognizer(input, pos):
     pass
@@ -759,6 +989,8 @@ class Grammar(PGFile):
         its name.
     nonterminals (set of NonTerminal):
     terminals(set of Terminal):
+    productions_per_symbol(dict): Lists of productions keyed by non-terminal.
+        Productions are in the order of their ids.
     imported_files(dict): Global registry of all imported files.
 
     """
@@ -854,14 +1086,15 @@ class Grammar(PGFile):
     def _enumerate_productions(self):
         """
         Enumerates all productions (prod_id) and production per symbol
-        (prod_symbol_id).
+        (prod_symbol_id). Creates index of productions per symbol.
         """
-        idx_per_symbol = {}
+        self.productions_per_symbol = {}
         for idx, prod in enumerate(self.productions):
             prod.prod_id = idx
-            prod.prod_symbol_id = idx_per_symbol.get(prod.symbol, 0)
-            idx_per_symbol[prod.symbol] = \
-                idx_per_symbol.get(prod.symbol, 0) + 1
+            symbol_prods = self.productions_per_symbol.setdefault(
+                prod.symbol, [])
+            prod.prod_symbol_id = len(symbol_prods)
+            symbol_prods.append(prod)
 
     def _fix_keyword_terminals(self):
         """
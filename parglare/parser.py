@@ -1,14 +1,21 @@
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals, print_function
 import codecs
+import re
 import sys
-from .grammar import EMPTY, EOF, STOP
-from .tables import LALR, SLR, SHIFT, REDUCE, ACCEPT
+from array import array
+from bisect import bisect_left, bisect_right
+from mmap import mmap as memory_map, ACCESS_READ
+from .grammar import EMPTY, EOF, STOP, GrammarSymbol, Terminal, Recognizer, \
+    StringRecognizer, RegExRecognizer
+from .tables import LALR, LALR_DP, SLR, SHIFT, REDUCE, ACCEPT, \
+    order_terminals
 from .errors import Error, expected_symbols_str
 from .exceptions import ParseError, ParserInitError, DisambiguationError, \
     DynamicDisambiguationConflict, disambiguation_error, expected_message, \
     SRConflicts, RRConflicts
-from .common import Location, position_context
+from .common import Location, LineStarts, context_line_starts, \
+    position_context, binary
 from .actions import pass_none
 from .termui import prints, h_print, a_print
 from parglare import termui
@@ -22,6 +29,9 @@ else:
 class Parser(object):
     """Parser works like a DFA driven by LR tables. For a given grammar LR table
     will be created and cached or loaded from cache if cache is found.
+
+    With `compact_table` the table takes less memory but parsing is about two
+    times slower as actions are looked up in the packed table arrays.
     """
     def __init__(self, grammar, start_production=1, actions=None,
                  layout_actions=None, debug=False, debug_trace=False,
@@ -29,7 +39,27 @@ class Parser(object):
                  build_tree=False, call_actions_during_tree_build=False,
                  tables=LALR, layout=False, position=False, prefer_shifts=True,
                  prefer_shifts_over_empty=True, error_recovery=False,
-                 dynamic_filter=None, custom_lexical_disambiguation=None):
+                 dynamic_filter=None, custom_lexical_disambiguation=None,
+                 table_cache=None, compact_table=False, lazy_table=False,
+                 table=None, lexer='context', lazy_values=False,
+                 skip_unit_reductions=False):
+        if lexer not in ('context', 'pre'):
+            raise ParserInitError('Unknown lexer "{}".'.format(lexer))
+        if lexer == 'pre' and (custom_lexical_disambiguation or lazy_table):
+            raise ParserInitError(
+                'Pre-tokenization can not be used with custom lexical '
+                'disambiguation or lazy table.')
+        if compact_table and (dynamic_filter or debug):
+            raise ParserInitError(
+                'Compact table can not be used in debug mode or with '
+                'dynamic disambiguation filter.')
+        if compact_table and lazy_table:
+            raise ParserInitError(
+                'Compact table can not be used with lazy table.')
+        if lazy_values and not build_tree:
+            raise ParserInitError(
+                'Lazy values can be used only when building the tree.')
+
         self.grammar = grammar
         self.start_production = start_production
         EMPTY.action = pass_none
@@ -38,22 +68,13 @@ class Parser(object):
             self.grammar._resolve_actions(action_overrides=actions,
                                           fail_on_no_resolve=True)
 
-        self.layout_parser = None
-        if not layout:
-            layout_prod = grammar.get_production_id('LAYOUT')
-            if layout_prod:
-                self.layout_parser = Parser(
-                    grammar,
-                    start_production=layout_prod,
-                    actions=layout_actions,
-                    ws=None, layout=True,
-                    position=True,
-                    prefer_shifts=True,
-                    prefer_shifts_over_empty=True,
-                    debug=debug_layout)
-
         self.layout = layout
         self.ws = ws
+        self._ws_regex = re.compile(
+            '[{}]*'.format(''.join(re.escape(c) for c in ws))) if ws else None
+        self._ws_bytes_regex = re.compile(
+            '(?:{})*'.format('|'.join(re.escape(c) for c in ws))
+            .encode('utf-8')) if ws else None
         self.position = position
         self.debug = debug
         self.debug_trace = debug_trace
@@ -63,79 +84,358 @@ class Parser(object):
 
         self.build_tree = build_tree
         self.call_actions_during_tree_build = call_actions_during_tree_build
+        self.lazy_values = lazy_values
+        self.skip_unit_reductions = skip_unit_reductions
+        # Terminals whose token values are slices of the input. In lazy values
+        # mode their nodes don't keep the values. Error recovery and custom
+        # lexical disambiguation may make tokens with other values.
+        self._sliced_terminals = frozenset()
+        if lazy_values and not (error_recovery
+                                or custom_lexical_disambiguation):
+            self._sliced_terminals = frozenset(
+                t for t in grammar.terminals
+                if type(t.recognizer) is RegExRecognizer
+                or (type(t.recognizer) is StringRecognizer
+                    and not t.recognizer.ignore_case))
 
         self.error_recovery = error_recovery
         self.dynamic_filter = dynamic_filter
         self.custom_lexical_disambiguation = custom_lexical_disambiguation
+        self.lexer = lexer
+
+        # Reduce actions indexed by production id. See `_init_reduce_actions`.
+        self._init_reduce_actions()
 
         from .closure import LR_0, LR_1
-        from .tables import create_table
+        from .compact import CompactTable, create_compact_table
+        from .persist import load_or_create_table
         if tables == SLR:
             itemset_type = LR_0
         else:
             itemset_type = LR_1
-        self.table = create_table(
-            grammar, itemset_type=itemset_type,
-            start_production=start_production, prefer_shifts=prefer_shifts,
-            prefer_shifts_over_empty=prefer_shifts_over_empty)
 
-        self._check_parser()
-        if debug:
-            self.print_debug()
+        layout_prod = None
+        if not layout:
+            layout_prod = grammar.get_production_id('LAYOUT')
+
+        own_table = table is None
+        if own_table:
+            start_productions = [start_production]
+            # Layout sub-parser is LR parser which prefers shifts. It shares
+            # the table if it would be built with the same parameters.
+            if layout_prod and itemset_type is LR_1 and prefer_shifts \
+                    and prefer_shifts_over_empty:
+                start_productions.append(layout_prod)
+            table = load_or_create_table(
+                grammar, table_cache=table_cache, itemset_type=itemset_type,
+                start_productions=start_productions,
+                prefer_shifts=prefer_shifts,
+                prefer_shifts_over_empty=prefer_shifts_over_empty,
+                lalr_dp=tables == LALR_DP, lazy=lazy_table)
+        if start_production not in table.start_states:
+            raise ParserInitError(
+                'Table has no start state for production {}.'
+                .format(start_production))
+        self.table = table
+
+        # Terminals and finish flags used by `tokenize`.
+        self._lexer_terminals = None
+        self.compact_table = compact_table
+        if isinstance(table, CompactTable):
+            if lexer == 'pre':
+                raise ParserInitError(
+                    'Pre-tokenization needs LR table to check terminals.')
+            self.compact_table = True
+        else:
+            if debug:
+                # Debug output covers the whole table.
+                table.complete()
+
+            self._check_parser()
+            if debug:
+                self.print_debug()
+
+            if lexer == 'pre':
+                self._lexer_terminals = _check_lexer_terminals(
+                    table, [p for p in table.start_states
+                            if p != layout_prod])
+
+            if compact_table:
+                self.table = create_compact_table(table)
+
+        # Scanners are created on the first use. See `_next_token`.
+        self._scanners = {}
+        # Tokens of the input being parsed in pre-tokenization mode.
+        self._token_stream = None
+        # LR parser without debugging, error recovery, dynamic filter and lazy
+        # table is driven by the specialized loop. See `_parse_fast`.
+        self._fast = not (debug or error_recovery or dynamic_filter
+                          or lazy_table)
+        self._state_actions = None
+        if self.compact_table:
+            self._compact_scanners = [None] * self.table.states_count
+
+        self.layout_parser = None
+        layout_table = None
+        if layout_prod:
+            if layout_prod in table.start_states:
+                layout_table = table if debug_layout else self.table
+                if debug_layout and isinstance(table, CompactTable):
+                    layout_table = None
+            self.layout_parser = Parser(
+                grammar,
+                start_production=layout_prod,
+                actions=layout_actions,
+                ws=None, layout=True,
+                position=True,
+                prefer_shifts=True,
+                prefer_shifts_over_empty=True,
+                debug=debug_layout,
+                table_cache=table_cache,
+                compact_table=compact_table and not debug_layout,
+                lazy_table=lazy_table,
+                table=layout_table)
+
+        # Layout is matched by a regex instead of the layout sub-parser if
+        # possible. See `_layout_regex`.
+        self._layout_regex = None
+        self._layout_terminals = None
+        if self.layout_parser and not debug_layout:
+            layout = grammar.productions[layout_prod].symbol
+            self._layout_regex = _layout_regex(layout)
+            if self._layout_regex is not None:
+                # Terminals matched by the regex.
+                self._layout_terminals = _repetition(layout, set())[0]
+
+        if own_table and not debug \
+                and not (debug_layout and layout_table is table):
+            # LR items and first/follow sets are kept only for debugging.
+            table.strip()
 
     def _check_parser(self):
-        if self.table.sr_conflicts:
+        sr_conflicts = self.table.sr_conflicts
+        rr_conflicts = self.table.rr_conflicts
+        if len(self.table.start_states) > 1:
+            # Only the states reachable from the start state are used.
+            reachable = self.table.reachable_states(self.start_production)
+            sr_conflicts = [c for c in sr_conflicts
+                            if c.state.state_id in reachable]
+            rr_conflicts = [c for c in rr_conflicts
+                            if c.state.state_id in reachable]
+        if sr_conflicts or rr_conflicts:
             self.print_debug()
+        self._check_conflicts(sr_conflicts, rr_conflicts)
+
+    def _check_conflicts(self, sr_conflicts, rr_conflicts):
+        if sr_conflicts:
             if self.dynamic_filter:
                 unhandled_conflicts = []
-                for src in self.table.sr_conflicts:
+                for src in sr_conflicts:
                     if not src.dynamic:
                         unhandled_conflicts.append(src)
             else:
-                unhandled_conflicts = self.table.sr_conflicts
+                unhandled_conflicts = sr_conflicts
 
             if unhandled_conflicts:
                 raise SRConflicts(unhandled_conflicts)
 
         # Reduce/Reduce conflicts are fatal for LR parsing
-        if self.table.rr_conflicts:
-            self.print_debug()
+        if rr_conflicts:
             if self.dynamic_filter:
                 unhandled_conflicts = []
-                for rrc in self.table.rr_conflicts:
+                for rrc in rr_conflicts:
                     if not rrc.dynamic:
                         unhandled_conflicts.append(rrc)
             else:
-                unhandled_conflicts = self.table.rr_conflicts
+                unhandled_conflicts = rr_conflicts
 
             if unhandled_conflicts:
                 raise RRConflicts(unhandled_conflicts)
 
+    def _complete_state(self, state):
+        """
+        Completes the state of the lazy table reached by the parser. Conflicts
+        of the state are checked the same way as conflicts of the whole table
+        during parser construction.
+        """
+        self._check_conflicts(*self.table.complete_state(state))
+
     def print_debug(self):
         if self.layout and self.debug_layout:
             a_print('*** LAYOUT parser ***', new_line=True)
         self.table.print_debug()
 
-    def parse_file(self, file_name, **kwargs):
+    def parse_file(self, file_name, mmap=False, **kwargs):
         """
         Parses content from the given file.
         Args:
             file_name(str): A file name.
+            mmap(bool): If `True` the file is memory-mapped and parsed as
+                binary input without reading it into memory and decoding. The
+                file is unmapped after parsing unless lazy tree nodes or errors
+                found by error recovery refer to it.
         """
-        with codecs.open(file_name, 'r', 'utf-8') as f:
-            content = f.read()
+        if mmap:
+            with open(file_name, 'rb') as f:
+                try:
+                    content = memory_map(f.fileno(), 0, access=ACCESS_READ)
+                except ValueError:
+                    # Empty files can't be mapped.
+                    return self.parse(b'', file_name=file_name, **kwargs)
+            if self.lazy_values or self.error_recovery:
+                # The map is closed when it is not referenced anymore.
+                return self.parse(content, file_name=file_name, **kwargs)
+            with content:
+                return self.parse(content, file_name=file_name, **kwargs)
+        else:
+            with codecs.open(file_name, 'r', 'utf-8') as f:
+                content = f.read()
         return self.parse(content, file_name=file_name, **kwargs)
 
+    def parse_stream(self, stream, chunk_size=65536, file_name=None,
+                     context=None):
+        """
+        Parses the input read in chunks while parsing. Only a window of the
+        input from the current token onward is kept in memory.
+        Args:
+            stream: A file-like object or an iterable of string chunks.
+            chunk_size(int): The number of characters read from the file-like
+                object at once and the least number of characters kept ahead
+                of the current token.
+            file_name(str): File name if applicable. Used in error reporting.
+            context(Context): An object used to keep parser context info.
+        """
+        if self._lexer_terminals is not None:
+            raise ParserInitError(
+                'Streamed input can\'t be parsed in pre-tokenization mode.')
+        if self.lazy_values:
+            raise ParserInitError(
+                'Lazy values need the whole input.')
+        return self.parse(InputWindow(stream, chunk_size),
+                          file_name=file_name, context=context)
+
+    def tokenize(self, input_str, position=0, file_name=None, context=None):
+        """
+        Recognizes tokens of the whole input in pre-tokenization mode. The
+        returned token stream can be given to `parse` instead of the input
+        string. It can be parsed by any parser with the same lexer terminals,
+        e.g. by parsers for different start productions sharing the table.
+        Args:
+            input_str(str): A string to tokenize.
+            position(int): Position to start from.
+            file_name(str): File name if applicable. Used in error reporting.
+            context(Context): An object used to keep parser context info.
+        """
+        if self._lexer_terminals is None:
+            raise ParserInitError(
+                'Input can be tokenized only in pre-tokenization mode.')
+        terminals, finish_flags = self._lexer_terminals
+        scanner = self._get_scanner(terminals, finish_flags)
+        # Token values of these recognizers are slices of the input.
+        sliced = [type(t.recognizer) is RegExRecognizer
+                  or (type(t.recognizer) is StringRecognizer
+                      and not t.recognizer.ignore_case)
+                  for t in terminals]
+        terminal_ids = dict((t, idx) for idx, t in enumerate(terminals))
+
+        self._token_stream = None
+        context = Context() if not context else context
+        stream = TokenStream(input_str, terminals, position)
+        symbol_ids = stream.symbol_ids
+        starts = stream.starts
+        ends = stream.ends
+        in_len = len(input_str)
+
+        # Layout of textual input is skipped by the regex if there is one.
+        skip_regex = None
+        skip_layout = self.layout_parser or self.ws
+        if isinstance(input_str, text) and not self.debug:
+            skip_regex = self._layout_regex if self.layout_parser \
+                else self._ws_regex
+            scan = scanner.scan
+        else:
+            def scan(input_str, position):
+                return self._token_recognition(input_str, position, terminals,
+                                               finish_flags)
+
+        while True:
+            if skip_regex is not None:
+                position = skip_regex.match(input_str, position).end()
+            elif skip_layout:
+                position, _ = Parser._skipws(self, context, input_str,
+                                             position)
+            if position >= in_len:
+                break
+            tokens = scan(input_str, position)
+            if not tokens:
+                break
+            if len(tokens) == 1:
+                token = tokens[0]
+            else:
+                try:
+                    token = self._lexical_disambiguation(tokens)
+                except DisambiguationError as e:
+                    raise ParseError(
+                        location=Location(file_name=file_name,
+                                          input_str=input_str,
+                                          start_position=position),
+                        message=disambiguation_error(e.tokens))
+            terminal_id = terminal_ids[token.symbol]
+            if not sliced[terminal_id]:
+                stream.values[len(starts)] = token.value
+            symbol_ids.append(terminal_id)
+            starts.append(position)
+            position += len(token.value)
+            ends.append(position)
+
+        # The stream ends where no more tokens are recognized.
+        symbol_ids.append(-1)
+        starts.append(position)
+        ends.append(position)
+        return stream
+
+    def _pretokenize(self, input_str, position, file_name, context):
+        """
+        Sets the token stream used by `_skipws` and `_scan_token` for the given
+        input or token stream. Returns the input string.
+        """
+        if self._lexer_terminals is None:
+            raise ParserInitError(
+                'Token stream can be parsed only in pre-tokenization mode.')
+        if isinstance(input_str, TokenStream):
+            stream = input_str
+            if stream.terminals != self._lexer_terminals[0]:
+                raise ParserInitError(
+                    'Token stream is recognized for different terminals.')
+        else:
+            stream = self.tokenize(input_str, position, file_name, context)
+        self._token_stream = stream
+        return stream.input_str
+
     def parse(self, input_str, position=0, file_name=None, context=None):
         """
         Parses the given input string.
         Args:
-            input_str(str): A string to parse.
+            input_str(str or TokenStream): A string to parse or its tokens
+                recognized by `tokenize`.
             position(int): Position to start from.
             file_name(str): File name if applicable. Used in error reporting.
             context(Context): An object used to keep parser context info.
         """
 
+        self._check_reduce_actions()
+
+        if self.lexer == 'pre' or isinstance(input_str, TokenStream):
+            input_str = self._pretokenize(input_str, position, file_name,
+                                          context)
+
+        if self.compact_table:
+            return self._parse_compact(input_str, position, file_name,
+                                       context)
+
+        if self._fast:
+            return self._parse_fast(input_str, position, file_name, context)
+
         if self.debug:
             a_print("*** PARSING STARTED", new_line=True)
 
@@ -147,8 +447,9 @@ class Parser(object):
                 prints("\tInitializing dynamic disambiguation.")
             self.dynamic_filter(None, None, None, None, None, context)
 
-        state_stack = [StackNode(self.table.states[0], position, 0, None,
-                                 None)]
+        state_stack = [StackNode(
+            self.table.start_states[self.start_production], position, 0,
+            None, None)]
         context = Context() if not context else context
         context.input_str = input_str
         if not hasattr(context, 'file_name') or context.file_name is None:
@@ -163,6 +464,8 @@ class Parser(object):
 
         while True:
             cur_state = state_stack[-1].state
+            if cur_state.finish_flags is None:
+                self._complete_state(cur_state)
             if debug:
                 a_print("Current state:", str(cur_state.state_id),
                         new_line=True)
@@ -240,6 +543,8 @@ class Parser(object):
                     # continue or it might decide to fill in/replace
                     # missing/invalid tokens.
                     if error:
+                        # Errors of the input share its line start index.
+                        error.line_starts = context_line_starts(context)
                         if debug:
                             a_print("Error: ", error, level=1)
                         self.errors.append(error)
@@ -250,7 +555,9 @@ class Parser(object):
                         # state and try to continue.
                         if debug:
                             h_print("Continuing at position ",
-                                    pos_to_line_col(input_str, position),
+                                    pos_to_line_col(
+                                        input_str, position,
+                                        context_line_starts(context)),
                                     level=1)
 
                         new_token = True
@@ -314,8 +621,9 @@ class Parser(object):
                     a_print("Shift:",
                             "{} \"{}\"" .format(state.state_id,
                                                 ntok.value) + " at position " +
-                            str(pos_to_line_col(input_str,
-                                                position)), level=1)
+                            str(pos_to_line_col(
+                                input_str, position,
+                                context_line_starts(context))), level=1)
 
                 result = self._call_shift_action(symbol, ntok.value, context)
 
@@ -362,8 +670,8 @@ class Parser(object):
                     context.layout_content = ''
 
                 # Calling reduce action
-                result = self._call_reduce_action(production, subresults,
-                                                  context)
+                result = self._reduce_actions[production.prod_id](context,
+                                                                  subresults)
 
                 cur_state = cur_state.gotos[production.symbol]
                 state_stack.append(StackNode(cur_state,
@@ -382,12 +690,398 @@ class Parser(object):
                 else:
                     return state_stack[1].result
 
+    def _parse_fast(self, input_str, position, file_name, context):
+        """
+        LR parsing loop used when debugging, error recovery, dynamic filter and
+        lazy table are not used. The action taken for each state and terminal
+        is prepared when the state is first reached (see `_StateActions`) and
+        the context is updated only before calling semantic actions.
+        """
+        self.errors = []
+        self.current_error = None
+
+        if self._state_actions is None:
+            self._state_actions = _StateActions(
+                self.table, self._reductions, self._unit_productions()
+                if self.skip_unit_reductions else None)
+        state_actions = self._state_actions.actions
+        default_reductions = self._state_actions.default_reductions
+        unit_reductions = self._state_actions.unit_reductions
+        build_actions = self._state_actions.build
+
+        # The parse stack is kept in parallel preallocated lists of states,
+        # start and end positions, layout contents and results of the stack
+        # entries. `top` is the index of the top entry.
+        cur_state = self.table.start_states[self.start_production]
+        size = STACK_SIZE
+        states = [cur_state] * size
+        start_positions = [position] * size
+        end_positions = [0] * size
+        layouts = [None] * size
+        results = [None] * size
+        top = 0
+        context = Context() if not context else context
+        context.input_str = input_str
+        if not hasattr(context, 'file_name') or context.file_name is None:
+            context.file_name = file_name
+
+        skipws = None if self.layout else self._skipws
+        next_token = self._next_token
+        call_shift_action = self._call_shift_action
+        reduce_actions = self._reduce_actions
+        build_tree = self.build_tree
+
+        # Layout of textual input is skipped by the regex and tokens are
+        # recognized by the state scanners directly if possible. See `_skipws`
+        # and `_scan_token`.
+        scan_text = type(input_str) is text and self._token_stream is None
+        skip_regex = None
+        if scan_text and skipws is not None:
+            skip_regex = self._layout_regex if self.layout_parser \
+                else self._ws_regex
+            if skip_regex is None and not self.layout_parser:
+                skipws = None
+        scan_text = scan_text and not self.custom_lexical_disambiguation
+        in_len = len(input_str)
+
+        layout_content = ''
+        new_token = True
+        ntok = None
+
+        while True:
+            state_id = cur_state.state_id
+            actions = state_actions[state_id]
+            if actions is None:
+                actions = build_actions(cur_state)
+            act = None if new_token else actions.get(ntok.symbol)
+            if act is None:
+                # The lookahead token is not needed if the state reduces by
+                # the same production for each terminal.
+                act = default_reductions[state_id]
+
+            if act is None:
+                # See `parse` for the explanation when new token is
+                # recognized.
+                try:
+                    if skip_regex is not None:
+                        end_position = skip_regex.match(input_str,
+                                                        position).end()
+                        layout_content = input_str[position:end_position]
+                        position = end_position
+                    elif skipws is not None:
+                        position, layout_content = skipws(context, input_str,
+                                                          position)
+                    scanner = cur_state.scanner
+                    if scan_text and scanner is not None \
+                            and position < in_len:
+                        tokens = scanner.scan(input_str, position)
+                        if len(tokens) == 1:
+                            ntok = tokens[0]
+                        elif tokens:
+                            ntok = self._lexical_disambiguation(tokens)
+                        elif STOP in cur_state.actions:
+                            ntok = STOP_token
+                        else:
+                            ntok = EMPTY_token
+                    else:
+                        ntok = next_token(cur_state, input_str, position)
+                except DisambiguationError as e:
+                    raise ParseError(
+                        location=Location(file_name=file_name,
+                                          input_str=input_str,
+                                          start_position=position),
+                        message=disambiguation_error(e.tokens))
+                new_token = False
+                act = actions.get(ntok.symbol)
+                if act is None:
+                    raise ParseError(Location(file_name=file_name,
+                                              input_str=input_str,
+                                              start_position=position),
+                                     expected_message(cur_state.actions))
+
+            action = act[0]
+            if action is SHIFT:
+                symbol = ntok.symbol
+                value = ntok.value
+                end_position = position + len(value)
+                if build_tree or symbol.action:
+                    context.parser = self
+                    context.symbol = symbol
+                    context.start_position = position
+                    context.end_position = end_position
+                    context.layout_content = layout_content
+                    value = call_shift_action(symbol, value, context)
+                cur_state = act[1]
+                top += 1
+                if top == size:
+                    for stack in (states, start_positions, end_positions,
+                                  layouts, results):
+                        stack.extend([None] * size)
+                    size *= 2
+                states[top] = cur_state
+                start_positions[top] = position
+                end_positions[top] = end_position
+                layouts[top] = layout_content
+                results[top] = value
+                position = end_position
+                new_token = True
+
+            elif action is REDUCE:
+                production = act[1]
+                r_length = act[2]
+                if r_length:
+                    first = top - r_length + 1
+                    start_position = start_positions[first]
+                    end_position = end_positions[top]
+                    node_layout = layouts[first]
+                    subresults = results[first:top + 1]
+                    top = first - 1
+                else:
+                    start_position = end_position = position
+                    node_layout = ''
+                    subresults = []
+                    if top + 1 == size:
+                        for stack in (states, start_positions, end_positions,
+                                      layouts, results):
+                            stack.extend([None] * size)
+                        size *= 2
+
+                symbol = production.symbol
+                if build_tree or symbol.action:
+                    context.parser = self
+                    context.symbol = symbol
+                    context.production = production
+                    context.start_position = start_position
+                    context.end_position = end_position
+                    context.layout_content = node_layout
+                    result = act[3](context, subresults)
+                elif r_length == 1:
+                    # Unpack if single subresult
+                    result = subresults[0]
+                else:
+                    result = subresults
+
+                prev_state = states[top]
+                cur_state = prev_state.gotos[symbol]
+
+                # Unit reductions of the GOTO state are done in place, i.e.
+                # the parser goes straight to the state after the last one.
+                if unit_reductions is not None:
+                    if state_actions[cur_state.state_id] is None:
+                        build_actions(cur_state)
+                    unit = unit_reductions[cur_state.state_id]
+                    while unit is not None:
+                        if type(unit) is dict:
+                            if new_token:
+                                break
+                            unit = unit.get(ntok.symbol)
+                            if unit is None:
+                                break
+                        if build_tree:
+                            context.symbol = unit.symbol
+                            context.production = unit
+                            result = reduce_actions[unit.prod_id](context,
+                                                                  [result])
+                        cur_state = prev_state.gotos[unit.symbol]
+                        if state_actions[cur_state.state_id] is None:
+                            build_actions(cur_state)
+                        unit = unit_reductions[cur_state.state_id]
+
+                top += 1
+                states[top] = cur_state
+                start_positions[top] = start_position
+                end_positions[top] = end_position
+                layouts[top] = node_layout
+                results[top] = result
+
+            else:
+                assert top == 1
+                if self.position:
+                    return results[1], position
+                else:
+                    return results[1]
+
+    def _parse_compact(self, input_str, position, file_name, context):
+        """
+        LR parsing loop driven by the CompactTable.
+        """
+        self.errors = []
+        self.current_error = None
+
+        table = self.table
+        action_base = table.action_base
+        action_check = table.action_check
+        action_value = table.action_value
+        # GOTO entry always exists after reduction so no check is needed.
+        goto_base = table.goto_base
+        goto_value = table.goto_value
+        # Default reductions are not used with error recovery so that errors
+        # are recovered in the state the error is found in.
+        default_actions = None if self.error_recovery \
+            else table.default_actions
+        terminal_ids = table.terminal_ids
+        state_terminals = table.state_terminals
+        finish_flags = table.finish_flags
+        productions = table.productions
+        prod_lengths = table.prod_lengths
+        prod_symbols = table.prod_symbols
+        reduce_actions = self._reduce_actions
+        scanners = self._compact_scanners
+        get_scanner = self._get_scanner
+
+        state_stack = [StackNode(table.start_states[self.start_production],
+                                 position, 0, None, None)]
+        context = Context() if not context else context
+        context.input_str = input_str
+        if not hasattr(context, 'file_name') or context.file_name is None:
+            context.file_name = file_name
+
+        layout_content = ''
+        new_token = True
+        ntok = Token()
+        term_id = None
+
+        while True:
+            cur_state = state_stack[-1].state
+
+            code = 0
+            if not new_token and term_id is not None:
+                idx = action_base[cur_state] + term_id
+                if action_check[idx] == term_id:
+                    code = action_value[idx]
+            if not code and default_actions is not None:
+                code = default_actions[cur_state]
+
+            if not code:
+                # See `parse` for the explanation when new token is
+                # recognized.
+                try:
+                    if not self.layout:
+                        position, layout_content = self._skipws(context,
+                                                                input_str,
+                                                                position)
+                    scanner = scanners[cur_state]
+                    if scanner is None:
+                        scanner = scanners[cur_state] = get_scanner(
+                            state_terminals[cur_state],
+                            finish_flags[cur_state])
+                    ntok = self._scan_token(state_terminals[cur_state],
+                                            finish_flags[cur_state],
+                                            input_str, position, scanner)
+                except DisambiguationError as e:
+                    raise ParseError(
+                        location=Location(file_name=file_name,
+                                          input_str=input_str,
+                                          start_position=position),
+                        message=disambiguation_error(e.tokens))
+                new_token = False
+                term_id = terminal_ids.get(ntok.symbol)
+                if term_id is not None:
+                    idx = action_base[cur_state] + term_id
+                    if action_check[idx] == term_id:
+                        code = action_value[idx]
+
+            context.parser = self
+            context.start_position = position
+            context.end_position = position + len(ntok.value)
+            context.layout_content = layout_content
+
+            if not code and self.error_recovery:
+                expected_symbols = state_terminals[cur_state]
+                if position > len(input_str):
+                    e = self.current_error
+                    raise ParseError(Location(file_name=file_name,
+                                              input_str=input_str,
+                                              start_position=e.position),
+                                     expected_message(expected_symbols))
+                if type(self.error_recovery) is bool:
+                    error, position, ntok = self.default_error_recovery(
+                        input_str, position, set(expected_symbols))
+                else:
+                    ntok, error, position = self.error_recovery(
+                        self, input_str, position, set(expected_symbols))
+                if error:
+                    error.line_starts = context_line_starts(context)
+                    self.errors.append(error)
+                if not ntok:
+                    new_token = True
+                    term_id = None
+                    continue
+                term_id = terminal_ids.get(ntok.symbol)
+                if term_id is not None:
+                    idx = action_base[cur_state] + term_id
+                    if action_check[idx] == term_id:
+                        code = action_value[idx]
+
+            if not code:
+                raise ParseError(Location(file_name=file_name,
+                                          input_str=input_str,
+                                          start_position=position),
+                                 expected_message(state_terminals[cur_state]))
+
+            # See `parglare.compact.decode_action`
+            action = (code & 3) - 1
+            target = code >> 2
+
+            if action == SHIFT:
+                symbol = ntok.symbol
+                context.symbol = symbol
+                result = self._call_shift_action(symbol, ntok.value, context)
+                self.current_error = None
+                state_stack.append(StackNode(target,
+                                             context.start_position,
+                                             context.end_position,
+                                             context.layout_content,
+                                             result))
+                position = context.end_position
+                new_token = True
+
+            elif action == REDUCE:
+                production = productions[target]
+                context.symbol = production.symbol
+                context.production = production
+
+                r_length = prod_lengths[target]
+                if r_length:
+                    context.end_position = state_stack[-1].end_position
+                    context.start_position = \
+                        state_stack[-r_length].start_position
+                    context.layout_content = \
+                        state_stack[-r_length].layout_content
+                    subresults = [x.result for x in state_stack[-r_length:]]
+                    del state_stack[-r_length:]
+                else:
+                    subresults = []
+                    context.end_position = position
+                    context.start_position = position
+                    context.layout_content = ''
+
+                result = reduce_actions[target](context, subresults)
+
+                cur_state = state_stack[-1].state
+                nonterm_id = prod_symbols[target]
+                cur_state = goto_value[goto_base[cur_state] + nonterm_id]
+                state_stack.append(StackNode(cur_state,
+                                             context.start_position,
+                                             context.end_position,
+                                             context.layout_content,
+                                             result))
+
+            else:
+                assert len(state_stack) == 2
+                if self.position:
+                    return state_stack[1].result, position
+                else:
+                    return state_stack[1].result
+
     def call_actions(self, node, context=None):
         """
         Calls semantic actions for the given tree node.
         """
         self.context = context = context if context else Context()
         context.parser = self
+        self._check_reduce_actions()
+        semantic_actions = self._semantic_actions
 
         def set_context(context, node):
             context.start_position = node.start_position
@@ -415,61 +1109,45 @@ class Parser(object):
                 if sem_action:
                     set_context(context, node)
                     context.production = node.production
-                    assignments = node.production.assignments
-                    if assignments:
-                        assgn_results = {}
-                        for a in assignments.values():
-                            if a.op == '=':
-                                assgn_results[a.name] = subresults[a.index]
-                            else:
-                                assgn_results[a.name] = \
-                                    bool(subresults[a.index])
-                    if type(sem_action) is list:
-                        if assignments:
-                            result = \
-                                sem_action[
-                                    node.production.prod_symbol_id](
-                                        context, subresults, **assgn_results)
-                        else:
-                            result = \
-                                sem_action[
-                                    node.production.prod_symbol_id](context,
-                                                                    subresults)
-                    else:
-                        if assignments:
-                            result = sem_action(context, subresults,
-                                                **assgn_results)
-                        else:
-                            result = sem_action(context, subresults)
-                else:
-                    if len(subresults) == 1:
-                        # Unpack if single subresult
-                        result = subresults[0]
-                    else:
-                        result = subresults
+                result = semantic_actions[node.production.prod_id](
+                    context, subresults)
 
             return result
 
         return inner_call_actions(node)
 
     def _skipws(self, context, input_str, position):
-        in_len = len(input_str)
+        if type(input_str) is InputWindow:
+            return self._skipws_window(context, input_str, position)
         layout_content = ''
-        if self.layout_parser:
-            _, pos = self.layout_parser.parse(
-                input_str, position, context=context)
+        layout_end = self._token_stream.layout_end(position) \
+            if self._token_stream is not None else None
+        if layout_end is not None:
+            if layout_end > position:
+                layout_content = input_str[position:layout_end]
+            position = layout_end
+        elif self.layout_parser:
+            if self._layout_regex is not None \
+                    and isinstance(input_str, text):
+                pos = max(self._layout_regex.match(input_str,
+                                                   position).end(), position)
+            else:
+                _, pos = self.layout_parser.parse(
+                    input_str, position, context=context)
             if pos > position:
                 layout_content = input_str[position:pos]
             position = pos
         elif self.ws:
             old_pos = position
-            try:
-                while position < in_len and input_str[position] in self.ws:
-                    position += 1
-            except TypeError:
-                raise ParserInitError(
-                    "For parsing non-textual content please "
-                    "set `ws` to `None`.")
+            if position < len(input_str):
+                ws_regex = self._ws_bytes_regex \
+                    if isinstance(input_str, binary) else self._ws_regex
+                try:
+                    position = ws_regex.match(input_str, position).end()
+                except TypeError:
+                    raise ParserInitError(
+                        "For parsing non-textual content please "
+                        "set `ws` to `None`.")
             layout_content = input_str[old_pos:position]
 
         if self.debug:
@@ -478,19 +1156,88 @@ class Parser(object):
             h_print("Skipping whitespaces:",
                     "'{}'".format(content), level=1)
             h_print("New position:",
-                    pos_to_line_col(input_str, position), level=1)
+                    pos_to_line_col(input_str, position,
+                                    context_line_starts(context)), level=1)
 
         return position, layout_content
 
+    def _skipws_window(self, context, window, position):
+        """
+        Skips layout in the window of the streamed input. The text before the
+        given position is not needed anymore and is released.
+        """
+        window.release(position)
+        if self.layout_parser and (self._layout_regex is None
+                                   or not isinstance(window.buffer, text)):
+            # Layout parser reads more input while recognizing its tokens.
+            _, end = self.layout_parser.parse(window, position,
+                                              context=context)
+            end = max(end, position)
+        elif self.layout_parser or self.ws:
+            while True:
+                buffer, local = window.fill(position)
+                if self.layout_parser:
+                    regex = self._layout_regex
+                else:
+                    regex = self._ws_bytes_regex \
+                        if isinstance(buffer, binary) else self._ws_regex
+                end = max(regex.match(buffer, local).end(), local)
+                # Layout reaching the end of the window may continue. So may
+                # the layout stopped by a layout token not in the window yet.
+                if window.eof or (end < len(buffer) and not (
+                        self.layout_parser and _window_may_continue(
+                            self._layout_terminals, buffer, end))):
+                    break
+                window.grow(position)
+            end += window.offset
+        else:
+            end = position
+        layout_content = window[position:end]
+
+        if self.debug:
+            h_print("Skipping layout:", "'{}'".format(layout_content),
+                    level=1)
+            h_print("New position:", pos_to_line_col(window, end), level=1)
+
+        return end, layout_content
+
     def _next_token(self, state, input_str, position):
         """
         For the current position in the input stream and actions in the current
         state find next token.
         """
+        scanner = state.scanner
+        if scanner is None:
+            scanner = state.scanner = self._get_scanner(
+                tuple(state.actions), tuple(state.finish_flags))
+        return self._scan_token(state.actions.keys(), state.finish_flags,
+                                input_str, position, scanner)
+
+    def _get_scanner(self, terminals, finish_flags):
+        """
+        Returns the scanner for the given expected terminals. States with the
+        same terminals and finish flags share the scanner.
+        """
+        key = (terminals, finish_flags)
+        scanner = self._scanners.get(key)
+        if scanner is None:
+            scanner = self._scanners[key] = Scanner(terminals, finish_flags)
+        return scanner
+
+    def _scan_token(self, actions, finish_flags, input_str, position,
+                    scanner=None):
+        """
+        Finds next token for the given expected terminals.
 
-        actions = state.actions
-        finish_flags = state.finish_flags
-
+        Args:
+        actions(iterable of Terminal): Terminals expected at the current
+            position in the order of recognition.
+        finish_flags(list of bool): Finish flag for each expected terminal.
+        scanner(Scanner): Used for textual input if given.
+        """
+        if type(input_str) is InputWindow:
+            return self._scan_window_token(actions, finish_flags, input_str,
+                                           position, scanner)
         in_len = len(input_str)
 
         # Find the next token in the input
@@ -502,20 +1249,27 @@ class Parser(object):
             ntok = EOF_token
         else:
             tokens = []
-            if position < in_len:
+            # Tokens recognized in advance in pre-tokenization mode. `None`
+            # if the token at the position is not known.
+            stream_tokens = self._token_stream.tokens(position, actions) \
+                if self._token_stream is not None else None
+            if stream_tokens is not None:
+                tokens = stream_tokens
+            elif position < in_len:
                 if self.custom_lexical_disambiguation:
-                    symbols = actions.keys()
+                    symbols = actions
 
                     def get_tokens():
                         return self._token_recognition(input_str,
                                                        position, actions,
-                                                       finish_flags)
+                                                       finish_flags, scanner)
 
                     tokens = self.custom_lexical_disambiguation(
                         symbols, input_str, position, get_tokens)
                 else:
                     tokens = self._token_recognition(input_str, position,
-                                                     actions, finish_flags)
+                                                     actions, finish_flags,
+                                                     scanner)
             if not tokens:
                 if STOP in actions:
                     ntok = STOP_token
@@ -528,7 +1282,32 @@ class Parser(object):
 
         return ntok
 
-    def _token_recognition(self, input_str, position, actions, finish_flags):
+    def _scan_window_token(self, actions, finish_flags, window, position,
+                           scanner):
+        """
+        Finds next token in the window of the streamed input. The token
+        reaching the end of the window is recognized again when more input is
+        read as it may continue. If no token is recognized, it is tried again
+        when more input is read as long as the text at the position may start
+        a token not in the window yet.
+        """
+        while True:
+            buffer, local = window.fill(position)
+            ntok = self._scan_token(actions, finish_flags, buffer, local,
+                                    scanner)
+            if window.eof:
+                return ntok
+            if ntok is STOP_token or ntok is EMPTY_token:
+                if not _window_may_continue(actions, buffer, local):
+                    return ntok
+            elif local + len(ntok) < len(buffer):
+                return ntok
+            window.grow(position)
+
+    def _token_recognition(self, input_str, position, actions, finish_flags,
+                           scanner=None):
+        if scanner is not None and isinstance(input_str, text):
+            return scanner.scan(input_str, position)
         tokens = []
         last_prior = -1
         for idx, symbol in enumerate(actions):
@@ -562,6 +1341,11 @@ class Parser(object):
             if self.call_actions_during_tree_build and sem_action:
                 sem_action(context, matched_str)
 
+            if self.lazy_values:
+                return LazyNodeTerm(
+                    context.start_position, context.end_position, symbol,
+                    context.input_str, len(context.layout_content),
+                    None if symbol in self._sliced_terminals else matched_str)
             return treebuild_shift_action(context, matched_str)
 
         sem_action = symbol.action
@@ -583,69 +1367,89 @@ class Parser(object):
 
         return result
 
-    def _call_reduce_action(self, production, subresults, context):
+    def _unit_productions(self):
         """
-        Calls registered reduce action for the given grammar symbol.
+        Returns a set of the productions with a single RHS symbol whose
+        reductions don't change the result. Those are productions without
+        semantic actions or, when building the tree, all of them if actions
+        are not called during the tree build. Tree nodes of these productions
+        are still built in place (see `_parse_fast`), so when building the
+        tree skipping them saves only the parse stack operations.
         """
-        debug = self.debug
-        result = None
-        bt_result = None
+        tree_only = self.build_tree and not self.call_actions_during_tree_build
+        return set(p for _, p, length, _ in self._reductions
+                   if length == 1 and (tree_only or not p.symbol.action))
 
+    def _init_reduce_actions(self):
+        """
+        Creates reduce actions of the grammar productions for the parser
+        configuration. Reduce action is a callable `(context, subresults)`
+        which builds the tree node and/or calls the semantic action for the
+        production. Semantic actions used by `call_actions` are kept in
+        `_semantic_actions`.
+        """
+        productions = self.grammar.productions
+        self._semantic_actions = [semantic_reduce_action(p)
+                                  for p in productions]
         if self.build_tree:
-            # call action for building tree node if enabled.
-            if debug:
-                h_print("Building non-terminal node",
-                        "'{}'.".format(production.symbol.name), level=2)
-
-            bt_result = treebuild_reduce_action(context, nodes=subresults)
-            if not self.call_actions_during_tree_build:
-                return bt_result
-
-        sem_action = production.symbol.action
-        if sem_action:
-            assignments = production.assignments
-            if assignments:
-                assgn_results = {}
-                for a in assignments.values():
-                    if a.op == '=':
-                        assgn_results[a.name] = subresults[a.index]
-                    else:
-                        assgn_results[a.name] = bool(subresults[a.index])
-
-            if type(sem_action) is list:
-                if assignments:
-                    result = sem_action[production.prod_symbol_id](
-                        context, subresults, **assgn_results)
-                else:
-                    result = sem_action[production.prod_symbol_id](context,
-                                                                   subresults)
-            else:
-                if assignments:
-                    result = sem_action(context, subresults, **assgn_results)
+            tree_action = lazy_treebuild_reduce_action if self.lazy_values \
+                else treebuild_reduce_action
+            reduce_actions = []
+            for production, sem_action in zip(productions,
+                                              self._semantic_actions):
+                if self.call_actions_during_tree_build \
+                        and production.symbol.action:
+                    reduce_actions.append(
+                        _tree_semantic_action(tree_action, sem_action))
                 else:
-                    result = sem_action(context, subresults)
-
+                    reduce_actions.append(tree_action)
         else:
-            if debug:
+            reduce_actions = self._semantic_actions
+        if self.debug:
+            reduce_actions = [self._debug_reduce_action(p, a)
+                              for p, a in zip(productions, reduce_actions)]
+        self._reduce_actions = reduce_actions
+        # Reduce actions of the LR parsing loop (see `_StateActions`). Lengths
+        # of the productions are found once here as `len` of the RHS scans it
+        # for EMPTY symbols.
+        self._reductions = [(REDUCE, p, len(p.rhs), a)
+                            for p, a in zip(productions, reduce_actions)]
+        self._reduce_actions_key = self._reduce_actions_config()
+        # State actions refer to the reduce actions.
+        self._state_actions = None
+
+    def _reduce_actions_config(self):
+        # Actions of the symbols may be assigned after the parser is
+        # constructed so their version is a part of the configuration.
+        return (self.build_tree, self.call_actions_during_tree_build,
+                self.lazy_values, self.debug, GrammarSymbol.actions_version)
+
+    def _check_reduce_actions(self):
+        """
+        Creates reduce actions anew if the parser attributes or the symbol
+        actions they depend on have been changed since their creation.
+        """
+        if self._reduce_actions_key != self._reduce_actions_config():
+            self._init_reduce_actions()
+
+    def _debug_reduce_action(self, production, reduce_action):
+        """
+        Returns reduce action which reports the reduction by the given
+        production in debug mode.
+        """
+        def debug_reduce_action(context, subresults):
+            if self.build_tree:
+                h_print("Building non-terminal node",
+                        "'{}'.".format(production.symbol.name), level=2)
+            if not production.symbol.action:
                 h_print("No action defined",
                         " for '{}'.".format(production.symbol.name), level=1)
-            if len(subresults) == 1:
-                if debug:
-                    h_print("Unpacking a single subresult.", level=1)
-                result = subresults[0]
-            else:
-                if debug:
-                    h_print("Result is a list of subresults.", level=1)
-                result = subresults
-
-        if debug:
+            result = reduce_action(context, subresults)
             h_print("Action result =",
                     "type:{} value:{}"
                     .format(type(result), repr(result)), level=1)
-
-        # If build_tree is set to True, discard the result of the semantic
-        # action, and return the result of treebuild_reduce_action.
-        return bt_result if bt_result is not None else result
+            return result
+        return debug_reduce_action
 
     def _lexical_disambiguation(self, tokens):
         """
@@ -736,6 +1540,10 @@ class Context:
     pass
 
 
+# Initial size of the LR parse stack. See `Parser._parse_fast`.
+STACK_SIZE = 64
+
+
 class StackNode:
     __slots__ = ['state',
                  'start_position',
@@ -754,6 +1562,9 @@ class StackNode:
 
 class Node(object):
     """A node of the parse tree."""
+    # No `__slots__` here so that users may set their own attributes on the
+    # tree nodes.
+
     def __init__(self, start_position, end_position, layout_content=None):
         self.start_position = start_position
         self.end_position = end_position
@@ -839,6 +1650,64 @@ class NodeTerm(Node):
         return iter([])
 
 
+class LazyNodeNonTerm(NodeNonTerm):
+    """
+    Non-terminal node which keeps the input instead of its layout content. The
+    layout content is sliced from the input on access. See `lazy_values`
+    parser parameter.
+    """
+    __slots__ = ['input_str', 'layout_length']
+
+    def __init__(self, start_position, end_position, production, children,
+                 input_str, layout_length):
+        self.start_position = start_position
+        self.end_position = end_position
+        self.production = production
+        self.children = children
+        self.input_str = input_str
+        self.layout_length = layout_length
+
+    @property
+    def layout_content(self):
+        start = self.start_position
+        return self.input_str[start - self.layout_length:start]
+
+
+class LazyNodeTerm(NodeTerm):
+    """
+    Terminal node which keeps the input instead of its value and layout
+    content. The value is sliced from the input on the first access and the
+    layout content on each access. See `lazy_values` parser parameter.
+    """
+    __slots__ = ['input_str', 'layout_length', '_value']
+
+    def __init__(self, start_position, end_position, symbol, input_str,
+                 layout_length, value=None):
+        self.start_position = start_position
+        self.end_position = end_position
+        self.symbol = symbol
+        self.input_str = input_str
+        self.layout_length = layout_length
+        # Values which are not slices of the input are given.
+        self._value = value
+
+    @property
+    def value(self):
+        if self._value is None:
+            self._value = \
+                self.input_str[self.start_position:self.end_position]
+        return self._value
+
+    @value.setter
+    def value(self, value):
+        self._value = value
+
+    @property
+    def layout_content(self):
+        start = self.start_position
+        return self.input_str[start - self.layout_length:start]
+
+
 class Token(object):
     """
     Token or lexeme matched from the input.
@@ -860,6 +1729,788 @@ class Token(object):
         return True
 
 
+class TokenStream(object):
+    """
+    Tokens of the whole input recognized in advance by `Parser.tokenize`.
+
+    Tokens are kept in parallel arrays of terminal ids and start and end
+    positions. The last entry, whose terminal id is -1, is at the position
+    where no more tokens are recognized, i.e. at the end of the input or at the
+    invalid input.
+
+    Attributes:
+    input_str(str or list): The tokenized input.
+    terminals(tuple of Terminal): Terminals indexed by terminal id.
+    position(int): The position the tokenization started from.
+    symbol_ids(array of int): Terminal id of each token.
+    starts(array of int): Start position of each token.
+    ends(array of int): End position of each token.
+    values(dict): Token values which are not slices of the input keyed by token
+        index, e.g. values of string recognizers ignoring case.
+    """
+    __slots__ = ['input_str', 'terminals', 'position', 'symbol_ids', 'starts',
+                 'ends', 'values', '_next']
+
+    def __init__(self, input_str, terminals, position=0):
+        self.input_str = input_str
+        self.terminals = terminals
+        self.position = position
+        self.symbol_ids = array('i')
+        self.starts = array('l')
+        self.ends = array('l')
+        self.values = {}
+        # Index of the token following the last token found by `tokens`. Tokens
+        # are mostly looked up in order.
+        self._next = 0
+
+    def __len__(self):
+        return len(self.symbol_ids) - 1
+
+    def __getitem__(self, idx):
+        if not 0 <= idx < len(self):
+            raise IndexError('Token index out of range.')
+        value = self.values.get(idx)
+        if value is None:
+            value = self.input_str[self.starts[idx]:self.ends[idx]]
+        return Token(self.terminals[self.symbol_ids[idx]], value)
+
+    def layout_end(self, position):
+        """
+        Returns the start position of the next token if the given position is
+        where the layout before the token starts, i.e. at the end of the
+        previous token. Returns `None` otherwise.
+        """
+        idx = self._next
+        ends = self.ends
+        if not (0 < idx < len(ends) and ends[idx - 1] == position):
+            idx = bisect_left(self.starts, position)
+            if idx == len(ends) \
+                    or position != (ends[idx - 1] if idx else self.position):
+                return None
+        return self.starts[idx]
+
+    def tokens(self, position, terminals):
+        """
+        Returns the list of the token starting at the given position if its
+        terminal is among the given terminals. Returns an empty list if no
+        token of the given terminals is recognized at the position and `None`
+        if the position is not the start of a token.
+        """
+        idx = self._next
+        starts = self.starts
+        if not (idx < len(starts) and starts[idx] == position):
+            idx = bisect_left(starts, position)
+            if idx == len(starts) or starts[idx] != position:
+                return None
+        self._next = idx + 1
+        symbol_id = self.symbol_ids[idx]
+        if symbol_id < 0:
+            return []
+        terminal = self.terminals[symbol_id]
+        if terminal not in terminals:
+            return []
+        end = self.ends[idx]
+        value = self.values.get(idx) if self.values else None
+        if value is None:
+            value = self.input_str[position:end]
+        return [Token(terminal, value, end - position)]
+
+
+class InputWindow(object):
+    """
+    A window of the input streamed by `Parser.parse_stream`.
+
+    The input is read in chunks while parsing. The window starts at the
+    position of the token currently recognized by the parser and holds at
+    least `chunk_size` characters ahead of it if the input is not exhausted.
+    Positions are absolute, i.e. from the beginning of the input, and slicing
+    the window by positions before its start gives only the part still in the
+    window.
+
+    Attributes:
+    buffer(str or bytes): The text of the window.
+    offset(int): The position of the window start.
+    chunk_size(int): The number of characters read at once.
+    eof(bool): `True` if the whole input is read.
+    line(int): The line of the window start.
+    line_start(int): The position of the `line` start.
+    """
+    __slots__ = ['buffer', 'offset', 'chunk_size', 'eof', 'line',
+                 'line_start', '_chunks']
+
+    def __init__(self, stream, chunk_size):
+        read = getattr(stream, 'read', None)
+        if read is not None:
+            self._chunks = iter(lambda: read(chunk_size) or None, None)
+        else:
+            self._chunks = iter(stream)
+        self.chunk_size = chunk_size
+        self.offset = 0
+        self.line = 1
+        self.line_start = 0
+        chunk = next(self._chunks, None)
+        self.eof = chunk is None
+        self.buffer = '' if chunk is None else chunk
+
+    def __len__(self):
+        return self.offset + len(self.buffer)
+
+    def __getitem__(self, idx):
+        offset = self.offset
+        if isinstance(idx, slice):
+            start = max((idx.start or 0) - offset, 0)
+            stop = None if idx.stop is None else max(idx.stop - offset, 0)
+            return self.buffer[start:stop]
+        if idx < offset:
+            raise IndexError('Position is before the input window.')
+        return self.buffer[idx - offset]
+
+    def fill(self, position):
+        """
+        Reads the input so that the window holds `chunk_size` characters
+        ahead of the given position. Returns the buffer and the position in the
+        buffer.
+        """
+        local = position - self.offset
+        while not self.eof and len(self.buffer) - local < self.chunk_size:
+            self.extend()
+        return self.buffer, local
+
+    def extend(self):
+        """
+        Reads the next chunk of the input into the window.
+        """
+        chunk = next(self._chunks, None)
+        if chunk is None:
+            self.eof = True
+        else:
+            self.buffer += chunk
+
+    def grow(self, position):
+        """
+        Reads the input so that the window holds at least twice as many
+        characters ahead of the given position. Text recognized again after
+        each growth is thus recognized in linear time in total.
+        """
+        ahead = len(self.buffer) - (position - self.offset)
+        size = len(self.buffer) + max(ahead, self.chunk_size)
+        while not self.eof and len(self.buffer) < size:
+            self.extend()
+
+    def release(self, position):
+        """
+        Drops the text before the given position from the window. The text is
+        dropped once it grows to `chunk_size` to avoid copying the buffer on
+        each token.
+        """
+        cut = position - self.offset
+        if cut >= self.chunk_size:
+            newline = b'\n' if isinstance(self.buffer, binary) else '\n'
+            dropped = self.buffer[:cut]
+            lines = dropped.count(newline)
+            if lines:
+                self.line += lines
+                self.line_start = self.offset + dropped.rfind(newline) + 1
+            self.buffer = self.buffer[cut:]
+            self.offset = position
+
+    def line_col(self, position):
+        """
+        Returns the (line, column) of the given position. Both are `None` for
+        positions before the window.
+        """
+        if position < self.offset:
+            return None, None
+        line, column = pos_to_line_col(self.buffer, position - self.offset)
+        if line == 1:
+            return self.line, position - self.line_start
+        return self.line + line - 1, column
+
+
+class Scanner(object):
+    """
+    Recognizes tokens for the expected terminals given in the order of
+    recognition. Gives the same tokens as trying terminal recognizers one at a
+    time (see `Parser._token_recognition`).
+
+    Consecutive terminals with string and regex recognizers are tried by a
+    single regex which is an alternation of their patterns. The first
+    alternative that matches is the first of these terminals whose recognizer
+    would match. Regexes are compiled on the first use. Other recognizers are
+    called one at a time.
+
+    Terminals are indexed by the first characters of their tokens (see
+    `Recognizer.first_chars`). For each character found at the scan position
+    the scan is done by a scanner of the terminals whose tokens may start with
+    that character. These scanners are created on the first use and shared by
+    the characters with the same terminals.
+
+    Keywords (see `Grammar._fix_keyword_terminals`) consisting of word
+    characters match on word boundaries, so the only keyword which may match is
+    the word at the scan position. The word is matched once and looked up in
+    the table of keywords. The scan is done by a scanner without the other
+    keywords.
+
+    Attributes:
+    terminals(tuple of Terminal): Expected terminals.
+    finish_flags(tuple of bool): Finish flag for each expected terminal.
+    """
+    __slots__ = ['terminals', 'finish_flags', '_priors', '_patterns',
+                 '_values', '_ignore_case', '_run_ends', '_regexes',
+                 '_first_chars', '_dispatch', '_char_scanners', '_keywords',
+                 '_keyword_scanners']
+
+    def __init__(self, terminals, finish_flags, dispatch=True, keywords=True):
+        self.terminals = tuple(terminals)
+        self.finish_flags = tuple(finish_flags)
+        self._priors = [t.prior for t in self.terminals]
+        self._patterns = [_terminal_pattern(t) for t in self.terminals]
+
+        # Token values of string recognizers. Recognizers ignoring case return
+        # the string as given in the grammar.
+        self._values = [t.recognizer.value
+                        if type(t.recognizer) is StringRecognizer else None
+                        for t in self.terminals]
+        self._ignore_case = [value is not None and t.recognizer.ignore_case
+                             for t, value in zip(self.terminals,
+                                                 self._values)]
+
+        # Index after the run of terminals with patterns for each terminal.
+        self._run_ends = [None] * len(self.terminals)
+        run_end = len(self.terminals)
+        for idx in reversed(range(len(self.terminals))):
+            if self._patterns[idx] is None:
+                run_end = idx
+            self._run_ends[idx] = run_end
+
+        # Regex and its group to terminal index map for each terminal.
+        self._regexes = [None] * len(self.terminals)
+
+        # Scanner for each character found at the scan position. Not used if
+        # any character may start tokens of all terminals.
+        self._dispatch = None
+        if dispatch:
+            self._first_chars = [
+                t.recognizer.first_chars()
+                if isinstance(t.recognizer, Recognizer) else None
+                for t in self.terminals]
+            if any(f is not None for f in self._first_chars):
+                self._dispatch = {}
+                self._char_scanners = {}
+
+        # Indexes of keyword terminals by the keyword and by the lowered
+        # keyword if case is ignored. Keywords with other than word characters
+        # or with non-ASCII characters while ignoring case are always tried.
+        # Used only for many keywords as the combined regex quickly rejects a
+        # few keywords.
+        self._keywords = None
+        if keywords:
+            exact = {}
+            lowered = {}
+            for idx, terminal in enumerate(self.terminals):
+                if not terminal.keyword \
+                        or type(terminal.recognizer) is not RegExRecognizer:
+                    continue
+                value = terminal.recognizer._regex[2:-2]
+                m = _WORD.match(value)
+                if m is None or m.end() != len(value):
+                    continue
+                if terminal.recognizer.ignore_case:
+                    if _NON_ASCII.search(value):
+                        continue
+                    lowered[value.lower()] = \
+                        lowered.get(value.lower(), ()) + (idx,)
+                else:
+                    exact[value] = exact.get(value, ()) + (idx,)
+            if len(exact) + len(lowered) >= _MIN_KEYWORDS:
+                self._keywords = (exact, lowered)
+                self._keyword_scanners = {}
+
+    def scan(self, input_str, position):
+        """
+        Returns a list of tokens recognized at the given position.
+        """
+        scanner = self
+        if self._dispatch is not None and position < len(input_str):
+            char = input_str[position]
+            scanner = self._dispatch.get(char)
+            if scanner is None:
+                scanner = self._dispatch[char] = self._char_scanner(char)
+        if scanner._keywords is not None:
+            scanner = scanner._keyword_scanner(input_str, position)
+        return scanner._scan(input_str, position)
+
+    def _scan(self, input_str, position):
+        """
+        Returns a list of tokens recognized at the given position by trying
+        all terminals of this scanner.
+        """
+        terminals = self.terminals
+        finish_flags = self.finish_flags
+        priors = self._priors
+        run_ends = self._run_ends
+        tokens = []
+        tokens_prior = None
+        idx = 0
+        count = len(terminals)
+        while idx < count:
+            if tokens and priors[idx] < tokens_prior:
+                break
+            if run_ends[idx] == idx:
+                match_idx = idx
+                value = terminals[idx].recognizer(input_str, position)
+            else:
+                regex = self._regexes[idx]
+                if regex is None:
+                    regex = self._compile(idx)
+                    if regex is None:
+                        continue
+                regex, groups = regex
+                m = regex.match(input_str, position)
+                if m is None:
+                    idx = run_ends[idx]
+                    continue
+                match_idx = groups[m.lastindex]
+                if tokens and priors[match_idx] < tokens_prior:
+                    break
+                value = self._values[match_idx]
+                if value is None:
+                    value = m.group()
+                elif self._ignore_case[match_idx]:
+                    # Regex ignoring case matches some characters which are
+                    # not equal when lowered, e.g. 'ſ' and 's'.
+                    value = terminals[match_idx].recognizer(input_str,
+                                                            position)
+
+            if value:
+                if not tokens:
+                    tokens_prior = priors[match_idx]
+                tokens.append(Token(terminals[match_idx], value))
+                if finish_flags[match_idx]:
+                    break
+            idx = match_idx + 1
+
+        return tokens
+
+    def _compile(self, idx):
+        """
+        Compiles the regex for the terminals from the given index to the end
+        of the run. If the patterns can't be combined, the terminals of the
+        run are recognized one at a time and `None` is returned.
+        """
+        run_end = self._run_ends[idx]
+        alternatives = []
+        groups = {}
+        group = 1
+        for term_idx in range(idx, run_end):
+            pattern = self._patterns[term_idx]
+            alternatives.append('({})'.format(pattern))
+            groups[group] = term_idx
+            group += 1 + re.compile(pattern, re.MULTILINE).groups
+        try:
+            regex = re.compile('|'.join(alternatives), re.MULTILINE)
+        except re.error:
+            regex = None
+        if regex is None or regex.groups != group - 1:
+            for term_idx in range(idx, run_end):
+                self._patterns[term_idx] = None
+                self._run_ends[term_idx] = term_idx
+            return None
+        self._regexes[idx] = (regex, groups)
+        return self._regexes[idx]
+
+    def _char_scanner(self, char):
+        """
+        Returns the scanner of the terminals whose tokens may start with the
+        given character.
+        """
+        non_ascii = char > '\x7f'
+        indexes = tuple(idx for idx, first in enumerate(self._first_chars)
+                        if first is None or char in first[0]
+                        or (non_ascii and first[1]))
+        if len(indexes) == len(self.terminals):
+            return self
+        scanner = self._char_scanners.get(indexes)
+        if scanner is None:
+            scanner = self._char_scanners[indexes] = Scanner(
+                [self.terminals[idx] for idx in indexes],
+                [self.finish_flags[idx] for idx in indexes], dispatch=False)
+        return scanner
+
+    def _keyword_scanner(self, input_str, position):
+        """
+        Returns the scanner of the terminals without the keywords from the
+        table of keywords which don't match at the given position.
+        """
+        exact, lowered = self._keywords
+        matched = ()
+        m = _WORD.match(input_str, position)
+        if m is not None:
+            word = m.group()
+            matched = exact.get(word, ())
+            if lowered:
+                # Some non-ASCII characters are equal to ASCII characters
+                # when case is ignored by regexes.
+                if _NON_ASCII.search(word):
+                    return self
+                matched += lowered.get(word.lower(), ())
+        scanner = self._keyword_scanners.get(matched)
+        if scanner is None:
+            keywords = set(idx for idxs in exact.values() for idx in idxs)
+            keywords.update(idx for idxs in lowered.values() for idx in idxs)
+            indexes = [idx for idx in range(len(self.terminals))
+                       if idx not in keywords or idx in matched]
+            scanner = self._keyword_scanners[matched] = Scanner(
+                [self.terminals[idx] for idx in indexes],
+                [self.finish_flags[idx] for idx in indexes], dispatch=False,
+                keywords=False)
+        return scanner
+
+
+# Scoped inline flags, e.g. `(?i:...)`, are supported since Python 3.6.
+_SCOPED_FLAGS = sys.version_info >= (3, 6)
+
+# Regex constructs which can't be used inside of a combined regex. Group
+# references depend on the group numbers and global flags apply to the whole
+# regex.
+_NOT_COMBINABLE = re.compile(r'\\[1-9]|\(\?P=|\(\?\(|\(\?[aiLmsux]+\)')
+
+# Minimal number of keywords for the lookup in the table of keywords.
+_MIN_KEYWORDS = 30
+
+_WORD = re.compile(r'\w+', re.UNICODE)
+_NON_ASCII = re.compile('[^\x00-\x7f]')
+
+
+def _terminal_pattern(terminal):
+    """
+    Returns a regex pattern equivalent to the recognizer of the given terminal
+    or `None` if the recognizer is not a string or regex recognizer which can
+    be combined with other patterns.
+    """
+    recognizer = terminal.recognizer
+    if type(recognizer) is StringRecognizer:
+        pattern = re.escape(recognizer.value)
+    elif type(recognizer) is RegExRecognizer:
+        re_flags = recognizer.re_flags & ~re.IGNORECASE
+        if re_flags != re.MULTILINE \
+                or _NOT_COMBINABLE.search(recognizer._regex):
+            return None
+        pattern = recognizer._regex
+    else:
+        return None
+    if recognizer.ignore_case:
+        if not _SCOPED_FLAGS:
+            return None
+        pattern = '(?i:{})'.format(pattern)
+    return pattern
+
+
+def _window_may_continue(terminals, buffer, position):
+    """
+    Returns `True` if a token of any of the given terminals may be recognized
+    at the position in the buffer when more input is read, i.e. if the text
+    from the position to the end of the buffer may start the token.
+    """
+    if position >= len(buffer):
+        return True
+    is_binary = isinstance(buffer, binary)
+    for terminal in terminals:
+        if terminal in (STOP, EMPTY, EOF):
+            continue
+        recognizer = terminal.recognizer
+        if not isinstance(recognizer, Recognizer):
+            return True
+        prefix = recognizer.literal_prefix()
+        if is_binary:
+            prefix = prefix.encode('utf-8')
+        if not prefix.startswith(buffer[position:position + len(prefix)]):
+            continue
+        if not prefix and not is_binary:
+            first = recognizer.first_chars()
+            if first is not None:
+                chars, non_ascii = first
+                char = buffer[position]
+                if char not in chars and not (non_ascii and char > '\x7f'):
+                    continue
+        return True
+    return False
+
+
+def _layout_regex(layout):
+    """
+    Returns a regex matching the same layout as the layout sub-parser for the
+    given `LAYOUT` non-terminal or `None` if there is no such regex.
+
+    The regex is made if the layout is an optional repetition of terminals
+    (e.g. whitespaces and comments) whose tokens can't start the same way,
+    i.e. they start with different characters or with different literal
+    prefixes. Then at most one of the terminals is recognized at any
+    position, so the layout sub-parser shifts the terminals as long as they
+    are recognized, the same as the regex repeats the alternation of their
+    patterns. Actions other than built-in parglare actions may have side
+    effects, so the layout sub-parser is used if they are given for the layout
+    rules.
+    """
+    language = _repetition(layout, set())
+    if language is None:
+        return None
+    terminals, repeated, empty = language
+    if not empty:
+        return None
+
+    alternatives = []
+    starts = []
+    for terminal in sorted(terminals, key=lambda t: t.fqn):
+        pattern = _terminal_pattern(terminal)
+        if pattern is None or not _builtin_action(terminal.action):
+            return None
+        start = _token_start(terminal)
+        if start[0] is None:
+            return None
+        if any(_may_start_same(start, other) for other in starts):
+            return None
+        starts.append(start)
+        chars, non_ascii = start[0]
+
+        # Pattern is tried only at its first characters so that empty match
+        # doesn't stop the repetition if other pattern would match.
+        lookahead = []
+        if chars:
+            lookahead.append('[{}]'.format(
+                ''.join(re.escape(c) for c in sorted(chars))))
+        if non_ascii:
+            lookahead.append('[^\x00-\x7f]')
+        if lookahead:
+            alternatives.append(
+                '(?={})(?:{})'.format('|'.join(lookahead), pattern))
+    regex = '(?:{}){}'.format('|'.join(alternatives) or '(?!)',
+                              '*' if repeated else '?')
+    try:
+        return re.compile(regex, re.MULTILINE)
+    except re.error:
+        return None
+
+
+def _token_start(terminal):
+    """
+    Returns a tuple of the first characters (see `Recognizer.first_chars`) and
+    the literal prefix of the tokens of the given terminal.
+    """
+    return (terminal.recognizer.first_chars(),
+            terminal.recognizer.literal_prefix())
+
+
+def _may_start_same(start, other):
+    """
+    Tells if tokens with the given starts (see `_token_start`) may be
+    recognized at the same position. They can't if they start with different
+    characters or with different literal prefixes.
+    """
+    (first_chars, prefix), (other_first_chars, other_prefix) = start, other
+    if first_chars is not None and other_first_chars is not None:
+        chars, non_ascii = first_chars
+        other_chars, other_non_ascii = other_first_chars
+        if not (chars & other_chars
+                or (non_ascii and (other_non_ascii or _NON_ASCII.search(
+                    ''.join(other_chars))))
+                or (other_non_ascii and _NON_ASCII.search(''.join(chars)))):
+            return False
+    return not prefix or not other_prefix or prefix.startswith(other_prefix) \
+        or other_prefix.startswith(prefix)
+
+
+def _check_lexer_terminals(table, start_productions):
+    """
+    Returns a tuple of the terminals recognized in pre-tokenization mode and
+    their finish flags. These are the terminals expected in the states reached
+    from the given start productions. Raises ParserInitError if tokens of the
+    terminals may depend on the parser state.
+
+    Tokens don't depend on the state if each state expects either all or none
+    of the terminals which may be recognized at the same position. Then the
+    tokens recognized at any position are either the same as those recognized
+    for the terminals expected in the state or none of them is expected.
+    """
+    states = set()
+    for start_production in start_productions:
+        states.update(table.reachable_states(start_production))
+    states = [table.states[state_id] for state_id in sorted(states)]
+
+    terminals = set()
+    for state in states:
+        terminals.update(state.actions)
+    terminals.difference_update([EMPTY, EOF, STOP])
+    terminals = sorted(terminals, key=lambda t: t.fqn)
+    starts = [_token_start(t) for t in terminals]
+    same_start = dict(
+        (terminal, [other for other, other_start in zip(terminals, starts)
+                    if other is not terminal
+                    and _may_start_same(start, other_start)])
+        for terminal, start in zip(terminals, starts))
+
+    for state in states:
+        actions = state.actions
+        for terminal in actions:
+            for other in same_start.get(terminal, []):
+                if other not in actions:
+                    raise ParserInitError(
+                        'Terminals "{}" and "{}" may be recognized at the '
+                        'same position but only "{}" is expected in state '
+                        '{}. Input can\'t be tokenized in advance.'.format(
+                            terminal.name, other.name, terminal.name,
+                            state.state_id))
+
+    terminals, finish_flags = order_terminals(terminals)
+    return tuple(terminals), tuple(finish_flags)
+
+
+class _StateActions(object):
+    """
+    Actions the LR parser takes in the states of the table, kept in lists
+    indexed by LR state id. The actions of a state are prepared by `build` the
+    first time the parser reaches the state, so the first parse doesn't pay
+    for the states it doesn't reach.
+
+    Attributes:
+    actions(list): Dicts of the actions keyed by terminal or `None` if not
+        built yet. Shift action is `(SHIFT, state)`, reduce action is taken
+        from the `reductions` given and accept action is `(ACCEPT,)`. See
+        `Parser.parse` for the choice among the state actions.
+    default_reductions(list): Default reduce actions of the states or `None`
+        (see `LRState.default_reduction`).
+    unit_reductions(list): `None` if `unit_productions` are not given.
+        Otherwise, reductions by the given unit productions the states do. It
+        is the production if it is the default reduction of the state, a dict
+        of the productions keyed by terminal or `None` if there are no such
+        reductions.
+    """
+    __slots__ = ['actions', 'default_reductions', 'unit_reductions',
+                 '_reductions', '_unit_productions']
+
+    def __init__(self, table, reductions, unit_productions=None):
+        """
+        Args:
+        reductions(list): Reduce actions `(REDUCE, production, production
+            length, reduce action)` indexed by production id.
+        unit_productions(set of Production): Reductions to skip or `None`.
+        """
+        states_count = len(table.states)
+        self.actions = [None] * states_count
+        self.default_reductions = [None] * states_count
+        self.unit_reductions = None if unit_productions is None \
+            else [None] * states_count
+        self._reductions = reductions
+        self._unit_productions = unit_productions
+
+    def build(self, state):
+        """
+        Prepares the actions of the given state. Returns the dict of the state
+        actions.
+        """
+        reductions = self._reductions
+        unit_productions = self._unit_productions
+        prod = state.default_reduction
+        if prod is not None:
+            self.default_reductions[state.state_id] = \
+                reductions[prod.prod_id]
+        if unit_productions is not None:
+            if prod is not None:
+                units = prod if prod in unit_productions else None
+            else:
+                units = dict((terminal, acts[0].prod)
+                             for terminal, acts in state.actions.items()
+                             if len(acts) == 1 and acts[0].action is REDUCE
+                             and acts[0].prod in unit_productions) or None
+            self.unit_reductions[state.state_id] = units
+        actions = {}
+        for terminal, acts in state.actions.items():
+            if not acts:
+                continue
+            act = acts[0]
+            # Empty reduction is taken only if it is the only action.
+            if act.action is REDUCE and not act.prod.rhs and len(acts) > 1:
+                act = acts[1]
+            if act.action is SHIFT:
+                actions[terminal] = (SHIFT, act.state)
+            elif act.action is REDUCE:
+                actions[terminal] = reductions[act.prod.prod_id]
+            else:
+                actions[terminal] = (ACCEPT,)
+        self.actions[state.state_id] = actions
+        return actions
+
+
+def _repetition(symbol, visiting):
+    """
+    Returns a tuple of terminals, repetition flag and empty flag if the
+    language of the given grammar symbol is one of the terminals or a
+    repetition of the terminals if the repetition flag is set. The language
+    includes an empty string if the empty flag is set. Returns `None` for
+    other languages.
+    """
+    if isinstance(symbol, Terminal):
+        if symbol is EMPTY:
+            return frozenset(), False, True
+        return frozenset([symbol]), False, False
+    if symbol in visiting or not _builtin_action(symbol.action):
+        return None
+
+    visiting.add(symbol)
+    try:
+        # Languages of non-recursive productions and of the symbols repeated
+        # by left or right recursive productions.
+        languages = []
+        repeated = []
+        for production in symbol.productions:
+            rhs = list(production.rhs)
+            if len(rhs) == 2 and (rhs[0] is symbol) != (rhs[1] is symbol):
+                other = rhs[1] if rhs[0] is symbol else rhs[0]
+                language = _repetition(other, visiting)
+                repeated.append(language)
+            elif len(rhs) == 1:
+                language = _repetition(rhs[0], visiting)
+                languages.append(language)
+            elif not rhs:
+                language = (frozenset(), False, True)
+                languages.append(language)
+            else:
+                return None
+            if language is None:
+                return None
+    finally:
+        visiting.discard(symbol)
+
+    terminals = frozenset().union(*[t for t, _, _ in languages])
+    empty = any(e for _, _, e in languages)
+    if repeated:
+        repeated_terminals = frozenset().union(*[t for t, _, _ in repeated])
+        # Repetition of the repeated terminals with at least one of the
+        # terminals of non-recursive productions.
+        if not terminals <= repeated_terminals \
+                or not (empty or terminals == repeated_terminals):
+            return None
+        return repeated_terminals, True, empty
+
+    repetitions = [t for t, r, _ in languages if r]
+    if repetitions:
+        if any(t != repetitions[0] for t in repetitions) \
+                or not terminals <= repetitions[0]:
+            return None
+        return repetitions[0], True, empty
+    return terminals, False, empty
+
+
+def _builtin_action(action):
+    """
+    Returns `True` if the given action is not given or is one of the built-in
+    actions, i.e. the action has no side effects.
+    """
+    actions = action if type(action) is list else [action]
+    return all(a is None or getattr(a, '__module__', None) in
+               ('parglare.actions', 'parglare.grammar') for a in actions)
+
+
 STOP_token = Token(STOP)
 EMPTY_token = Token(EMPTY)
 EOF_token = Token(EOF)
@@ -879,24 +2530,116 @@ def treebuild_reduce_action(context, nodes):
                            context.production, nodes, context.layout_content)
 
 
-def pos_to_line_col(input_str, position):
+def lazy_treebuild_reduce_action(context, nodes):
+    # Layout content of the node is the layout before its first child.
+    if nodes:
+        return LazyNodeNonTerm(nodes[0].start_position, nodes[-1].end_position,
+                               context.production, nodes, context.input_str,
+                               nodes[0].layout_length)
+    else:
+        return LazyNodeNonTerm(context.start_position, context.end_position,
+                               context.production, nodes, context.input_str,
+                               len(context.layout_content))
+
+
+def semantic_reduce_action(production):
+    """
+    Returns a callable `(context, subresults)` calling the semantic action of
+    the given production. The action is taken from the list of actions of the
+    production symbol if needed and results of assignments are passed as
+    keyword arguments. If there is no action the result is a single subresult
+    or the list of subresults.
+    """
+    sem_action = production.symbol.action
+    if not sem_action:
+        return _pass_subresults
+    if type(sem_action) is list:
+        sem_action = sem_action[production.prod_symbol_id]
+    if not production.assignments:
+        return sem_action
+
+    assignments = [(a.name, a.index, a.op == '=')
+                   for a in production.assignments.values()]
+
+    def assignments_action(context, subresults):
+        assgn_results = {}
+        for name, index, plain in assignments:
+            assgn_results[name] = subresults[index] if plain \
+                else bool(subresults[index])
+        return sem_action(context, subresults, **assgn_results)
+    return assignments_action
+
+
+def _pass_subresults(context, subresults):
+    # Unpack if single subresult
+    if len(subresults) == 1:
+        return subresults[0]
+    return subresults
+
+
+def _tree_semantic_action(tree_action, sem_action):
+    """
+    Returns reduce action building the tree node and calling the semantic
+    action during the tree build. The result is the tree node.
+    """
+    def tree_semantic_action(context, subresults):
+        node = tree_action(context, subresults)
+        sem_action(context, subresults)
+        return node
+    return tree_semantic_action
+
+
+def pos_to_line_col(input_str, position, line_starts=None):
     """
     Returns position in the (line,column) form.
+
+    `line_starts` is the line start index of the input (see
+    `parglare.common.LineStarts`) kept by the caller to convert many positions
+    without rescanning the input.
     """
+    if type(input_str) is InputWindow:
+        return input_str.line_col(position)
 
-    if type(input_str) is not text:
+    if line_starts is None or line_starts.input_str is not input_str:
+        line_starts = LineStarts(input_str)
+    starts = line_starts.starts(position)
+    if starts is None:
         # If we are not parsing string
         return 1, position
 
-    line = 1
-    old_pos = 0
+    line = bisect_right(starts, position)
+    return line, position - starts[line - 1]
+
+
+def pos_to_line_cols(input_str, positions, line_starts=None):
+    """
+    Returns the list of (line,column) of the given positions. Positions are
+    converted at once by NumPy if it is installed. See `pos_to_line_col` for
+    `line_starts`.
+    """
+    if type(input_str) is InputWindow:
+        return [input_str.line_col(position) for position in positions]
+
+    positions = list(positions)
+    if line_starts is None or line_starts.input_str is not input_str:
+        line_starts = LineStarts(input_str)
+    starts = line_starts.starts(max(positions) if positions else 0)
+    if starts is None:
+        return [(1, position) for position in positions]
+
     try:
-        cur_pos = input_str.index("\n")
-        while cur_pos < position:
-            line += 1
-            old_pos = cur_pos + 1
-            cur_pos = input_str.index("\n", cur_pos + 1)
-    except ValueError:
+        import numpy
+    except ImportError:
         pass
-
-    return line, position - old_pos
+    else:
+        starts_array = numpy.frombuffer(starts, dtype=starts.typecode)
+        positions = numpy.array(positions, dtype=starts.typecode)
+        lines = numpy.searchsorted(starts_array, positions, side='right')
+        columns = positions - starts_array[lines - 1]
+        return list(zip(lines.tolist(), columns.tolist()))
+
+    result = []
+    for position in positions:
+        line = bisect_right(starts, position)
+        result.append((line, position - starts[line - 1]))
+    return result
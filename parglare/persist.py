@@ -0,0 +1,266 @@
+# -*- coding: utf-8 -*-
+"""
+Persistence of LR tables.
+
+Table construction is the most expensive part of the parser initialization.
+Tables are stored in `.pgt` JSON files and are reused as long as the grammar
+fingerprint and table construction parameters are the same.
+"""
+from __future__ import unicode_literals
+import codecs
+import hashlib
+import json
+import os
+from os import path
+from collections import OrderedDict
+from .grammar import StringRecognizer, RegExRecognizer, AUGSYMBOL
+from .closure import LR_1
+from .tables import create_table, LRTable, LRState, LRItem, Action, \
+    REDUCE, _augmented_productions, _default_reduction
+
+# Increment this each time the table format changes in an incompatible way.
+TABLE_FORMAT_VERSION = 1
+
+TABLE_FILE_EXT = '.pgt'
+
+
+def grammar_fingerprint(grammar):
+    """
+    Returns a stable digest (hex string) of all the grammar properties which
+    are used in LR table construction: productions with their disambiguation
+    rules, terminals with their recognizers and disambiguation rules. Imported
+    grammar symbols are identified by their fully qualified names.
+    """
+    from parglare import __version__
+
+    def recognizer_descr(recognizer):
+        if type(recognizer) is StringRecognizer:
+            return ['str', recognizer.value, recognizer.ignore_case]
+        elif type(recognizer) is RegExRecognizer:
+            return ['regex', recognizer._regex, recognizer.ignore_case]
+        else:
+            return ['custom']
+
+    # Production 0 (augmented production) is changed during table
+    # construction depending on the start production so it is left out.
+    productions = [[p.symbol.fqn, [s.fqn for s in list(p.rhs)],
+                    p.assoc, p.prior, p.dynamic, p.nops, p.nopse]
+                   for p in grammar.productions[1:]]
+    terminals = [[t.fqn, t.prior, t.finish, t.prefer, t.dynamic,
+                  t.keyword, recognizer_descr(t.recognizer)]
+                 for t in sorted(grammar.terminals, key=lambda t: t.fqn)]
+
+    content = json.dumps({'parglare': __version__,
+                          'format': TABLE_FORMAT_VERSION,
+                          'productions': productions,
+                          'terminals': terminals}, sort_keys=True)
+    return hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+
+def table_key(itemset_type=LR_1, start_productions=(1,), prefer_shifts=False,
+              prefer_shifts_over_empty=True, lalr_dp=False):
+    """
+    Returns a string which identifies table construction parameters. Tables for
+    the same grammar built with different parameters (e.g. LR and GLR parser,
+    layout sub-parser) are stored under different keys in the same table file.
+    """
+    return '{}:{}:{}:{}:{}'.format(itemset_type,
+                                   ','.join(str(p) for p in start_productions),
+                                   int(bool(prefer_shifts)),
+                                   int(bool(prefer_shifts_over_empty)),
+                                   int(bool(lalr_dp)))
+
+
+def table_file_name(grammar, table_cache, fingerprint=None):
+    """
+    Returns the name of the table file for the given grammar or None if tables
+    can't be cached.
+
+    Args:
+    grammar(Grammar):
+    table_cache(bool or str): If `True` table file is stored beside the
+        grammar file (`<grammar>.pgt`). If string it is the name of the cache
+        folder where table files are named by the grammar fingerprint.
+    """
+    if not table_cache:
+        return None
+    if table_cache is True:
+        if not grammar.file_path:
+            return None
+        return path.splitext(grammar.file_path)[0] + TABLE_FILE_EXT
+    if fingerprint is None:
+        fingerprint = grammar_fingerprint(grammar)
+    return path.join(table_cache, fingerprint + TABLE_FILE_EXT)
+
+
+def table_to_serializable(table):
+    """
+    Returns LRTable in the form of JSON serializable structure.
+    Grammar symbols are referenced by FQN and productions by id.
+    """
+    states = []
+    for state in table.states:
+        actions = []
+        for symbol, acts in state.actions.items():
+            actions.append([symbol.fqn,
+                            [[a.action,
+                              a.prod.prod_id if a.action is REDUCE
+                              else a.state.state_id]
+                             for a in acts]])
+        states.append({
+            'symbol': state.symbol.fqn,
+            'items': [[i.production.prod_id, i.position,
+                       sorted([t.fqn for t in i.follow])]
+                      for i in state.items],
+            'actions': actions,
+            'gotos': [[symbol.fqn, target.state_id]
+                      for symbol, target in state.gotos.items()],
+            'finish_flags': state.finish_flags,
+        })
+    return states
+
+
+def table_from_serializable(states_data, grammar, start_productions=(1,)):
+    """
+    Creates LRTable from the structure produced by `table_to_serializable` and
+    connects it to the given grammar.
+    """
+    symbols = {s.fqn: s for s in grammar.nonterminals}
+    symbols.update({s.fqn: s for s in grammar.terminals})
+
+    # Augmented productions are created during table construction. Those
+    # beside production 0 are numbered after the grammar productions.
+    aug_prods = _augmented_productions(grammar, start_productions)
+    productions = list(grammar.productions)
+    productions.extend(sorted(set(aug_prods.values()) - set(productions),
+                              key=lambda p: p.prod_id))
+
+    states = []
+    for state_id, state_data in enumerate(states_data):
+        items = [LRItem(productions[prod_id], position,
+                        set([symbols[t] for t in follow]))
+                 for prod_id, position, follow in state_data['items']]
+        states.append(LRState(grammar, state_id,
+                              symbols[state_data['symbol']], items))
+
+    for state, state_data in zip(states, states_data):
+        for symbol_fqn, acts in state_data['actions']:
+            state.actions[symbols[symbol_fqn]] = [
+                Action(action, prod=productions[target])
+                if action == REDUCE
+                else Action(action, state=states[target])
+                for action, target in acts]
+        for symbol_fqn, target in state_data['gotos']:
+            state.gotos[symbols[symbol_fqn]] = states[target]
+        state.finish_flags = state_data['finish_flags']
+        state.default_reduction = _default_reduction(state)
+
+    # Start states have a single augmented item.
+    start_states = dict((state.items[0].production, state)
+                        for state in states if state.symbol is AUGSYMBOL)
+    start_states = OrderedDict((prod_id, start_states[aug_prod])
+                               for prod_id, aug_prod in aug_prods.items())
+
+    table = LRTable(states, grammar=grammar, start_states=start_states)
+    table.calc_conflicts()
+    return table
+
+
+def load_table(file_name, grammar, key, start_productions=(1,),
+               fingerprint=None):
+    """
+    Loads table from the given table file. Returns None if the file doesn't
+    exist, is not readable or doesn't contain table for the current grammar
+    fingerprint and the given construction parameters key.
+    """
+    try:
+        with codecs.open(file_name, 'r', encoding='utf-8') as f:
+            content = json.load(f)
+    except (IOError, OSError, ValueError):
+        return None
+
+    if fingerprint is None:
+        fingerprint = grammar_fingerprint(grammar)
+    if content.get('fingerprint') != fingerprint \
+            or key not in content.get('tables', {}):
+        return None
+
+    try:
+        return table_from_serializable(content['tables'][key], grammar,
+                                       start_productions)
+    except (KeyError, IndexError, TypeError, ValueError):
+        # Table file is corrupted.
+        return None
+
+
+def save_table(file_name, grammar, key, table, fingerprint=None):
+    """
+    Stores the table under the given key to the table file. Tables stored for
+    other keys are kept only if they are built for the same grammar.
+    Errors are silently ignored as caching is just an optimization.
+    """
+    if fingerprint is None:
+        fingerprint = grammar_fingerprint(grammar)
+
+    content = None
+    try:
+        with codecs.open(file_name, 'r', encoding='utf-8') as f:
+            content = json.load(f)
+    except (IOError, OSError, ValueError):
+        pass
+    if not content or content.get('fingerprint') != fingerprint:
+        # Stale or not existing table file.
+        content = {'fingerprint': fingerprint, 'tables': {}}
+    content['tables'][key] = table_to_serializable(table)
+
+    tmp_file_name = '{}.{}.tmp'.format(file_name, os.getpid())
+    try:
+        cache_dir = path.dirname(file_name)
+        if cache_dir and not path.exists(cache_dir):
+            os.makedirs(cache_dir)
+        with codecs.open(tmp_file_name, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(content))
+        if os.name == 'nt' and path.exists(file_name):
+            os.remove(file_name)
+        os.rename(tmp_file_name, file_name)
+    except (IOError, OSError):
+        if path.exists(tmp_file_name):
+            os.remove(tmp_file_name)
+
+
+def load_or_create_table(grammar, table_cache=None, itemset_type=LR_1,
+                         start_production=1, prefer_shifts=False,
+                         prefer_shifts_over_empty=True, lalr_dp=False,
+                         lazy=False, start_productions=None):
+    """
+    Returns LR table for the given grammar. If `table_cache` is given the table
+    is loaded from the table file if it is built for the same grammar and
+    parameters. Otherwise, the table is calculated and stored for later use.
+
+    If `lazy` is `True` and the table is not loaded, `LazyLRTable` is created
+    and it is not stored. If `start_productions` is given the table has a
+    start state for each of them and `start_production` is ignored.
+    """
+    start_productions = start_productions or [start_production]
+    table = None
+    file_name = None
+    if table_cache:
+        fingerprint = grammar_fingerprint(grammar)
+        file_name = table_file_name(grammar, table_cache, fingerprint)
+
+    if file_name:
+        key = table_key(itemset_type, start_productions, prefer_shifts,
+                        prefer_shifts_over_empty, lalr_dp)
+        table = load_table(file_name, grammar, key, start_productions,
+                           fingerprint)
+
+    if table is None:
+        table = create_table(
+            grammar, itemset_type=itemset_type,
+            start_productions=start_productions, prefer_shifts=prefer_shifts,
+            prefer_shifts_over_empty=prefer_shifts_over_empty,
+            lalr_dp=lalr_dp, lazy=lazy)
+        if file_name and not lazy:
+            save_table(file_name, grammar, key, table, fingerprint)
+
+    return table
@@ -1,11 +1,12 @@
 from __future__ import print_function, unicode_literals
 import sys
-from collections import OrderedDict
+from collections import OrderedDict, deque
 from itertools import chain
-from .grammar import ProductionRHS, AUGSYMBOL, ASSOC_LEFT, ASSOC_RIGHT, STOP, \
-    StringRecognizer, RegExRecognizer, Grammar, EMPTY, NonTerminal
+from .grammar import Production, ProductionRHS, AUGSYMBOL, ASSOC_LEFT, \
+    ASSOC_RIGHT, STOP, StringRecognizer, RegExRecognizer, Grammar, EMPTY, \
+    NonTerminal
 from .exceptions import GrammarError, SRConflict, RRConflict
-from .closure import closure, LR_1
+from .closure import closure, LR_0, LR_1
 from .termui import prints, s_header, h_print, a_print, s_emph
 if sys.version < '3':
     text = unicode  # NOQA
@@ -20,11 +21,14 @@ ACCEPT = 2
 # Tables construction algorithms
 SLR = 0
 LALR = 1
+# LALR with lookaheads calculated by DeRemer-Pennello algorithm
+LALR_DP = 2
 
 
 def create_table(grammar, first_sets=None, follow_sets=None,
                  itemset_type=LR_1, start_production=1,
-                 prefer_shifts=False, prefer_shifts_over_empty=True):
+                 prefer_shifts=False, prefer_shifts_over_empty=True,
+                 lalr_dp=False, lazy=False, start_productions=None):
     """
     Arguments:
     grammar (Grammar):
@@ -41,81 +45,69 @@ def create_table(grammar, first_sets=None, follow_sets=None,
     prefer_shifts_over_empty(bool) - Conflict resolution strategy which favours
         SHIFT over REDUCE of EMPTY. By default False. If prefer_shifts is
         `True` this param is ignored.
+    lalr_dp(bool) - If `True` and itemset_type is LR_1 LALR lookaheads are
+        calculated with DeRemer-Pennello algorithm from LR(0) automaton
+        instead of iterative propagation. By default False.
+    lazy(bool) - If `True` only LR(0) automaton is built and `LazyLRTable` is
+        returned. Lookaheads and REDUCE actions of the states are calculated
+        on demand. By default False.
+    start_productions(list of int) - If given, the table has a start state
+        for each of the given productions (see `LRTable.start_states`) and
+        `start_production` is ignored. Used to share a single table between
+        parsers with different start productions.
     """
 
     first_sets = first_sets if first_sets else first(grammar)
+    _check_first_sets(first_sets)
 
-    # Check for states with GOTO links but without SHIFT links.
-    # This is invalid as the GOTO link will never be traversed.
-    for nt, firsts in first_sets.items():
-        if nt.name != 'S\'' and not firsts:
-            raise GrammarError(
-                location=nt.location,
-                message='First set empty for grammar symbol "{}". '
-                        'An infinite recursion on the '
-                        'grammar symbol.'.format(nt))
+    start_productions = start_productions or [start_production]
+    aug_prods = _augmented_productions(grammar, start_productions)
 
-    follow_sets = follow_sets if follow_sets else follow(grammar, first_sets)
+    follow_sets = follow_sets if follow_sets else follow(
+        grammar, first_sets, [p.rhs[0] for p in aug_prods.values()])
 
-    start_prod_symbol = grammar.productions[start_production].symbol
-    grammar.productions[0].rhs = ProductionRHS([start_prod_symbol, STOP])
+    state_queue = deque()
+    state_id = 0
 
-    # Create a state for the first production (augmented)
-    s = LRState(grammar, 0, AUGSYMBOL,
-                [LRItem(grammar.productions[0], 0, set())])
+    states = []
 
-    state_queue = [s]
-    state_id = 1
+    # States keyed by the kernel signature. If there are multiple states with
+    # the same kernel (LALR merging is not always done) the first one
+    # registered is kept.
+    states_by_kernel = {}
 
-    states = []
+    # Create a start state for each augmented production.
+    start_states = OrderedDict()
+    for prod_id, aug_prod in aug_prods.items():
+        s = LRState(grammar, state_id, AUGSYMBOL, [LRItem(aug_prod, 0, set())])
+        s = states_by_kernel.setdefault(s.kernel_signature, s)
+        if s.state_id == state_id:
+            state_queue.append(s)
+            state_id += 1
+        start_states[prod_id] = s
+
+    # LR(0) closures are shared between states.
+    closure_cache = {}
 
     while state_queue:
         # For each state calculate its closure first, i.e. starting from a
         # so called "kernel items" expand collection with non-kernel items.
         # We will also calculate GOTO and ACTIONS dicts for each state. These
         # dicts will be keyed by a grammar symbol.
-        state = state_queue.pop(0)
-        closure(state, itemset_type, first_sets)
+        state = state_queue.popleft()
+        closure(state, LR_0 if lalr_dp or lazy else itemset_type,
+                first_sets, closure_cache)
         states.append(state)
 
-        # To find out other states we examine following grammar symbols
-        # in the current state (symbols following current position/"dot")
-        # and group all items by a grammar symbol.
-        state._per_next_symbol = OrderedDict()
-
-        # Each production has a priority. But since productions are grouped
-        # by grammar symbol that is ahead we take the maximal
-        # priority given for all productions for the given grammar symbol.
-        state._max_prior_per_symbol = {}
-
-        for item in state.items:
-            symbol = item.symbol_at_position
-            if symbol:
-                state._per_next_symbol.setdefault(symbol, []).append(item)
-
-                # Here we calculate max priorities for each grammar symbol to
-                # use it for SHIFT/REDUCE conflict resolution
-                prod_prior = item.production.prior
-                old_prior = state._max_prior_per_symbol.setdefault(
-                    symbol, prod_prior)
-                state._max_prior_per_symbol[symbol] = max(prod_prior,
-                                                          old_prior)
+        _group_items(state)
 
         # For each group symbol we create new state and form its kernel
         # items from the group items with positions moved one step ahead.
         for symbol, items in state._per_next_symbol.items():
             inc_items = [item.get_pos_inc() for item in items]
             maybe_new_state = LRState(grammar, state_id, symbol, inc_items)
-            target_state = maybe_new_state
-            try:
-                idx = states.index(maybe_new_state)
-                target_state = states[idx]
-            except ValueError:
-                try:
-                    idx = state_queue.index(maybe_new_state)
-                    target_state = state_queue[idx]
-                except ValueError:
-                    pass
+            target_state = states_by_kernel.setdefault(
+                maybe_new_state.kernel_signature, maybe_new_state)
 
             # We've found a new state. Register it for later processing.
             if target_state is maybe_new_state:
@@ -123,31 +115,38 @@ def create_table(grammar, first_sets=None, follow_sets=None,
                 state_id += 1
             else:
                 # State with this kernel items already exists.
-                if itemset_type is LR_1:
+                if itemset_type is LR_1 and not (lalr_dp or lazy):
                     # LALR: Try to merge states, i.e. update items follow sets.
                     if not merge_states(target_state, maybe_new_state):
                         target_state = maybe_new_state
                         state_queue.append(target_state)
                         state_id += 1
 
-            # Create entries in GOTO and ACTION tables
-            if isinstance(symbol, NonTerminal):
-                # For each non-terminal symbol we create an entry in GOTO
-                # table.
-                state.gotos[symbol] = target_state
+            _add_transition(state, symbol, target_state)
 
-            else:
-                if symbol is STOP:
-                    state.actions[symbol] = [Action(ACCEPT,
-                                                    state=target_state)]
-                else:
-                    # For each terminal symbol we create SHIFT action in the
-                    # ACTION table.
-                    state.actions[symbol] = [Action(SHIFT, state=target_state)]
+    if lazy:
+        return LazyLRTable(states, first_sets, follow_sets, grammar,
+                           start_states, itemset_type=itemset_type,
+                           prefer_shifts=prefer_shifts,
+                           prefer_shifts_over_empty=prefer_shifts_over_empty)
+
+    if itemset_type is LR_1 and lalr_dp:
+        _calc_lalr_lookaheads(grammar, states, first_sets)
+
+        # States are not split when merging would introduce R/R conflict as
+        # it is done in the default LALR construction. If such conflict
+        # exists fall back to the default construction.
+        if any(_has_merge_conflict(state) for state in states):
+            return create_table(
+                grammar, first_sets, follow_sets,
+                itemset_type=itemset_type,
+                prefer_shifts=prefer_shifts,
+                prefer_shifts_over_empty=prefer_shifts_over_empty,
+                start_productions=start_productions)
 
     # For LR(1) itemsets refresh/propagate item's follows as the LALR
     # merging might change item's follow in previous states
-    if itemset_type is LR_1:
+    elif itemset_type is LR_1:
 
         # Propagate updates as long as there were items propagated in the last
         # loop run.
@@ -158,152 +157,23 @@ def create_table(grammar, first_sets=None, follow_sets=None,
             for state in states:
 
                 # First refresh current state's follows
-                closure(state, LR_1, first_sets)
-
-                # Propagate follows to next states. GOTOs/ACTIONs keep
-                # information about states created from this state
-                inc_items = [i.get_pos_inc() for i in state.items]
-                for target_state in chain(
-                        state.gotos.values(),
-                        [a.state for i in state.actions.values()
-                         for a in i if a.action is SHIFT]):
-                    for next_item in target_state.kernel_items:
-                        this_item = inc_items[inc_items.index(next_item)]
-                        if this_item.follow.difference(next_item.follow):
-                            update = True
-                            next_item.follow.update(this_item.follow)
+                closure(state, LR_1, first_sets, closure_cache)
+
+                if _propagate_follows(state):
+                    update = True
 
     # Calculate REDUCTION entries in ACTION tables and resolve possible
     # conflicts.
     for state in states:
-        actions = state.actions
-
-        for item in state.items:
-            if item.is_at_end:
-                # If the position is at the end then this item
-                # would call for reduction but only for terminals
-                # from the FOLLOW set of item (LR(1)) or the production LHS
-                # non-terminal (LR(0)).
-                if itemset_type is LR_1:
-                    follow_set = item.follow
-                else:
-                    follow_set = follow_sets[item.production.symbol]
-
-                prod = item.production
-                new_reduce = Action(REDUCE, prod=prod)
-
-                for terminal in follow_set:
-                    if terminal not in actions:
-                        actions[terminal] = [new_reduce]
-                    else:
-                        # Conflict! Try to resolve
-                        t_acts = actions[terminal]
-                        should_reduce = True
-
-                        # Only one SHIFT or ACCEPT might exists for a single
-                        # terminal.
-                        shifts = [x for x in t_acts
-                                  if x.action in (SHIFT, ACCEPT)]
-                        assert len(shifts) <= 1
-                        t_shift = shifts[0] if shifts else None
-
-                        # But many REDUCEs might exist
-                        t_reduces = [x for x in t_acts if x.action is REDUCE]
-
-                        # We should try to resolve using standard
-                        # disambiguation rules between current reduction and
-                        # all previous actions.
-
-                        if t_shift:
-                            # SHIFT/REDUCE conflict. Use assoc and priority to
-                            # resolve
-                            sh_prior = state._max_prior_per_symbol[
-                                t_shift.state.symbol]
-                            if prod.prior == sh_prior:
-                                if prod.assoc == ASSOC_LEFT:
-                                    # Override SHIFT with this REDUCE
-                                    actions[terminal].remove(t_shift)
-                                elif prod.assoc == ASSOC_RIGHT:
-                                    # If associativity is right leave SHIFT
-                                    # action as "stronger" and don't consider
-                                    # this reduction any more. Right
-                                    # associative reductions can't be in the
-                                    # same set of actions together with SHIFTs.
-                                    should_reduce = False
-                                else:
-                                    # If priorities are the same and no
-                                    # associativity defined use prefered
-                                    # strategy.
-                                    is_empty = len(prod.rhs) == 0
-                                    prod_pse = is_empty \
-                                        and prefer_shifts_over_empty \
-                                        and not prod.nopse
-                                    prod_ps = not is_empty \
-                                        and prefer_shifts and not prod.nops
-                                    should_reduce = not (prod_pse or prod_ps)
-                            elif prod.prior > sh_prior:
-                                # This item operation priority is higher =>
-                                # override with reduce
-                                actions[terminal].remove(t_shift)
-                            else:
-                                # If priority of existing SHIFT action is
-                                # higher then leave it instead
-                                should_reduce = False
-
-                        if should_reduce:
-                            if not t_reduces:
-                                actions[terminal].append(new_reduce)
-                            else:
-                                # REDUCE/REDUCE conflicts
-                                # Try to resolve using priorities
-                                if prod.prior == t_reduces[0].prod.prior:
-                                    actions[terminal].append(new_reduce)
-                                elif prod.prior > t_reduces[0].prod.prior:
-                                    # If this production priority is higher
-                                    # it should override all other reductions.
-                                    actions[terminal][:] = \
-                                        [x for x in actions[terminal]
-                                         if x.action is not REDUCE]
-                                    actions[terminal].append(new_reduce)
+        _calc_reductions(state, itemset_type, follow_sets, prefer_shifts,
+                         prefer_shifts_over_empty)
 
     # Scanning optimization. Preorder actions based on terminal priority and
     # specificity. Set _finish flags.
-    def act_order(act_item):
-        """Priority is the strongest property. After that honor string
-        recognizer over other types of recognizers.
-
-        """
-        symbol, act = act_item
-        return symbol.prior * 1000000 + (500000 +
-                                         (len(symbol.recognizer.value)
-                                          if type(symbol.recognizer) is
-                                          StringRecognizer else 0) +
-                                         # Account for `\b` at the beginning
-                                         # and end of keyword regex
-                                         ((len(symbol.recognizer._regex) - 4)
-                                          if type(symbol.recognizer) is
-                                          RegExRecognizer and symbol.keyword
-                                          else 0))
     for state in states:
-        finish_flags = []
-        state.actions = OrderedDict(sorted(state.actions.items(),
-                                           key=act_order, reverse=True))
-        # Finish flags
-        prior = None
-        for symbol, act in reversed(list(state.actions.items())):
-            if symbol.finish is not None:
-                finish_flags.append(symbol.finish)
-            else:
-                finish_flags.append(
-                    (symbol.prior > prior if prior else False)
-                    or type(symbol.recognizer) is StringRecognizer
-                    or symbol.keyword)
-            prior = symbol.prior
-
-        finish_flags.reverse()
-        state.finish_flags = finish_flags
+        _order_actions(state)
 
-    table = LRTable(states, first_sets, follow_sets, grammar)
+    table = LRTable(states, first_sets, follow_sets, grammar, start_states)
     table.calc_conflicts()
     return table
 
@@ -340,6 +210,488 @@ def merge_states(old_state, new_state):
     return True
 
 
+def _augmented_productions(grammar, start_productions):
+    """
+    Returns augmented productions `S' = <start symbol> STOP` keyed by the
+    given start production ids. Production 0 of the grammar is used for the
+    first start symbol. Other augmented productions are numbered after the
+    grammar productions. Start productions of the same non-terminal share the
+    augmented production.
+    """
+    aug_prods = OrderedDict()
+    per_symbol = {}
+    for prod_id in start_productions:
+        symbol = grammar.productions[prod_id].symbol
+        aug_prod = per_symbol.get(symbol)
+        if aug_prod is None:
+            if not per_symbol:
+                aug_prod = grammar.productions[0]
+                aug_prod.rhs = ProductionRHS([symbol, STOP])
+            else:
+                aug_prod = Production(AUGSYMBOL,
+                                      ProductionRHS([symbol, STOP]))
+                aug_prod.prod_id = len(grammar.productions) \
+                    + len(per_symbol) - 1
+                aug_prod.prod_symbol_id = len(per_symbol)
+            per_symbol[symbol] = aug_prod
+        aug_prods[prod_id] = aug_prod
+    return aug_prods
+
+
+def _check_first_sets(first_sets):
+    """
+    Raises GrammarError for non-terminals with empty first set.
+    """
+    # Check for states with GOTO links but without SHIFT links.
+    # This is invalid as the GOTO link will never be traversed.
+    for nt, firsts in first_sets.items():
+        if nt.name != 'S\'' and not firsts:
+            raise GrammarError(
+                location=nt.location,
+                message='First set empty for grammar symbol "{}". '
+                        'An infinite recursion on the '
+                        'grammar symbol.'.format(nt))
+
+
+def _successors(state):
+    """
+    Returns states reached from the given state by GOTO, SHIFT and ACCEPT
+    transitions.
+    """
+    return chain(state.gotos.values(),
+                 [a.state for acts in state.actions.values()
+                  for a in acts if a.action in (SHIFT, ACCEPT)])
+
+
+def _has_merge_conflict(state):
+    """
+    Returns `True` if the follow sets of the reducing kernel items of the
+    given state intersect, i.e. LALR merging introduced R/R conflict.
+    """
+    reduce_items = [i for i in state.kernel_items if i.is_at_end]
+    for idx, item in enumerate(reduce_items):
+        for other in reduce_items[idx + 1:]:
+            if item.follow.intersection(other.follow):
+                return True
+    return False
+
+
+def _group_items(state):
+    """
+    Groups the items of the given state by the grammar symbol at their
+    position and calculates max priorities per grammar symbol.
+    """
+    # To find out other states we examine following grammar symbols
+    # in the current state (symbols following current position/"dot")
+    # and group all items by a grammar symbol.
+    state._per_next_symbol = OrderedDict()
+
+    # Each production has a priority. But since productions are grouped
+    # by grammar symbol that is ahead we take the maximal
+    # priority given for all productions for the given grammar symbol.
+    state._max_prior_per_symbol = {}
+
+    for item in state.items:
+        symbol = item.symbol_at_position
+        if symbol:
+            state._per_next_symbol.setdefault(symbol, []).append(item)
+
+            # Here we calculate max priorities for each grammar symbol to
+            # use it for SHIFT/REDUCE conflict resolution
+            prod_prior = item.production.prior
+            old_prior = state._max_prior_per_symbol.setdefault(
+                symbol, prod_prior)
+            state._max_prior_per_symbol[symbol] = max(prod_prior,
+                                                      old_prior)
+
+
+def _add_transition(state, symbol, target_state):
+    """
+    Creates GOTO entry for non-terminal or SHIFT/ACCEPT action for terminal
+    symbol leading from the given state to the target state.
+    """
+    if isinstance(symbol, NonTerminal):
+        # For each non-terminal symbol we create an entry in GOTO
+        # table.
+        state.gotos[symbol] = target_state
+
+    else:
+        if symbol is STOP:
+            state.actions[symbol] = [Action(ACCEPT,
+                                            state=target_state)]
+        else:
+            # For each terminal symbol we create SHIFT action in the
+            # ACTION table.
+            state.actions[symbol] = [Action(SHIFT, state=target_state)]
+
+
+def _propagate_follows(state):
+    """
+    Propagates follows of the state items to the kernel items of the states
+    reached by GOTO and SHIFT transitions. Returns `True` if any follow set is
+    updated.
+    """
+    # GOTOs/ACTIONs keep information about states created from this state.
+    update = False
+    for symbol, items in state._per_next_symbol.items():
+        if isinstance(symbol, NonTerminal):
+            target_state = state.gotos[symbol]
+        else:
+            action = state.actions[symbol][0]
+            if action.action is not SHIFT:
+                continue
+            target_state = action.state
+        next_items = dict(((i.production.prod_id, i.position), i)
+                          for i in target_state.kernel_items)
+        for item in items:
+            next_item = next_items[(item.production.prod_id,
+                                    item.position + 1)]
+            if not item.follow.issubset(next_item.follow):
+                update = True
+                next_item.follow.update(item.follow)
+    return update
+
+
+def _calc_reductions(state, itemset_type, follow_sets, prefer_shifts,
+                     prefer_shifts_over_empty):
+    """
+    Calculates REDUCTION entries in the ACTION table of the given state and
+    resolves possible conflicts.
+    """
+    actions = state.actions
+
+    for item in state.items:
+        if item.is_at_end:
+            # If the position is at the end then this item
+            # would call for reduction but only for terminals
+            # from the FOLLOW set of item (LR(1)) or the production LHS
+            # non-terminal (LR(0)).
+            if itemset_type is LR_1:
+                follow_set = item.follow
+            else:
+                follow_set = follow_sets[item.production.symbol]
+
+            prod = item.production
+            new_reduce = Action(REDUCE, prod=prod)
+
+            for terminal in follow_set:
+                if terminal not in actions:
+                    actions[terminal] = [new_reduce]
+                else:
+                    # Conflict! Try to resolve
+                    t_acts = actions[terminal]
+                    should_reduce = True
+
+                    # Only one SHIFT or ACCEPT might exists for a single
+                    # terminal.
+                    shifts = [x for x in t_acts
+                              if x.action in (SHIFT, ACCEPT)]
+                    assert len(shifts) <= 1
+                    t_shift = shifts[0] if shifts else None
+
+                    # But many REDUCEs might exist
+                    t_reduces = [x for x in t_acts if x.action is REDUCE]
+
+                    # We should try to resolve using standard
+                    # disambiguation rules between current reduction and
+                    # all previous actions.
+
+                    if t_shift:
+                        # SHIFT/REDUCE conflict. Use assoc and priority to
+                        # resolve
+                        sh_prior = state._max_prior_per_symbol[
+                            t_shift.state.symbol]
+                        if prod.prior == sh_prior:
+                            if prod.assoc == ASSOC_LEFT:
+                                # Override SHIFT with this REDUCE
+                                actions[terminal].remove(t_shift)
+                            elif prod.assoc == ASSOC_RIGHT:
+                                # If associativity is right leave SHIFT
+                                # action as "stronger" and don't consider
+                                # this reduction any more. Right
+                                # associative reductions can't be in the
+                                # same set of actions together with SHIFTs.
+                                should_reduce = False
+                            else:
+                                # If priorities are the same and no
+                                # associativity defined use prefered
+                                # strategy.
+                                is_empty = len(prod.rhs) == 0
+                                prod_pse = is_empty \
+                                    and prefer_shifts_over_empty \
+                                    and not prod.nopse
+                                prod_ps = not is_empty \
+                                    and prefer_shifts and not prod.nops
+                                should_reduce = not (prod_pse or prod_ps)
+                        elif prod.prior > sh_prior:
+                            # This item operation priority is higher =>
+                            # override with reduce
+                            actions[terminal].remove(t_shift)
+                        else:
+                            # If priority of existing SHIFT action is
+                            # higher then leave it instead
+                            should_reduce = False
+
+                    if should_reduce:
+                        if not t_reduces:
+                            actions[terminal].append(new_reduce)
+                        else:
+                            # REDUCE/REDUCE conflicts
+                            # Try to resolve using priorities
+                            if prod.prior == t_reduces[0].prod.prior:
+                                actions[terminal].append(new_reduce)
+                            elif prod.prior > t_reduces[0].prod.prior:
+                                # If this production priority is higher
+                                # it should override all other reductions.
+                                actions[terminal][:] = \
+                                    [x for x in actions[terminal]
+                                     if x.action is not REDUCE]
+                                actions[terminal].append(new_reduce)
+
+
+def _terminal_order(symbol):
+    """Priority is the strongest property. After that honor string
+    recognizer over other types of recognizers.
+    """
+    return symbol.prior * 1000000 + (500000 +
+                                     (len(symbol.recognizer.value)
+                                      if type(symbol.recognizer) is
+                                      StringRecognizer else 0) +
+                                     # Account for `\b` at the beginning
+                                     # and end of keyword regex
+                                     ((len(symbol.recognizer._regex) - 4)
+                                      if type(symbol.recognizer) is
+                                      RegExRecognizer and symbol.keyword
+                                      else 0))
+
+
+def order_terminals(terminals):
+    """
+    Orders the given terminals for recognition based on their priority and
+    specificity and calculates finish flags.
+
+    Returns:
+    A tuple of the list of ordered terminals and the list of their finish
+    flags.
+    """
+    terminals = sorted(terminals, key=_terminal_order, reverse=True)
+    finish_flags = []
+    prior = None
+    for symbol in reversed(terminals):
+        if symbol.finish is not None:
+            finish_flags.append(symbol.finish)
+        else:
+            finish_flags.append(
+                (symbol.prior > prior if prior else False)
+                or type(symbol.recognizer) is StringRecognizer
+                or symbol.keyword)
+        prior = symbol.prior
+
+    finish_flags.reverse()
+    return terminals, finish_flags
+
+
+def _order_actions(state):
+    """
+    Preorders actions of the given state based on terminal priority and
+    specificity and calculates finish flags and the default reduction.
+    """
+    actions = state.actions
+    terminals, state.finish_flags = order_terminals(actions)
+    state.actions = OrderedDict((t, actions[t]) for t in terminals)
+    state.default_reduction = _default_reduction(state)
+
+
+def _default_reduction(state):
+    """
+    Returns the production the given state reduces by for each terminal or
+    `None` if the state has other actions. Empty productions are not used as
+    the default reduction as their position is known only after the layout
+    before the lookahead token is skipped.
+    """
+    default = None
+    for acts in state.actions.values():
+        if len(acts) != 1 or acts[0].action is not REDUCE:
+            return None
+        prod = acts[0].prod
+        if default is None:
+            if not prod.rhs:
+                return None
+            default = prod
+        elif prod is not default:
+            return None
+    return default
+
+
+def _calc_lalr_lookaheads(grammar, states, first_sets):
+    """
+    Calculates LALR(1) follow sets of the items of LR(0) automaton using
+    relations based algorithm from: DeRemer F., Pennello T., "Efficient
+    Computation of LALR(1) Look-Ahead Sets", TOPLAS 4(4), 1982.
+
+    Follow set is calculated for each non-terminal transition (state,
+    non-terminal) as a transitive closure of `reads` and `includes` relations.
+    Item follow set is the union of follow sets of non-terminal transitions
+    the item originates from (`lookback` relation).
+
+    Args:
+    grammar (Grammar):
+    states (list of LRState): LR(0) states with GOTOs and SHIFT/ACCEPT
+        actions calculated.
+    first_sets(dict of sets): The dict of set of first items keyed by
+        a grammar symbol.
+    """
+
+    def nullable(symbol):
+        return EMPTY in first_sets[symbol]
+
+    # Non-terminal transitions are indexed by (state id, non-terminal).
+    transitions = []
+    trans_index = {}
+    for state in states:
+        for symbol in state.gotos:
+            trans_index[(state.state_id, symbol)] = len(transitions)
+            transitions.append((state, symbol))
+
+    # Direct reads are terminals shifted in the target state. Read sets are
+    # calculated by following transitions on nullable non-terminals.
+    follows = []
+    reads = []
+    for state, symbol in transitions:
+        target = state.gotos[symbol]
+        follows.append(set(target.actions))
+        reads.append([trans_index[(target.state_id, s)]
+                      for s in target.gotos if nullable(s)])
+    _digraph(follows, reads)
+
+    # Walk each production from each transition on its LHS non-terminal to
+    # find includes and lookback relations.
+    includes = [[] for _ in transitions]
+    lookback = []
+    items = [dict(((i.production.prod_id, i.position), i) for i in s.items)
+             for s in states]
+    for trans_idx, (state, symbol) in enumerate(transitions):
+        for prod in grammar.productions_per_symbol[symbol]:
+            current = state
+            rhs = prod.rhs
+            for position in range(len(rhs)):
+                lookback.append(
+                    (items[current.state_id][(prod.prod_id, position)],
+                     trans_idx))
+                s = rhs[position]
+                if isinstance(s, NonTerminal):
+                    if all(nullable(x) for x in rhs[position + 1:]):
+                        includes[trans_index[(current.state_id, s)]].append(
+                            trans_idx)
+                    current = current.gotos[s]
+                else:
+                    current = current.actions[s][0].state
+            lookback.append(
+                (items[current.state_id][(prod.prod_id, len(rhs))],
+                 trans_idx))
+    _digraph(follows, includes)
+
+    for item, trans_idx in lookback:
+        item.follow.update(follows[trans_idx])
+
+
+def _digraph(sets, relation):
+    """
+    For each node x updates sets[x] with the sets of all nodes reachable from
+    x over the given relation. Nodes are integer indexes. Nodes in the same
+    strongly connected component share the same set.
+
+    This is an iterative version of the `digraph` algorithm from DeRemer and
+    Pennello.
+    """
+    infinity = len(sets) + 1
+    depth = [0] * len(sets)
+    stack = []
+    for node in range(len(sets)):
+        if depth[node]:
+            continue
+        stack.append(node)
+        depth[node] = len(stack)
+        call_stack = [(node, 0, len(stack))]
+        while call_stack:
+            x, idx, d = call_stack[-1]
+            related = relation[x]
+            if idx < len(related):
+                call_stack[-1] = (x, idx + 1, d)
+                y = related[idx]
+                if depth[y] == 0:
+                    stack.append(y)
+                    depth[y] = len(stack)
+                    call_stack.append((y, 0, len(stack)))
+                    continue
+                depth[x] = min(depth[x], depth[y])
+                sets[x].update(sets[y])
+            else:
+                call_stack.pop()
+                if depth[x] == d:
+                    while True:
+                        top = stack.pop()
+                        depth[top] = infinity
+                        sets[top] = sets[x]
+                        if top == x:
+                            break
+                if call_stack:
+                    parent = call_stack[-1][0]
+                    depth[parent] = min(depth[parent], depth[x])
+                    sets[parent].update(sets[x])
+
+
+def _lazy_digraph(node, sets, depth, base, relation):
+    """
+    Returns the set of the given node updated with the sets of all nodes
+    reachable from it over the given relation. This is a version of
+    `_digraph` which visits only nodes reachable from the given node. Nodes
+    are calculated at most once as the `sets` and `depth` dicts keep results
+    between calls.
+
+    Args:
+    node: Hashable node.
+    sets(dict): Calculated sets keyed by node.
+    depth(dict): Traversal depth keyed by node.
+    base(callable): Returns the initial set of the node.
+    relation(callable): Returns the list of nodes related to the node.
+    """
+    infinity = sys.maxsize
+    if depth.get(node) == infinity:
+        return sets[node]
+    stack = [node]
+    depth[node] = 1
+    sets[node] = base(node)
+    call_stack = [(node, relation(node), 0, 1)]
+    while call_stack:
+        x, related, idx, d = call_stack[-1]
+        if idx < len(related):
+            call_stack[-1] = (x, related, idx + 1, d)
+            y = related[idx]
+            if y not in depth:
+                stack.append(y)
+                depth[y] = len(stack)
+                sets[y] = base(y)
+                call_stack.append((y, relation(y), 0, len(stack)))
+                continue
+            depth[x] = min(depth[x], depth[y])
+            sets[x].update(sets[y])
+        else:
+            call_stack.pop()
+            if depth[x] == d:
+                while True:
+                    top = stack.pop()
+                    depth[top] = infinity
+                    sets[top] = sets[x]
+                    if top == x:
+                        break
+            if call_stack:
+                parent = call_stack[-1][0]
+                depth[parent] = min(depth[parent], depth[x])
+                sets[parent].update(sets[x])
+    return sets[node]
+
+
 def check_table(states, all_actions, all_goto, first_sets, follow_sets):
     """
     Return a list of errors for the given table.
@@ -357,13 +709,69 @@ def check_table(states, all_actions, all_goto, first_sets, follow_sets):
     return errors
 
 
+def _state_conflicts(state, sr_conflicts, rr_conflicts):
+    """
+    Appends S/R and R/R conflicts of the given state to the given lists and
+    marks the state for dynamic disambiguation.
+    """
+    for term, actions in state.actions.items():
+
+        # Mark state for dynamic disambiguation
+        if term.dynamic:
+            state.dynamic.add(term)
+
+        if len(actions) > 1:
+            if actions[0].action in [SHIFT, ACCEPT]:
+                # Create SR conflicts for each S-R pair of actions
+                # except EMPTY reduction as SHIFT will always be
+                # preferred in LR parsing and GLR has a special
+                # handling of EMPTY reduce in order to avoid infinite
+                # looping.
+                for r_act in actions[1:]:
+
+                    # Mark state for dynamic disambiguation
+                    if r_act.prod.dynamic:
+                        state.dynamic.add(term)
+
+                    sr_conflicts.append(
+                        SRConflict(state, term,
+                                   [x.prod for x in actions[1:]]))
+            else:
+                prods = [x.prod for x in actions if len(x.prod.rhs)]
+
+                # Mark state for dynamic disambiguation
+                if any([p.dynamic for p in prods]):
+                    state.dynamic.add(term)
+
+                empty_prods = [x.prod for x in actions
+                               if not len(x.prod.rhs)]
+                # Multiple empty reductions possible
+                if len(empty_prods) > 1:
+                    rr_conflicts.append(
+                        RRConflict(state, term, empty_prods))
+                # Multiple non-empty reductions possible
+                if len(prods) > 1:
+                    rr_conflicts.append(
+                        RRConflict(state, term, prods))
+
+
 class LRTable(object):
+    """
+    Attributes:
+    states(list of LRState): States indexed by state id.
+    start_states(OrderedDict): Start states keyed by the start production id.
+    first_sets, follow_sets(dict of sets): `None` if the table is stripped.
+    grammar(Grammar):
+    sr_conflicts, rr_conflicts(list): Conflicts calculated by
+        `calc_conflicts`.
+    """
     def __init__(self, states, first_sets=None, follow_sets=None,
-                 grammar=None):
+                 grammar=None, start_states=None):
         self.states = states
         self.first_sets = first_sets
         self.follow_sets = follow_sets
         self.grammar = grammar
+        self.start_states = start_states
 
     def calc_conflicts(self):
         """
@@ -372,46 +780,42 @@ class LRTable(object):
         self.sr_conflicts = []
         self.rr_conflicts = []
         for state in self.states:
+            _state_conflicts(state, self.sr_conflicts, self.rr_conflicts)
 
-            for term, actions in state.actions.items():
-
-                # Mark state for dynamic disambiguation
-                if term.dynamic:
-                    state.dynamic.add(term)
+    def complete(self):
+        """
+        Tables built by `create_table` are complete. Returns the table.
+        See `LazyLRTable.complete`.
+        """
+        return self
 
-                if len(actions) > 1:
-                    if actions[0].action in [SHIFT, ACCEPT]:
-                        # Create SR conflicts for each S-R pair of actions
-                        # except EMPTY reduction as SHIFT will always be
-                        # preferred in LR parsing and GLR has a special
-                        # handling of EMPTY reduce in order to avoid infinite
-                        # looping.
-                        for r_act in actions[1:]:
-
-                            # Mark state for dynamic disambiguation
-                            if r_act.prod.dynamic:
-                                state.dynamic.add(term)
-
-                            self.sr_conflicts.append(
-                                SRConflict(state, term,
-                                           [x.prod for x in actions[1:]]))
-                    else:
-                        prods = [x.prod for x in actions if len(x.prod.rhs)]
-
-                        # Mark state for dynamic disambiguation
-                        if any([p.dynamic for p in prods]):
-                            state.dynamic.add(term)
-
-                        empty_prods = [x.prod for x in actions
-                                       if not len(x.prod.rhs)]
-                        # Multiple empty reductions possible
-                        if len(empty_prods) > 1:
-                            self.rr_conflicts.append(
-                                RRConflict(state, term, empty_prods))
-                        # Multiple non-empty reductions possible
-                        if len(prods) > 1:
-                            self.rr_conflicts.append(
-                                RRConflict(state, term, prods))
+    def reachable_states(self, start_production):
+        """
+        Returns a set of ids of the states reachable from the start state of
+        the given start production.
+        """
+        start_state = self.start_states[start_production]
+        reachable = set([start_state.state_id])
+        to_visit = [start_state]
+        while to_visit:
+            for target in _successors(to_visit.pop()):
+                if target.state_id not in reachable:
+                    reachable.add(target.state_id)
+                    to_visit.append(target)
+        return reachable
+
+    def strip(self):
+        """
+        Releases the data needed only for table construction and debugging,
+        i.e. LR items of the states, per-state helper dicts and first/follow
+        sets. Parsing needs only actions, gotos and finish flags of the states.
+        """
+        self.first_sets = None
+        self.follow_sets = None
+        for state in self.states:
+            state.items = None
+            state._per_next_symbol = None
+            state._max_prior_per_symbol = None
 
     def print_debug(self):
         a_print("*** STATES ***", new_line=True)
@@ -451,6 +855,170 @@ class LRTable(object):
                 print(rrc.message)
 
 
+class LazyLRTable(LRTable):
+    """
+    LR table whose states are completed on demand. LR(0) automaton, i.e.
+    states with their GOTOs and SHIFT actions, is built up front. Lookaheads,
+    REDUCE actions and finish flags of a state are calculated the first time
+    the state is completed by `complete_state`. `finish_flags` of not
+    completed states are `None`.
+
+    LALR lookaheads are calculated with DeRemer-Pennello relations followed
+    only from the completed states. Results are memoized. States are not split
+    as in the default LALR construction so R/R conflicts introduced by LALR
+    merging are reported.
+
+    Conflicts of the completed states are collected in `sr_conflicts` and
+    `rr_conflicts`. Use `complete` to get conflicts of the whole table.
+    """
+    def __init__(self, states, first_sets, follow_sets, grammar,
+                 start_states, itemset_type=LR_1, prefer_shifts=False,
+                 prefer_shifts_over_empty=True):
+        super(LazyLRTable, self).__init__(states, first_sets, follow_sets,
+                                          grammar, start_states)
+        self.itemset_type = itemset_type
+        self.prefer_shifts = prefer_shifts
+        self.prefer_shifts_over_empty = prefer_shifts_over_empty
+        self.sr_conflicts = []
+        self.rr_conflicts = []
+
+        self._incomplete = len(states)
+        self._strip = False
+
+        # Predecessors of each state in LR(0) automaton.
+        self._preds = [[] for _ in states]
+        for state in states:
+            for target in _successors(state):
+                self._preds[target.state_id].append(state)
+
+        # Memoized relations. Non-terminal transitions are identified by
+        # (state id, non-terminal).
+        self._back_states = {}
+        self._reads = {}
+        self._reads_depth = {}
+        self._follows = {}
+        self._follows_depth = {}
+
+    def complete_state(self, state):
+        """
+        Calculates REDUCE actions and finish flags of the given state if not
+        calculated already. Returns a tuple of lists of S/R and R/R conflicts
+        found in the state.
+        """
+        if state.finish_flags is not None:
+            return [], []
+
+        if self.itemset_type is LR_1:
+            for item in state.items:
+                if item.is_at_end \
+                        and item.production.symbol is not AUGSYMBOL:
+                    item.follow = self._lookaheads(state, item)
+
+        _calc_reductions(state, self.itemset_type, self.follow_sets,
+                         self.prefer_shifts, self.prefer_shifts_over_empty)
+        _order_actions(state)
+
+        sr_conflicts = []
+        rr_conflicts = []
+        _state_conflicts(state, sr_conflicts, rr_conflicts)
+        self.sr_conflicts.extend(sr_conflicts)
+        self.rr_conflicts.extend(rr_conflicts)
+
+        self._incomplete -= 1
+        if not self._incomplete:
+            self._back_states = self._reads = self._reads_depth = None
+            self._follows = self._follows_depth = None
+            if self._strip:
+                self.strip()
+
+        return sr_conflicts, rr_conflicts
+
+    def complete(self):
+        """
+        Completes all states and calculates conflicts of the whole table.
+        Returns the table.
+        """
+        for state in self.states:
+            self.complete_state(state)
+        self.calc_conflicts()
+        return self
+
+    def strip(self):
+        """
+        Construction data is needed to complete the states. It is released
+        when the last state is completed.
+        """
+        if self._incomplete:
+            self._strip = True
+        else:
+            super(LazyLRTable, self).strip()
+
+    def _nullable(self, symbol):
+        return EMPTY in self.first_sets[symbol]
+
+    def _back(self, state, steps):
+        """
+        Returns states from which the given state is reached in the given
+        number of steps.
+        """
+        if not steps:
+            return [state]
+        key = (state.state_id, steps)
+        states = self._back_states.get(key)
+        if states is None:
+            states = []
+            visited = set()
+            for pred in self._preds[state.state_id]:
+                for s in self._back(pred, steps - 1):
+                    if s.state_id not in visited:
+                        visited.add(s.state_id)
+                        states.append(s)
+            self._back_states[key] = states
+        return states
+
+    def _lookaheads(self, state, item):
+        """
+        Returns LALR lookaheads of the reducing item as the union of follow
+        sets of the non-terminal transitions the item originates from
+        (`lookback` relation).
+        """
+        lookaheads = set()
+        symbol = item.production.symbol
+        for pred in self._back(state, item.position):
+            lookaheads.update(
+                _lazy_digraph((pred.state_id, symbol), self._follows,
+                              self._follows_depth, self._read_set,
+                              self._includes))
+        return lookaheads
+
+    def _read_set(self, trans):
+        return set(_lazy_digraph(trans, self._reads, self._reads_depth,
+                                 self._direct_reads, self._reads_relation))
+
+    def _direct_reads(self, trans):
+        state_id, symbol = trans
+        target = self.states[state_id].gotos[symbol]
+        return set(s for s in target._per_next_symbol
+                   if not isinstance(s, NonTerminal))
+
+    def _reads_relation(self, trans):
+        state_id, symbol = trans
+        target = self.states[state_id].gotos[symbol]
+        return [(target.state_id, s) for s in target.gotos
+                if self._nullable(s)]
+
+    def _includes(self, trans):
+        state_id, symbol = trans
+        state = self.states[state_id]
+        includes = []
+        for item in state._per_next_symbol[symbol]:
+            rhs = item.production.rhs
+            if all(self._nullable(s) for s in rhs[item.position + 1:]):
+                for pred in self._back(state, item.position):
+                    includes.append((pred.state_id, item.production.symbol))
+        return includes
+
+
 class Action(object):
     __slots__ = ['action', 'state', 'prod']
 
@@ -538,10 +1106,13 @@ class LRItem(object):
         """
         Returns new LRItem with incremented position or None if position
         cannot be incremented (e.g. it is already at the end of the production)
+
+        Follow set is copied as the new item is in a different state and
+        merging of states must not change the follows of this item.
         """
 
         if self.position < len(self.production.rhs):
-            return LRItem(self.production, self.position+1, self.follow)
+            return LRItem(self.production, self.position+1, set(self.follow))
 
     @property
     def symbol_at_position(self):
@@ -566,7 +1137,8 @@ class LRState(object):
     grammar(Grammar):
     state_id(int):
     symbol(GrammarSymbol):
-    items(list of LRItem):
+    items(list of LRItem): `None` if the table is stripped (see
+        `LRTable.strip`).
     actions(OrderedDict): Keys are grammar terminal symbols, values are
         lists of Action instances.
     goto(OrderedDict): Keys are grammar non-terminal symbols, values are
@@ -574,11 +1146,18 @@ class LRState(object):
     dynamic(set of terminal symbols): If terminal symbol is in set dynamic
         ambiguity strategy callable is called for the terminal symbol
         lookahead.
-    finish_flags:
+    finish_flags(list of bool): Finish flag for each terminal in actions.
+        `None` if the state is not completed yet (see `LazyLRTable`).
+    scanner(Scanner): Recognizes tokens for the terminals in actions. Created
+        by the parser on the first use (see `parglare.parser.Scanner`).
+    default_reduction(Production): If the only action of the state for each
+        terminal is a reduction by this non-empty production LR parser reduces
+        without recognizing the lookahead token. `None` otherwise.
 
     """
     __slots__ = ['grammar', 'state_id', 'symbol', 'items',
-                 'actions', 'gotos', 'dynamic', 'finish_flags',
+                 'actions', 'gotos', 'dynamic', 'finish_flags', 'scanner',
+                 'default_reduction',
                  '_per_next_symbol', '_max_prior_per_symbol']
 
     def __init__(self, grammar, state_id, symbol, items):
@@ -590,21 +1169,26 @@ class LRState(object):
         self.actions = OrderedDict()
         self.gotos = OrderedDict()
         self.dynamic = set()
+        self.finish_flags = None
+        self.scanner = None
+        self.default_reduction = None
 
     def __eq__(self, other):
         """Two states are equal if their kernel items are equal."""
-        this_kernel = [x for x in self.items if x.is_kernel]
-        other_kernel = [x for x in other.items if x.is_kernel]
-        if len(this_kernel) != len(other_kernel):
-            return False
-        for item in this_kernel:
-            if item not in other_kernel:
-                return False
-        return True
+        return self.kernel_signature == other.kernel_signature
 
     def __ne__(self, other):
         return not self == other
 
+    @property
+    def kernel_signature(self):
+        """
+        Returns a hashable representation of the kernel items. Used for
+        quick lookup of states with the same kernel.
+        """
+        return frozenset((i.production.prod_id, i.position)
+                         for i in self.items if i.is_kernel)
+
     @property
     def kernel_items(self):
         """
@@ -627,7 +1211,7 @@ class LRState(object):
 
     def __str__(self):
         s = "\n\n" + s_header("State %d:%s\n" % (self.state_id, self.symbol))
-        for i in self.items:
+        for i in self.items or []:
             s += "\t{}\n".format(i)
         return s
 
@@ -644,77 +1228,145 @@ def first(grammar):
 
     The Dragon book p. 221.
 
+    Sets are calculated as integer bit masks (a bit per terminal) and
+    productions are revisited only when the FIRST set of a non-terminal from
+    their RHS changes.
+
     Returns:
     dict of sets of Terminal keyed by GrammarSymbol.
     """
     assert isinstance(grammar, Grammar), \
         "grammar parameter should be Grammar instance."
 
-    first_sets = {}
-    for t in grammar.terminals:
-        first_sets[t] = set([t])
+    terminals = list(grammar.terminals)
+    first_bits = _terminal_bits(terminals)
+    empty_bit = first_bits[EMPTY]
     for nt in grammar.nonterminals:
-        first_sets[nt] = set()
-
-    additions = True
-    while additions:
-        additions = False
-
-        for p in grammar.productions:
-            nonterm = p.symbol
-            for rhs_symbol in p.rhs:
-                rhs_symbol_first = set(first_sets[rhs_symbol])
-                rhs_symbol_first.discard(EMPTY)
-                if rhs_symbol_first.difference(first_sets[nonterm]):
-                    first_sets[nonterm].update(first_sets[rhs_symbol])
-                    additions = True
-                # If current RHS symbol can't derive EMPTY
-                # this production can't add any more members of
-                # the first set for LHS nonterminal.
-                if EMPTY not in first_sets[rhs_symbol]:
-                    break
-            else:
-                # If we reached the end of the RHS and each
-                # symbol along the way could derive EMPTY than
-                # we must add EMPTY to the first set of LHS symbol.
-                first_sets[nonterm].add(EMPTY)
+        first_bits[nt] = 0
+
+    # Productions keyed by non-terminals used in their RHS.
+    dependent_prods = dict((nt, []) for nt in grammar.nonterminals)
+    for p in grammar.productions:
+        for rhs_symbol in set(p.rhs):
+            if isinstance(rhs_symbol, NonTerminal):
+                dependent_prods[rhs_symbol].append(p)
+
+    to_visit = deque(grammar.productions)
+    queued = set(p.prod_id for p in to_visit)
+    while to_visit:
+        p = to_visit.popleft()
+        queued.discard(p.prod_id)
+        prod_first = 0
+        for rhs_symbol in p.rhs:
+            rhs_symbol_first = first_bits[rhs_symbol]
+            prod_first |= rhs_symbol_first & ~empty_bit
+            # If current RHS symbol can't derive EMPTY
+            # this production can't add any more members of
+            # the first set for LHS nonterminal.
+            if not rhs_symbol_first & empty_bit:
+                break
+        else:
+            # If we reached the end of the RHS and each
+            # symbol along the way could derive EMPTY than
+            # we must add EMPTY to the first set of LHS symbol.
+            prod_first |= empty_bit
 
-    return first_sets
+        nonterm = p.symbol
+        if prod_first & ~first_bits[nonterm]:
+            first_bits[nonterm] |= prod_first
+            for dep_prod in dependent_prods[nonterm]:
+                if dep_prod.prod_id not in queued:
+                    queued.add(dep_prod.prod_id)
+                    to_visit.append(dep_prod)
 
+    return dict((symbol, _bits_to_set(bits, terminals))
+                for symbol, bits in first_bits.items())
 
-def follow(grammar, first_sets=None):
+
+def follow(grammar, first_sets=None, start_symbols=None):
     """Calculates the sets of terminals that can follow some non-terminal for the
     given grammar.
 
+    FOLLOW sets are calculated as integer bit masks. The terminals from the
+    FIRST sets of the rest of the productions are collected in a single pass
+    over all productions. After that, FOLLOW sets of LHS non-terminals are
+    propagated to non-terminals at the end of the productions using a
+    worklist.
+
     Args:
     grammar (Grammar): An initialized grammar.
     first_sets (dict): A sets of FIRST terminals keyed by a grammar symbol.
+    start_symbols (list of NonTerminal): Non-terminals followed by STOP
+        besides the one from the augmented production.
     """
 
     if first_sets is None:
         first_sets = first(grammar)
 
-    follow_sets = {}
-    for symbol in grammar.nonterminals:
-        follow_sets[symbol] = set()
-
-    additions = True
-    while additions:
-        additions = False
-        for symbol in grammar.nonterminals:
-            for p in grammar.productions:
-                for idx, s in enumerate(p.rhs):
-                    if s == symbol:
-                        prod_follow = set()
-                        for rsymbol in p.rhs[idx+1:]:
-                            sfollow = first_sets[rsymbol]
-                            prod_follow.update(sfollow)
-                            if EMPTY not in sfollow:
-                                break
-                        else:
-                            prod_follow.update(follow_sets[p.symbol])
-                        prod_follow.discard(EMPTY)
-                        if prod_follow.difference(follow_sets[symbol]):
-                            additions = True
-                            follow_sets[symbol].update(prod_follow)
-    return follow_sets
+    terminals = list(grammar.terminals)
+    terminal_bits = _terminal_bits(terminals)
+    empty_bit = terminal_bits[EMPTY]
+    first_bits = {}
+    for symbol, firsts in first_sets.items():
+        first_bits[symbol] = sum(terminal_bits[t] for t in firsts)
+
+    follow_bits = dict((nt, 0) for nt in grammar.nonterminals)
+
+    # Non-terminals whose FOLLOW set includes the FOLLOW set of the key
+    # non-terminal.
+    includes = dict((nt, set()) for nt in grammar.nonterminals)
+
+    for p in grammar.productions:
+        # Go backwards and keep FIRST set of the rest of the production.
+        rest_first = 0
+        rest_empty = True
+        for symbol in reversed(p.rhs):
+            if isinstance(symbol, NonTerminal):
+                follow_bits[symbol] |= rest_first
+                if rest_empty:
+                    includes[p.symbol].add(symbol)
+            symbol_first = first_bits[symbol]
+            if symbol_first & empty_bit:
+                rest_first |= symbol_first & ~empty_bit
+            else:
+                rest_first = symbol_first
+                rest_empty = False
+
+    for symbol in start_symbols or []:
+        follow_bits[symbol] |= terminal_bits[STOP]
+
+    to_visit = deque(grammar.nonterminals)
+    queued = set(to_visit)
+    while to_visit:
+        nt = to_visit.popleft()
+        queued.discard(nt)
+        nt_follow = follow_bits[nt]
+        for symbol in includes[nt]:
+            if nt_follow & ~follow_bits[symbol]:
+                follow_bits[symbol] |= nt_follow
+                if symbol not in queued:
+                    queued.add(symbol)
+                    to_visit.append(symbol)
+
+    return dict((nt, _bits_to_set(bits, terminals))
+                for nt, bits in follow_bits.items())
+
+
+def _terminal_bits(terminals):
+    """
+    Returns a dict of bit masks keyed by terminal. Bit position is the index
+    of the terminal in the given list.
+    """
+    return dict((t, 1 << idx) for idx, t in enumerate(terminals))
+
+
+def _bits_to_set(bits, terminals):
+    """
+    Returns a set of terminals for the given bit mask.
+    """
+    result = set()
+    while bits:
+        low_bit = bits & -bits
+        result.add(terminals[low_bit.bit_length() - 1])
+        bits ^= low_bit
+    return result
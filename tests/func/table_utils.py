@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+"""
+Helpers for the tests comparing LR tables.
+"""
+from __future__ import unicode_literals
+
+# Statements grammar whose LR table has states of all kinds.
+statements_grammar = r"""
+Program: Stmt+;
+Stmt: Assign | Call | If;
+Assign: ID '=' Expr ';';
+Call: ID '(' Args? ')' ';';
+If: 'if' '(' Expr ')' Block;
+Block: '{' Stmt* '}';
+Args: Expr+[Comma];
+Expr: Expr '+' Term | Expr '-' Term | Term;
+Term: Term '*' Factor | Factor;
+Factor: ID | NUM | '(' Expr ')';
+
+terminals
+ID: /[a-zA-Z_]\w*/;
+NUM: /\d+/;
+Comma: ',';
+"""
+
+
+def table_sets(table, items=False, ordered=False):
+    """
+    Returns comparable content of the given LR table states: symbol, actions
+    and finish flag per terminal and GOTOs. If `items` is set LR items with
+    their follow sets are included too. If `ordered` is set, the order of
+    terminals and of the actions for each terminal must be the same too.
+    """
+    return [(s.state_id, s.symbol.fqn,
+             [(t.fqn, [str(a) for a in acts])
+              for t, acts in s.actions.items()] if ordered
+             else dict((t.fqn, set(str(a) for a in acts))
+                       for t, acts in s.actions.items()),
+             dict((t.fqn, f) for t, f in zip(s.actions, s.finish_flags)),
+             dict((n.fqn, target.state_id) for n, target in s.gotos.items()),
+             [(i.production.prod_id, i.position,
+               set(t.fqn for t in i.follow)) for i in s.items]
+             if items else None)
+            for s in table.states]
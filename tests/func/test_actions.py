@@ -1,6 +1,6 @@
 from __future__ import unicode_literals
 import pytest  # noqa
-from parglare import Grammar, Parser, NodeNonTerm
+from parglare import Grammar, Parser, GLRParser, NodeNonTerm
 from parglare.exceptions import ParserInitError
 from parglare import get_collector
 from .expression_grammar_numbers import get_grammar
@@ -165,3 +165,60 @@ def test_action_decorator():
     12.223*4""")
 
     assert result == 34.7 + 78 * 34 + 89 + 12.223 * 4
+
+
+def test_reduce_actions():
+    """
+    Test that actions with assignments and lists of actions are called the
+    same way by the parsers and `call_actions`.
+    """
+    grammar = Grammar.from_string(r"""
+    E: left=E op='+' right=T | T;
+    T: T '*' F | F;
+    F: '(' E ')' | num;
+
+    terminals
+    num: /\d+/;
+    """)
+    actions = {
+        'E': [lambda _, nodes, left, op, right: left + right,
+              lambda _, nodes: nodes[0]],
+        'T': [lambda _, nodes: nodes[0] * nodes[2],
+              lambda _, nodes: nodes[0]],
+        'F': [lambda _, nodes: nodes[1], lambda _, nodes: nodes[0]],
+        'num': lambda _, value: int(value)}
+    input_str = '2 * (3 + 4) + 5 * 6'
+
+    for kwargs in [{}, {'compact_table': True}, {'error_recovery': True}]:
+        assert Parser(grammar, actions=actions, **kwargs).parse(input_str) \
+            == 44
+    assert GLRParser(grammar, actions=actions).parse(input_str) == [44]
+
+    for parser in [Parser(grammar, actions=actions, build_tree=True),
+                   GLRParser(grammar, actions=actions, build_tree=True)]:
+        result = parser.parse(input_str)
+        if type(parser) is GLRParser:
+            result = result[0]
+        assert parser.call_actions(result) == 44
+
+    # Reduce actions follow the changes of the parser attributes.
+    parser = Parser(grammar, actions=actions, build_tree=True)
+    assert type(parser.parse(input_str)) is NodeNonTerm
+    parser.build_tree = False
+    assert parser.parse(input_str) == 44
+
+    # Actions assigned to the symbols after the parser construction are
+    # used by the parser and by the call of actions on the tree.
+    for parser in [Parser(grammar, actions=actions),
+                   GLRParser(grammar, actions=actions)]:
+        symbol = grammar.get_nonterminal('E')
+        symbol.action = [lambda _, nodes, left, op, right: left - right,
+                         lambda _, nodes: nodes[0]]
+        result = parser.parse(input_str)
+        assert result == (-32 if type(parser) is Parser else [-32])
+        symbol.action = actions['E']
+    parser = Parser(grammar, actions=actions, build_tree=True)
+    tree = parser.parse(input_str)
+    grammar.get_nonterminal('T').action = lambda _, nodes: nodes[0]
+    assert parser.call_actions(tree) == 7
+    grammar.get_nonterminal('T').action = actions['T']
@@ -1,5 +1,6 @@
 import pytest  # noqa
 from parglare import Grammar, Parser
+from parglare.exceptions import ParserInitError
 
 
 def test_call_actions_during_tree_build():
@@ -40,3 +41,55 @@ def test_call_actions_during_tree_build():
     parser.parse(code)
 
     assert len(left_moves) == 2
+
+
+def test_lazy_values():
+    grammar = r"""
+    Program: Stmt*;
+    Stmt: 'print' Value | 'show' Value;
+    Value: ID | STR;
+
+    LAYOUT: LayoutItem*;
+    LayoutItem: WS | Comment;
+
+    terminals
+    ID: /[a-z]+/;
+    STR: /"[^"]*"/;
+    WS: /\s+/;
+    Comment: /\/\/.*/;
+    """
+    code = """
+    print a // Comment
+    Show "b c"
+    """
+
+    g = Grammar.from_string(grammar, ignore_case=True)
+    tree = Parser(g, build_tree=True).parse(code)
+    lazy_tree = Parser(g, build_tree=True, lazy_values=True).parse(code)
+    assert lazy_tree.tree_str() == tree.tree_str()
+
+    def nodes(node):
+        yield node
+        for child in node:
+            for n in nodes(child):
+                yield n
+
+    for node, lazy_node in zip(nodes(tree), nodes(lazy_tree)):
+        assert lazy_node.layout_content == node.layout_content
+        assert getattr(lazy_node, 'value', None) == \
+            getattr(node, 'value', None)
+
+    # Values of ignore case string matches are not slices of the input.
+    stmt = lazy_tree.children[0].children[0].children[1]
+    assert stmt.children[0].value == 'show'
+    assert stmt.children[1].children[0].value == '"b c"'
+    assert stmt.layout_content == ' // Comment\n    '
+    assert stmt.children[1].layout_content == ' '
+
+    # Users may set their own attributes on the tree nodes.
+    for node in [tree, stmt, stmt.children[0], tree.children[0]]:
+        node.user_data = 1
+        assert node.user_data == 1
+
+    with pytest.raises(ParserInitError):
+        Parser(g, lazy_values=True)
@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+"""
+Test LR parsing with compact tables.
+"""
+from __future__ import unicode_literals
+import random
+import pytest
+from parglare import Grammar, Parser, ParseError, REDUCE
+from parglare.actions import pass_single
+from parglare.compact import create_compact_table, decode_action, \
+    displace_rows
+from parglare.exceptions import ParserInitError
+from parglare.tables import create_table
+
+grammar = r"""
+Result: E EOF;
+E: E '+' E  {left, 1}
+ | E '-' E  {left, 1}
+ | E '*' E  {left, 2}
+ | E '/' E  {left, 2}
+ | E '^' E  {right, 3}
+ | '(' E ')'
+ | number;
+
+terminals
+number: /\d+(\.\d+)?/;
+"""
+
+actions = {
+    "Result": pass_single,
+    "E": [lambda _, nodes: nodes[0] + nodes[2],
+          lambda _, nodes: nodes[0] - nodes[2],
+          lambda _, nodes: nodes[0] * nodes[2],
+          lambda _, nodes: nodes[0] / nodes[2],
+          lambda _, nodes: nodes[0] ** nodes[2],
+          lambda _, nodes: nodes[1],
+          lambda _, nodes: nodes[0]],
+    "number": lambda _, value: float(value),
+}
+
+
+def test_compact_table_actions():
+    """
+    Test that compact table has the same actions the LR parser would use.
+    """
+    g = Grammar.from_string(grammar)
+    table = create_table(g, prefer_shifts=True)
+    compact = create_compact_table(table)
+
+    assert compact.states_count == len(table.states)
+    for state in table.states:
+        assert compact.state_terminals[state.state_id] \
+            == tuple(state.actions)
+        assert compact.finish_flags[state.state_id] \
+            == tuple(state.finish_flags)
+        for terminal, acts in state.actions.items():
+            action, target = decode_action(
+                compact.action(state.state_id, terminal))
+            assert action == acts[0].action
+            if action == REDUCE:
+                assert target == acts[0].prod.prod_id
+            else:
+                assert target == acts[0].state.state_id
+        for terminal in set(g.terminals) - set(state.actions):
+            assert compact.action(state.state_id, terminal) == 0
+
+        for nonterminal in compact.nonterminals:
+            nonterminal_id = compact.nonterminals.index(nonterminal)
+            target = compact.goto(state.state_id, nonterminal_id)
+            if nonterminal in state.gotos:
+                assert target == state.gotos[nonterminal].state_id
+            else:
+                assert target == -1
+
+
+def test_compact_table_parse():
+    g = Grammar.from_string(grammar)
+    parser = Parser(g, actions=actions, compact_table=True)
+    for input_str in ['2 + 3 * 4 ^ 2 ^ 0.5 / (1 + 1)', '2 * (3 + 4) - 5']:
+        assert parser.parse(input_str) \
+            == Parser(g, actions=actions).parse(input_str)
+    assert parser.parse('2 * (3 + 4) - 5') == 9
+
+    parser = Parser(g, build_tree=True, compact_table=True)
+    tree = parser.parse('2 * (3 + 4)')
+    assert tree.tree_str() == \
+        Parser(g, build_tree=True).parse('2 * (3 + 4)').tree_str()
+
+    with pytest.raises(ParseError) as e:
+        parser.parse('2 * (3 + 4')
+    assert 'Expected: ) or * or + or - or / or ^' in str(e.value)
+
+
+def test_compact_table_error_recovery():
+    g = Grammar.from_string(grammar)
+    parser = Parser(g, start_production=2, actions=actions,
+                    error_recovery=True, compact_table=True)
+
+    result = parser.parse("1 + 2 + * 3 & 89 - 5")
+
+    assert result == 6
+    assert len(parser.errors) == 1
+    assert parser.errors[0].position == 8
+
+
+def test_compact_table_layout():
+    grammar = r"""
+    S: 'a'+ EOF;
+    LAYOUT: LayoutItem*;
+    LayoutItem: WS | Comment;
+
+    terminals
+    WS: /\s+/;
+    Comment: /\/\/.*/;
+    """
+    g = Grammar.from_string(grammar)
+    parser = Parser(g, compact_table=True)
+    assert parser.layout_parser.compact_table
+    assert parser.parse('a a // comment\n a') == [['a', 'a', 'a'], None]
+
+
+def test_compact_table_not_allowed():
+    g = Grammar.from_string(grammar)
+
+    with pytest.raises(ParserInitError):
+        Parser(g, compact_table=True,
+               dynamic_filter=lambda *args: True)
+
+    with pytest.raises(ParserInitError):
+        Parser(g, compact_table=True, debug=True)
+
+
+def test_displace_rows():
+    random.seed(1)
+    rows = [sorted(random.sample(range(50), random.randint(0, 20)))
+            for _ in range(200)]
+    rows = [[(c, random.randint(1, 5)) for c in cols] for cols in rows]
+    rows.extend(rows[:50])
+
+    base, check, value = displace_rows(rows, 50)
+
+    for row_idx, row in enumerate(rows):
+        row = dict(row)
+        for c in range(50):
+            idx = base[row_idx] + c
+            if c in row:
+                assert check[idx] == c
+                assert value[idx] == row[c]
+            else:
+                assert check[idx] != c
+
+
+def test_displace_rows_used_base_at_the_end():
+    """
+    Test that row placement terminates when the first free base past the
+    occupied slots is already used.
+    """
+    rows = [[(0, 1)], [(1, 2)], [(0, 3)]]
+
+    base, check, value = displace_rows(rows, 2)
+
+    assert len(set(base)) == 3
+    for row_idx, row in enumerate(rows):
+        for c, v in row:
+            assert check[base[row_idx] + c] == c
+            assert value[base[row_idx] + c] == v
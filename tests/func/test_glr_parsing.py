@@ -280,3 +280,55 @@ def test_non_eof_grammar_empty():
 
     results = p.parse("")
     assert len(results) == 1
+
+
+def test_layout_and_tokens_found_once_per_position():
+    """
+    Test that heads at the same position share the layout and the tokens.
+    """
+    grammar = r"""
+    S: Word+;
+    Word: Noun | Verb | Noun Noun | Adj Noun | Noun Verb;
+    Noun: WORD | NAME;
+    Verb: WORD;
+    Adj: WORD;
+
+    LAYOUT: LayoutItem | LAYOUT LayoutItem | EMPTY;
+    LayoutItem: WS | Comment;
+
+    terminals
+    WORD: /[a-z]+/;
+    NAME: /[A-Z][a-z]*/;
+    WS: /\s+/;
+    Comment: /\/\*(.|\n)*?\*\//;
+    """
+    g = Grammar.from_string(grammar)
+    layout_positions = []
+
+    def layout_item(context, nodes):
+        layout_positions.append(context.start_position)
+        return nodes[0]
+
+    p = GLRParser(g, layout_actions={'LayoutItem': layout_item})
+    scanned = []
+    next_tokens = p._scan_token
+
+    cached = []
+
+    def scan_token(actions, finish_flags, input_str, position, scanner=None):
+        scanned.append((position, scanner))
+        cached.append(len(p.layout_results) + len(p.tokens_results))
+        return next_tokens(actions, finish_flags, input_str, position,
+                           scanner)
+    p._scan_token = scan_token
+
+    results = p.parse('time flies /* x */ like an Arrow')
+    assert len(results) == 101
+    assert len(layout_positions) == len(set(layout_positions))
+    assert len(scanned) == len(set(scanned))
+
+    # Results before the slowest head are dropped.
+    del cached[:]
+    assert len(p.parse('Arrow ' * 12)) == 233
+    assert max(cached) < 10
+    assert not p.layout_results and not p.tokens_results
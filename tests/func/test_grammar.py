@@ -487,3 +487,22 @@ def test_case_insensitive_parsing():
     parser = Parser(g)
     parser.parse('One Two Aaa')
     parser.parse('one Two AAa')
+
+
+def test_productions_per_symbol():
+    """
+    Test that productions are indexed by non-terminal in the order of their
+    ids.
+    """
+    grammar = """
+    S: A B | B;
+    B: A | 'b';
+    A: 'a' | B 'a';
+    """
+
+    g = Grammar.from_string(grammar)
+    for symbol_name in ['S', 'A', 'B']:
+        symbol = g.get_nonterminal(symbol_name)
+        prods = g.productions_per_symbol[symbol]
+        assert prods == [p for p in g.productions if p.symbol is symbol]
+        assert [p.prod_symbol_id for p in prods] == list(range(len(prods)))
@@ -104,3 +104,35 @@ def test_keyword_preferred_over_regexes():
     # StringRecognizer and keywords over RegExRecognizer for
     # the match of the same lenght (i.e. "more specific match")
     parser.parse("for = 10 to 100")
+
+
+@pytest.mark.parametrize('ignore_case', [False, True])
+def test_keywords_table(ignore_case):
+    """
+    Test that many keywords are found by the lookup in the table of keywords
+    with the same results as matching each keyword.
+    """
+    keywords = ['kw{}'.format(i) for i in range(40)]
+    grammar = r"""
+    S: Item+;
+    Item: Keyword | ID | INT | "kw-";
+    Keyword: {};
+
+    terminals
+    ID: /\w+/;
+    INT: /\d+/;
+    KEYWORD: /\w+/;
+    """.format(' | '.join('"{}"'.format(k) for k in keywords))
+    g = Grammar.from_string(grammar, ignore_case=ignore_case)
+    parser = Parser(g, actions={
+        'Keyword': lambda _, nodes: ('Keyword', nodes[0]),
+        'ID': lambda _, value: ('ID', value)})
+
+    input_str = 'kw1 kw10 kw1x kw39 kw- kw3kw4 kw40 KW5'
+    assert parser.parse(input_str) == [
+        ('Keyword', 'kw1'), ('Keyword', 'kw10'), ('ID', 'kw1x'),
+        ('Keyword', 'kw39'), 'kw-', ('ID', 'kw3kw4'), ('ID', 'kw40'),
+        ('Keyword' if ignore_case else 'ID', 'KW5')]
+
+    scanner = parser.table.states[0].scanner
+    assert scanner._dispatch['k']._keywords is not None
@@ -231,3 +231,74 @@ def test_layout_terminal():
         parser.parse("a b")
     result = parser.parse("4444a23b545")
     assert result == ['a', 'b']
+
+
+@pytest.mark.parametrize('layout', [
+    "LAYOUT: LayoutItem | LAYOUT LayoutItem; "
+    "LayoutItem: WS | Comment | Block | EMPTY;",
+    "LAYOUT: LayoutItem*; LayoutItem: WS | Comment | Block;",
+    "LAYOUT: WS | EMPTY;"])
+def test_layout_regex(layout):
+    """
+    Test that layout given as a repetition of terminals is matched by a regex
+    the same way as by the layout parser.
+    """
+    grammar = r"""
+    S: 'a'+;
+    {}
+
+    terminals
+    WS: /\s+/;
+    Comment: /\/\/.*/;
+    Block: /\/\*(.|\n)*?\*\//;
+    """.format(layout)
+    parser = Parser(Grammar.from_string(grammar))
+    assert parser._layout_regex is not None
+
+    in_str = "a a // a\n/* a\n */a/*/ a //*/ a\t/* a"
+    for position in range(len(in_str) + 1):
+        layout_end = max(parser._layout_regex.match(in_str, position).end(),
+                         position)
+        assert layout_end == parser.layout_parser.parse(in_str, position)[1]
+
+    assert parser.parse(" a\n a\ta ") == ['a', 'a', 'a']
+
+
+@pytest.mark.parametrize('layout', [
+    # Layout can't be empty.
+    "LAYOUT: WS;",
+    # Not a repetition.
+    "LAYOUT: WS? Comment?;",
+    # Terminals may start the same way.
+    "LAYOUT: LayoutItem*; LayoutItem: WS | Comment | '//';",
+    # Recursive layout.
+    "LAYOUT: LayoutItem*; LayoutItem: WS | '(' LAYOUT ')';"])
+def test_layout_regex_not_used(layout):
+    grammar = r"""
+    S: 'a'+;
+    {}
+
+    terminals
+    WS: /\s+/;
+    Comment: /\/\/.*/;
+    """.format(layout)
+    parser = Parser(Grammar.from_string(grammar))
+    assert parser._layout_regex is None
+
+
+def test_layout_regex_not_used_with_actions():
+    grammar = r"""
+    S: 'a'+;
+    LAYOUT: LayoutItem*;
+    LayoutItem: WS | Comment;
+
+    terminals
+    WS: /\s+/;
+    Comment: /\/\/.*/;
+    """
+    comments = []
+    parser = Parser(Grammar.from_string(grammar), layout_actions={
+        'Comment': lambda _, value: comments.append(value)})
+    assert parser._layout_regex is None
+    parser.parse('a // first\na // second')
+    assert comments == ['// first', '// second']
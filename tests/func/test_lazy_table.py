@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""
+Test parsing with lazily completed LR tables.
+"""
+from __future__ import unicode_literals
+import pytest
+from parglare import Grammar, Parser, GLRParser, SLR
+from parglare.closure import LR_0
+from parglare.exceptions import ParserInitError, SRConflicts
+from parglare.tables import create_table, LazyLRTable
+from .table_utils import statements_grammar as grammar, table_sets
+
+
+@pytest.mark.parametrize('kwargs', [{}, {'itemset_type': LR_0},
+                                    {'prefer_shifts': True}])
+def test_lazy_table_complete(kwargs):
+    """
+    Test that completed lazy table is the same as LALR table built from LR(0)
+    automaton.
+    """
+    table = create_table(Grammar.from_string(grammar), lazy=True, **kwargs)
+    assert isinstance(table, LazyLRTable)
+    assert all(s.finish_flags is None for s in table.states)
+    assert table.complete() is table
+    assert table_sets(table) == table_sets(
+        create_table(Grammar.from_string(grammar), lalr_dp=True, **kwargs))
+
+
+@pytest.mark.parametrize('parser_class', [Parser, GLRParser])
+def test_lazy_table_parse(parser_class):
+    input_str = """
+    a = 1 + 2 * (b - 3);
+    f(a, 4);
+    if (a) { g(); }
+    """
+    g = Grammar.from_string(grammar)
+    parser = parser_class(g, lazy_table=True)
+    result = parser.parse(input_str)
+    assert result == parser_class(g).parse(input_str)
+
+    # Only states reached by the parser are completed.
+    completed = [s for s in parser.table.states
+                 if s.finish_flags is not None]
+    assert 0 < len(completed) < len(parser.table.states)
+
+    # Completed states are reused.
+    assert parser.parse(input_str) == result
+
+
+def test_lazy_table_slr():
+    g = Grammar.from_string(grammar)
+    parser = Parser(g, tables=SLR, lazy_table=True)
+    assert parser.parse('f(1, x);') == Parser(g, tables=SLR).parse('f(1, x);')
+
+
+def test_lazy_table_conflicts():
+    """
+    Test that conflicts are reported when the LR parser reaches the state and
+    that conflicts of the whole table are available on demand.
+    """
+    g = Grammar.from_string("""
+    S: 'a' A | 'b' B;
+    A: A A | 'x';
+    B: 'y';
+    """)
+    with pytest.raises(SRConflicts):
+        Parser(g, prefer_shifts=False)
+
+    parser = Parser(g, prefer_shifts=False, lazy_table=True)
+    assert parser.parse('b y')
+    assert not parser.table.sr_conflicts
+
+    with pytest.raises(SRConflicts):
+        parser.parse('a x x')
+
+    table = parser.table.complete()
+    assert len(table.sr_conflicts) == \
+        len(create_table(g, lalr_dp=True).sr_conflicts)
+
+    # GLR parser doesn't fail on conflicts.
+    parser = GLRParser(g, lazy_table=True)
+    assert len(parser.parse('a x x x')) == 2
+
+
+def test_lazy_table_compact():
+    g = Grammar.from_string(grammar)
+    with pytest.raises(ParserInitError):
+        Parser(g, lazy_table=True, compact_table=True)
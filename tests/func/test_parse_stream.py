@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""
+Test parsing of the input streamed in chunks.
+"""
+from __future__ import unicode_literals
+import io
+import pytest
+from parglare import Grammar, Parser, GLRParser, ParseError
+from parglare.exceptions import ParserInitError
+
+grammar = r"""
+Program: Stmt* EOF;
+Stmt: ID '=' Expr ';' | 'print' Expr ';';
+Expr: Expr '+' Expr {left} | NUM | ID | STR;
+
+LAYOUT: LayoutItem*;
+LayoutItem: WS | Comment;
+
+terminals
+ID: /[a-z_]\w*/;
+NUM: /\d+/;
+STR: /"[^"]*"/;
+WS: /\s+/;
+Comment: /\/\/.*/;
+"""
+
+input_str = """
+a = 1 + "b c"; // Comment
+print a + 22;
+long_identifier = a;
+""" * 10
+
+
+@pytest.mark.parametrize('kwargs', [
+    {}, {'compact_table': True}, {'build_tree': True},
+    {'layout_actions': {'Comment': lambda _, value: value}}])
+def test_parse_stream(kwargs):
+    parser = Parser(Grammar.from_string(grammar), **kwargs)
+    expected = parser.parse(input_str)
+    chunks = [input_str[i:i + 5] for i in range(0, len(input_str), 5)]
+    for stream in [io.StringIO(input_str), chunks]:
+        result = parser.parse_stream(stream, chunk_size=16)
+        if kwargs.get('build_tree'):
+            assert result.tree_str() == expected.tree_str()
+        else:
+            assert result == expected
+
+
+def test_parse_stream_window():
+    """
+    Test that only the window of the input from the current token onward is
+    kept.
+    """
+    windows = []
+
+    def stmt(context, nodes):
+        windows.append((context.input_str.offset,
+                        len(context.input_str.buffer)))
+        assert context.input_str[context.start_position:
+                                 context.end_position].endswith(';')
+
+    parser = Parser(Grammar.from_string(grammar), actions={'Stmt': stmt})
+    parser.parse_stream(io.StringIO(input_str), chunk_size=16)
+    assert len(windows) == 30
+    assert windows[-1][0] > 0
+    assert max(size for _, size in windows) < 80
+
+
+def test_parse_stream_errors():
+    parser = Parser(Grammar.from_string(grammar))
+    in_str = input_str + 'b = 1 +\n  $;'
+    with pytest.raises(ParseError) as e:
+        parser.parse_stream(io.StringIO(in_str), chunk_size=16,
+                            file_name='input.txt')
+    assert e.value.location.start_position == len(in_str) - 2
+    assert e.value.location.line == 42
+    assert e.value.location.column == 2
+    assert 'input.txt:42:2' in str(e.value)
+
+    # Tokens reaching the end of the window are recognized again after
+    # reading more input.
+    assert parser.parse_stream(['a = b', 'c' * 40, 'd;'], chunk_size=2) == \
+        [[['a', '=', 'b' + 'c' * 40 + 'd', ';']], None]
+
+    with pytest.raises(ParserInitError):
+        GLRParser(Grammar.from_string(grammar)).parse_stream([input_str])
+    with pytest.raises(ParserInitError):
+        Parser(Grammar.from_string(grammar), lexer='pre').parse_stream(
+            [input_str])
+
+
+def test_parse_stream_bytes():
+    parser = Parser(Grammar.from_string(grammar))
+    chunks = [b'a = 1', b'2 + b;', b' // Comment\n', b'print "s";']
+    assert parser.parse_stream(chunks) == \
+        [[[b'a', b'=', [b'12', b'+', b'b'], b';'],
+          [b'print', b'"s"', b';']], None]
+
+
+def test_parse_stream_long_tokens():
+    """
+    Test that tokens and layout longer than the read-ahead are recognized
+    when they can't match a part of them.
+    """
+    grammar = r"""
+    S: V+;
+    V: str | num;
+
+    LAYOUT: LayoutItem*;
+    LayoutItem: WS | Comment;
+
+    terminals
+    str: /"[^"]*"/;
+    num: /\d+/;
+    WS: /\s+/;
+    Comment: /\/\*(.|\n)*?\*\//;
+    """
+    in_str = '1 "{}" /* {} */ 2 /* 3 */ 4'.format('x' * 1000, 'y\n' * 1000)
+    for kwargs in [{}, {'layout_actions': {'Comment': lambda _, v: v}}]:
+        parser = Parser(Grammar.from_string(grammar), **kwargs)
+        expected = parser.parse(in_str)
+        assert len(expected) == 4
+        assert parser.parse_stream(io.StringIO(in_str), chunk_size=16) == \
+            expected
+
+    # The input isn't read ahead for text which can't start a token.
+    in_str = '1 "x" 2 $ ' + '3 ' * 1000
+    stream = io.StringIO(in_str)
+    assert parser.parse_stream(stream, chunk_size=16) == \
+        parser.parse(in_str) == ['1', '"x"', '2']
+    assert stream.tell() < 100
@@ -3,7 +3,9 @@ from __future__ import unicode_literals
 import pytest  # noqa
 from parglare import Grammar, Parser, GLRParser, EMPTY, STOP
 from parglare.tables import first, follow, create_table, SHIFT, REDUCE
+from parglare.closure import LR_0
 from .expression_grammar import OPEN, ID, T, E, MULT, CLOSE, PLUS, get_grammar
+from .table_utils import table_sets
 
 
 def test_first():
@@ -53,6 +55,9 @@ def test_first_empty_in_rhs():
     # 'A' can derive empty, thus 'C' must be in firsts of 'S'.
     assert C in first_set[S]
 
+    # 'S' can't derive empty as 'C' is not nullable.
+    assert EMPTY not in first_set[S]
+
 
 def test_follow():
     """Tests FOLLOW function.
@@ -114,6 +119,50 @@ def test_table_construction():
     assert action.prod.prod_id == 4
 
 
+def test_lalr_dp_table_construction():
+    """
+    Tests that LALR tables with lookaheads calculated by DeRemer-Pennello
+    algorithm are the same as LALR tables calculated by follows propagation.
+    """
+
+    grammars = [
+        # From the Dragon Book. This grammar is not SLR(1).
+        r"""
+        S: L '=' R | R;
+        L: '*' R | 'id';
+        R: L;
+        """,
+        # Nullable non-terminals exercise `reads` and `includes` relations.
+        r"""
+        S: A B 'x' | 'c' S 'd' A | B C 'y';
+        A: 'a' | EMPTY;
+        B: 'b'*;
+        C: 'e' A;
+        """,
+        r"""
+        E: E '+' E {left, 1}
+         | E '*' E {left, 2}
+         | '(' E ')'
+         | number;
+
+        terminals
+        number: /\d+/;
+        """,
+    ]
+    for grammar in grammars:
+        g = Grammar.from_string(grammar)
+        table = create_table(g)
+        table_dp = create_table(g, lalr_dp=True)
+        assert table_sets(table, items=True) == \
+            table_sets(table_dp, items=True)
+        assert not table.rr_conflicts and not table_dp.rr_conflicts
+
+    # lalr_dp is ignored for SLR tables.
+    table = create_table(g, itemset_type=LR_0)
+    table_dp = create_table(g, itemset_type=LR_0, lalr_dp=True)
+    assert table_sets(table, items=True) == table_sets(table_dp, items=True)
+
+
 def test_associativity_conflicts_resolving():
     """
     Test that using associativity will resolve conflicts.
@@ -198,6 +247,25 @@ def test_prefer_shifts_no_sr_conflicts():
     assert result[0] == output
 
 
+def test_parser_table_stripped():
+    """
+    Test that LR items and first/follow sets are released after the parser
+    table construction if not in debug mode.
+    """
+    grammar = get_grammar()
+
+    for parser_class in [Parser, GLRParser]:
+        parser = parser_class(grammar)
+        assert parser.table.first_sets is None
+        assert parser.table.follow_sets is None
+        assert all(s.items is None for s in parser.table.states)
+        assert parser.parse('id + id * id')
+
+        parser = parser_class(grammar, debug=True)
+        assert parser.table.first_sets
+        assert all(s.items for s in parser.table.states)
+
+
 def test_prefer_shifts_over_empty_reductions():
     """
     Test strategy that will choose SHIFT when in conflict with EMPTY reduction.
@@ -2,9 +2,10 @@
 from __future__ import unicode_literals
 import pytest
 from os.path import join, dirname
-from parglare import Parser, Grammar
+from parglare import Parser, GLRParser, Grammar
 from .expression_grammar import get_grammar
 from parglare.exceptions import ParseError
+from parglare.parser import pos_to_line_col, Context
 
 
 def test_parsing():
@@ -19,6 +20,49 @@ def test_parsing_from_file():
     assert p.parse_file(join(dirname(__file__), 'parsing_from_file.txt'))
 
 
+@pytest.mark.parametrize('parser_class', [Parser, GLRParser])
+def test_parsing_from_file_mmap(parser_class):
+    grammar = get_grammar()
+    p = parser_class(grammar)
+    result = p.parse_file(join(dirname(__file__), 'parsing_from_file.txt'),
+                          mmap=True)
+    if parser_class is GLRParser:
+        result = result[0]
+    assert result == [[[b'id', b'+', b'id'], b'+', b'id'], b'+', b'id']
+
+    # The file is unmapped after parsing.
+    context = Context()
+    p.parse_file(join(dirname(__file__), 'parsing_from_file.txt'), mmap=True,
+                 context=context)
+    assert context.input_str.closed
+
+    # Location of the error is kept after unmapping.
+    with pytest.raises(ParseError) as e:
+        p.parse_file(join(dirname(__file__), 'parsing_errors.txt'),
+                     mmap=True)
+    assert e.value.location.line is not None
+
+
+def test_parsing_bytes():
+    g = Grammar.from_string(r"""
+    S: 'select' Names EOF;
+    Names: Name+[Comma];
+
+    terminals
+    Name: /[a-z]+\d*/;
+    Comma: ',';
+    """, ignore_case=True)
+    parser = Parser(g)
+    assert parser.parse(b'SELECT ab1,\n Cd') == \
+        [b'select', [b'ab1', b'Cd'], None]
+    assert pos_to_line_col(b'SELECT ab1,\n Cd', 13) == (2, 1)
+
+    with pytest.raises(ParseError) as e:
+        parser.parse(b'select ab,\n  1')
+    assert e.value.location.line == 2
+    assert e.value.location.column == 2
+
+
 def test_partial_parse():
     """
     Not giving EOF at the end of the sequence enables parsing of the beginning
@@ -46,3 +90,132 @@ def test_partial_parse():
     parser.parse('a b')
     with pytest.raises(ParseError):
         parser.parse('a b c')
+
+
+def test_parsing_fast_loop():
+    """
+    Test that the specialized LR loop gives the same results as the general
+    one.
+    """
+    grammar = get_grammar()
+    input_str = 'id + id * (id + id)\n* id'
+    for build_tree in [False, True]:
+        fast = Parser(grammar, build_tree=build_tree)
+        general = Parser(grammar, build_tree=build_tree)
+        general._fast = False
+        assert fast._fast
+        if build_tree:
+            assert fast.parse(input_str).tree_str() == \
+                general.parse(input_str).tree_str()
+        else:
+            assert fast.parse(input_str) == general.parse(input_str)
+        with pytest.raises(ParseError) as e:
+            fast.parse('id + * id')
+        with pytest.raises(ParseError) as e2:
+            general.parse('id + * id')
+        assert str(e.value) == str(e2.value)
+
+    assert not Parser(grammar, error_recovery=True)._fast
+
+    # Actions are prepared only for the states the parser reaches.
+    fast = Parser(grammar)
+    fast.parse('id')
+    built = [a for a in fast._state_actions.actions if a is not None]
+    assert 0 < len(built) < len(fast.table.states)
+
+    # The parse stack grows for deeply nested input.
+    input_str = '(' * 200 + 'id' + ' + id)' * 200
+    fast = Parser(grammar, build_tree=True)
+    general = Parser(grammar, build_tree=True)
+    general._fast = False
+    assert fast.parse(input_str).tree_str() == \
+        general.parse(input_str).tree_str()
+
+
+@pytest.mark.parametrize('compact_table', [False, True])
+def test_default_reductions(compact_table):
+    """
+    Test that the states whose only action is a reduction by a single
+    production reduce without recognizing the lookahead token.
+    """
+    g = Grammar.from_string(r"""
+    Program: Stmt+ EOF;
+    Stmt: 'a' ';' | 'b' Opt ';';
+    Opt: 'c' | EMPTY;
+    """)
+    stmts = []
+    parser = Parser(g, actions={'Stmt': lambda _, nodes: stmts.append(nodes)},
+                    compact_table=compact_table)
+    table = Parser(g).table
+    defaults = [str(s.default_reduction) for s in table.states
+                if s.default_reduction]
+    # Empty reduction of Opt is not the default one.
+    assert len(defaults) == 6
+    assert '4: Opt = c' in defaults
+    assert '2: Stmt = a ;' in defaults
+
+    parser.parse('a; b c; b;')
+    assert len(stmts) == 3
+
+    # Statement is reduced before the invalid token is found.
+    del stmts[:]
+    with pytest.raises(ParseError) as e:
+        parser.parse('a; b c; $')
+    assert len(stmts) == 2
+    assert e.value.location.start_position == 8
+
+
+def test_skip_unit_reductions():
+    """
+    Test that reductions by unit productions without actions are done in place
+    and that the results and trees are the same.
+    """
+    grammar = Grammar.from_string("""
+    E: E '+' T | T;
+    T: T '*' F | F;
+    F: '(' E ')' | 'id';
+    """)
+    input_str = 'id + id * (id + id)\n* id'
+    reductions = []
+
+    def count_reductions(parser):
+        def counting(production, reduce_action):
+            def counting_reduce_action(context, subresults):
+                reductions.append(production)
+                return reduce_action(context, subresults)
+            return counting_reduce_action
+        parser._reduce_actions = [
+            counting(p, a) for p, a in zip(grammar.productions,
+                                           parser._reduce_actions)]
+        parser._reductions = [
+            (action, p, length, a) for (action, p, length, _), a
+            in zip(parser._reductions, parser._reduce_actions)]
+        return parser
+
+    for kwargs in [{'build_tree': True}, {'build_tree': True,
+                                          'lazy_values': True}]:
+        parser = Parser(grammar, **kwargs)
+        skipping = Parser(grammar, skip_unit_reductions=True, **kwargs)
+        assert skipping.parse(input_str).tree_str() == \
+            parser.parse(input_str).tree_str()
+
+    parser = count_reductions(Parser(grammar, build_tree=True))
+    result = parser.parse(input_str)
+    count = len(reductions)
+    del reductions[:]
+    skipping = count_reductions(
+        Parser(grammar, build_tree=True, skip_unit_reductions=True))
+    assert skipping.parse(input_str).tree_str() == result.tree_str()
+    # Nodes of unit productions are built in place.
+    assert len(reductions) == count
+
+    actions = {'E': [lambda _, nodes: '{}+{}'.format(nodes[0], nodes[2]),
+                     lambda _, nodes: 'E({})'.format(nodes[0])]}
+    parser = Parser(grammar, actions=actions)
+    skipping = Parser(grammar, actions=actions, skip_unit_reductions=True)
+    assert skipping.parse(input_str) == parser.parse(input_str)
+    # Only `T: F` and `F: 'id'` have no actions.
+    units = set()
+    for unit in skipping._state_actions.unit_reductions:
+        units.update(unit.values() if type(unit) is dict else [unit])
+    assert set(str(p) for p in units if p) == set(['4: T = F', '6: F = id'])
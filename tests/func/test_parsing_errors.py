@@ -2,7 +2,8 @@
 from __future__ import unicode_literals
 import pytest  # noqa
 import os
-from parglare.parser import Parser
+from parglare.parser import Parser, pos_to_line_col, pos_to_line_cols
+from parglare.common import LineStarts
 from parglare.exceptions import ParseError
 from .expression_grammar import get_grammar
 
@@ -90,3 +91,43 @@ def test_file_name():
         p.parse_file(input_file)
     except ParseError as e:
         assert 'parsing_errors.txt' in str(e)
+
+
+def test_pos_to_line_col():
+    input_str = 'id + id\n\n+ id\nid'
+    positions = [0, 3, 7, 8, 9, 12, 14, 16]
+    expected = [(1, 0), (1, 3), (1, 7), (2, 0), (3, 0), (3, 3), (4, 0),
+                (4, 2)]
+    assert [pos_to_line_col(input_str, p) for p in positions] == expected
+    assert pos_to_line_cols(input_str, positions) == expected
+    assert pos_to_line_cols(input_str.encode('utf-8'), positions) == expected
+    assert pos_to_line_cols(list(input_str), [3, 9]) == [(1, 3), (1, 9)]
+
+    # Line starts of a long input are found as far as needed and kept in the
+    # index given by the caller.
+    input_str = 'id + id\n' * 10000
+    line_starts = LineStarts(input_str)
+    assert pos_to_line_col(input_str, 8, line_starts) == (2, 0)
+    assert len(line_starts.starts(0)) < 1000
+    assert pos_to_line_col(input_str, 79995, line_starts) == (10000, 3)
+    assert len(line_starts.starts(0)) == 10000
+    assert pos_to_line_cols(input_str, [8, 79995], line_starts) == \
+        [(2, 0), (10000, 3)]
+    # Index of other input is not used.
+    assert pos_to_line_col('a\nb', 2, line_starts) == (2, 0)
+
+
+def test_error_recovery_error_str():
+    grammar = get_grammar()
+    p = Parser(grammar, error_recovery=True)
+    p.parse('id+id\n*+id')
+    assert len(p.errors) == 1
+    assert str(p.errors[0]) == \
+        'Unexpected input at position (2, 1). Expected: ( or id'
+
+    # Errors of the input share the line start index of the parse context.
+    p.parse('id+id\n*+id\n*+id')
+    assert len(p.errors) == 2
+    assert p.errors[0].line_starts is p.errors[1].line_starts
+    assert str(p.errors[1]) == \
+        'Unexpected input at position (3, 1). Expected: ( or id'
@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+"""
+Test parsing of the input tokenized in advance.
+"""
+from __future__ import unicode_literals
+import pytest
+from parglare import Grammar, Parser, GLRParser, ParseError, TokenStream
+from parglare.exceptions import ParserInitError
+from parglare.tables import create_table
+
+grammar = r"""
+Program: Stmt+ EOF;
+Stmt: ID '=' Expr ';' | '@' Expr ';';
+Expr: Expr '+' Expr {left} | Expr '++' | '(' Expr ')' | NUM | ID | STR;
+
+LAYOUT: LayoutItem*;
+LayoutItem: WS | Comment;
+
+terminals
+ID: /[a-z_]\w*/;
+NUM: /\d+(\.\d+)?/;
+STR: /"[^"]*"/;
+WS: /\s+/;
+Comment: /\/\/.*/;
+"""
+
+input_str = """
+a = 1 + (b + 2.5); // Comment
+@ "x" + a++;
+"""
+
+
+@pytest.mark.parametrize('parser_class, kwargs', [
+    (Parser, {}), (Parser, {'compact_table': True}),
+    (Parser, {'build_tree': True}), (GLRParser, {})])
+def test_pretokenization_parse(parser_class, kwargs):
+    g = Grammar.from_string(grammar)
+    parser = parser_class(g, lexer='pre', **kwargs)
+    result = parser.parse(input_str)
+    expected = parser_class(g, **kwargs).parse(input_str)
+    if kwargs.get('build_tree'):
+        assert result.tree_str() == expected.tree_str()
+    else:
+        assert result == expected
+
+    for in_str in ['a = 1 +;', 'a = 1;\n$', 'a = "x;', '']:
+        with pytest.raises(ParseError) as e:
+            parser.parse(in_str)
+        with pytest.raises(ParseError) as expected_e:
+            parser_class(g, **kwargs).parse(in_str)
+        assert e.value.location.start_position == \
+            expected_e.value.location.start_position
+
+
+def test_token_stream():
+    parser = Parser(Grammar.from_string(grammar), lexer='pre')
+    tokens = parser.tokenize(input_str)
+    assert isinstance(tokens, TokenStream)
+    assert [(t.symbol.name, t.value) for t in tokens] == [
+        ('ID', 'a'), ('=', '='), ('NUM', '1'), ('+', '+'), ('(', '('),
+        ('ID', 'b'), ('+', '+'), ('NUM', '2.5'), (')', ')'), (';', ';'),
+        ('@', '@'), ('STR', '"x"'), ('+', '+'), ('ID', 'a'), ('++', '++'),
+        (';', ';')]
+    assert tokens.starts[:3].tolist() == [1, 3, 5]
+    assert tokens.ends[:3].tolist() == [2, 4, 6]
+    assert parser.parse(tokens) == parser.parse(input_str)
+
+    # The stream ends at the invalid input.
+    tokens = parser.tokenize('a = $1;')
+    assert len(tokens) == 2
+    assert tokens.starts[-1] == 4
+
+
+def test_token_stream_start_productions():
+    """
+    Test that the token stream is parsed by parsers for different start
+    productions sharing the table.
+    """
+    g = Grammar.from_string(grammar)
+    program = g.get_production_id('Program')
+    expr = g.get_production_id('Expr')
+    table = create_table(g, start_productions=[program, expr],
+                         prefer_shifts=True)
+    program_parser = Parser(g, table=table, lexer='pre')
+    expr_parser = Parser(g, start_production=expr, table=table, lexer='pre')
+
+    tokens = expr_parser.tokenize('1 + a++ // Comment')
+    assert expr_parser.parse(tokens) == \
+        Parser(g, start_production=expr).parse('1 + a++ // Comment')
+    with pytest.raises(ParseError):
+        program_parser.parse(tokens)
+
+    # Parser with other terminals can't parse the stream.
+    with pytest.raises(ParserInitError):
+        Parser(g, start_production=expr, lexer='pre').parse(tokens)
+
+
+def test_pretokenization_terminals_check():
+    """
+    Test that the parser construction fails if tokens may depend on the parser
+    state.
+    """
+    g = Grammar.from_string(r"""
+    S: 'print' ID | ID '=' ID;
+
+    terminals
+    ID: /[a-z]+/;
+    """)
+    with pytest.raises(ParserInitError) as e:
+        Parser(g, lexer='pre')
+    assert '"ID" and "print"' in str(e.value)
+
+    # Terminals starting differently may be expected in different states.
+    g = Grammar.from_string(r"""
+    S: '!' ID | ID '=' NUM;
+
+    terminals
+    ID: /[a-z]+/;
+    NUM: /\d+/;
+    """)
+    parser = Parser(g, lexer='pre', ws=' ')
+    assert parser.parse('x = 42') == ['x', '=', '42']
+    with pytest.raises(ParserInitError):
+        Parser(g, lexer='pre', ws=' ', lazy_table=True)
+    with pytest.raises(ParserInitError):
+        Parser(g, lexer='pleasant')
+    with pytest.raises(ParserInitError):
+        Parser(g).tokenize('x = 42')
+
+
+def test_pretokenization_ignore_case_and_ambiguity():
+    g = Grammar.from_string(r"""
+    S: Item+;
+    Item: 'x' Num | 'y' Num;
+    Num: NUM | FLOAT;
+
+    terminals
+    NUM: /[0-9]+\.?/;
+    FLOAT: /[0-9]+\.[0-9]*/;
+    """, ignore_case=True)
+    parser = Parser(g, lexer='pre')
+    assert parser.parse('X 1 Y 2.5') == [['x', '1'], ['y', '2.5']]
+
+    with pytest.raises(ParseError) as e:
+        parser.tokenize('y 2.')
+    assert 'disambiguate' in str(e.value)
@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+"""
+Test token recognition by scanners combining terminal recognizers.
+"""
+from __future__ import unicode_literals
+import pytest
+from parglare import Grammar, Parser, GLRParser, ParseError
+from parglare.grammar import StringRecognizer, RegExRecognizer
+from parglare.parser import Scanner
+from parglare.tables import create_table
+
+grammar = r"""
+Program: Stmt+;
+Stmt: ID '=' Expr ';' | 'print' Expr ';';
+Expr: Expr '+' Expr {left} | Expr '++' | NUM | FLOAT | ID | QUOTED;
+
+terminals
+ID: /[a-zA-Z_]\w*/;
+NUM: /\d+/;
+FLOAT: /\d+\.\d+/ {prefer};
+QUOTED: /(['"]).*?\1/;
+"""
+
+input_str = """
+a = 1 + 2.5;
+print "a'b" + 'c' + a++;
+b = a1 + 10;
+"""
+
+
+def recognize(terminals, finish_flags, input_str, position):
+    """
+    Recognizes tokens by trying terminal recognizers one at a time.
+    """
+    parser = Parser.__new__(Parser)
+    return parser._token_recognition(input_str, position, terminals,
+                                     finish_flags)
+
+
+def test_scanner_same_as_recognizers():
+    table = create_table(Grammar.from_string(grammar))
+    for state in table.states:
+        scanner = Scanner(state.actions, state.finish_flags)
+        for position in range(len(input_str)):
+            assert [(t.symbol, t.value)
+                    for t in scanner.scan(input_str, position)] \
+                == [(t.symbol, t.value)
+                    for t in recognize(list(state.actions),
+                                       state.finish_flags, input_str,
+                                       position)]
+
+
+@pytest.mark.parametrize('parser_class', [Parser, GLRParser])
+def test_scanner_parse(parser_class):
+    g = Grammar.from_string(grammar)
+    parser = parser_class(g)
+    result = parser.parse(input_str)
+    assert result
+    # States with the same expected terminals share the scanner.
+    scanners = set(id(s.scanner) for s in parser.table.states
+                   if s.scanner is not None)
+    assert 0 < len(scanners) < len(parser.table.states)
+
+
+def test_scanner_compact_table():
+    g = Grammar.from_string(grammar)
+    assert Parser(g, compact_table=True).parse(input_str) == \
+        Parser(g).parse(input_str)
+
+
+def test_scanner_priorities_and_finish_flags():
+    g = Grammar.from_string(r"""
+    S: A | B | C;
+    A: 'a' HIGH;
+    B: 'a' LOW;
+    C: 'a' 'abc';
+
+    terminals
+    HIGH: /ab/ {15};
+    LOW: /abcd/;
+    """)
+    table = create_table(g)
+    state = table.states[0].actions[g.get_terminal('a')][0].state
+    terminals = list(state.actions)
+    assert [t.name for t in terminals] == ['HIGH', 'abc', 'LOW']
+    scanner = Scanner(terminals, state.finish_flags)
+
+    # Terminals with lower priority are not tried if a terminal with higher
+    # priority is recognized.
+    assert [(t.symbol.name, t.value) for t in scanner.scan('abcd', 0)] == \
+        [('HIGH', 'ab')]
+    assert [(t.symbol.name, t.value) for t in scanner.scan('abxd', 0)] == \
+        [('HIGH', 'ab')]
+
+    # Finish flag of string recognizer stops recognition.
+    scanner = Scanner(terminals[1:], state.finish_flags[1:])
+    assert [(t.symbol.name, t.value) for t in scanner.scan('abcd', 0)] == \
+        [('abc', 'abc')]
+    assert [(t.symbol.name, t.value) for t in scanner.scan('abxabcd', 3)] \
+        == [('abc', 'abc')]
+
+
+def test_scanner_ignore_case():
+    g = Grammar.from_string(r"""
+    S: 'select' Name;
+
+    terminals
+    Name: /[a-z]+/;
+    """, ignore_case=True)
+    parser = Parser(g)
+    assert parser.parse('SELECT Abc') == ['select', 'Abc']
+
+    # Characters equal when ignoring case in regexes but not when lowered.
+    with pytest.raises(ParseError):
+        parser.parse('\u017fELECT Abc')
+
+
+def test_scanner_custom_recognizers():
+    """
+    Test that custom recognizers are called between combined recognizers.
+    """
+    calls = []
+
+    def even(input_str, pos):
+        calls.append(pos)
+        digits = ''
+        while pos < len(input_str) and input_str[pos] in '02468':
+            digits += input_str[pos]
+            pos += 1
+        return digits
+
+    g = Grammar.from_string(r"""
+    S: Item+;
+    Item: 'a' | Even | NUM;
+
+    terminals
+    Even: {15};
+    NUM: /\d+/;
+    """, recognizers={'Even': even})
+    parser = Parser(g, ws=' ')
+    assert parser.parse('a 24 a 13') == ['a', '24', 'a', '13']
+    assert calls
+
+
+def test_recognizers_first_chars():
+    assert StringRecognizer('if').first_chars() == (frozenset('i'), False)
+    assert StringRecognizer('if', ignore_case=True).first_chars() == \
+        (frozenset('iI\u0130\u0131'), False)
+    assert StringRecognizer('\u03bb', ignore_case=True).first_chars() == \
+        (frozenset('\u03bb\u039b'), True)
+
+    def first_chars(regex, **kwargs):
+        return RegExRecognizer(regex, **kwargs).first_chars()
+
+    assert first_chars(r'[a-c_]\w*') == (frozenset('abc_'), False)
+    assert first_chars(r'\d+') == (frozenset('0123456789'), True)
+    assert first_chars(r'-?\d+|\+') == (frozenset('-+0123456789'), True)
+    assert first_chars(r'(?:a|b?)*c') == (frozenset('abc'), False)
+    assert first_chars(r'\bab') == (frozenset('a'), False)
+    assert first_chars(r'ab', ignore_case=True) == (frozenset('aA'), False)
+    assert first_chars(r'[0-9s]', ignore_case=True) == \
+        (frozenset('0123456789sS\u017f'), False)
+    assert first_chars(r'.') is None
+    assert first_chars(r'(a)\1') == (frozenset('a'), False)
+
+
+def test_scanner_first_char_dispatch():
+    table = create_table(Grammar.from_string(grammar))
+    state = table.states[0].actions[
+        table.grammar.get_terminal('print')][0].state
+    scanner = Scanner(state.actions, state.finish_flags)
+    assert scanner.scan('a1', 0)[0].symbol.name == 'ID'
+    assert scanner.scan('b', 0)[0].symbol.name == 'ID'
+    assert scanner.scan('"a"', 0)[0].symbol.name == 'QUOTED'
+    assert scanner.scan('1', 0)[0].symbol.name == 'NUM'
+    assert scanner.scan('+', 0) == []
+
+    # Characters which may start tokens of the same terminals share the
+    # scanner.
+    assert scanner._dispatch['a'] is scanner._dispatch['b']
+    assert [t.name for t in scanner._dispatch['a'].terminals] == ['ID']
+    assert [t.name for t in scanner._dispatch['1'].terminals] == \
+        ['NUM', 'FLOAT']
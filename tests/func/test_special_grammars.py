@@ -4,7 +4,7 @@ Test non-deterministic parsing.
 """
 from __future__ import unicode_literals
 import pytest  # noqa
-from parglare import Parser, GLRParser, Grammar, SLR, LALR
+from parglare import Parser, GLRParser, Grammar, SLR, LALR, LALR_DP
 from parglare.exceptions import ParseError, SRConflicts, RRConflicts
 
 
@@ -47,6 +47,7 @@ def test_slr_conflict():
         Parser(grammar, tables=SLR, prefer_shifts=False)
 
     Parser(grammar, tables=LALR, prefer_shifts=False)
+    Parser(grammar, tables=LALR_DP, prefer_shifts=False)
 
 
 def test_lalr_reduce_reduce_conflict():
@@ -65,6 +66,7 @@ def test_lalr_reduce_reduce_conflict():
     """
     grammar = Grammar.from_string(grammar)
     Parser(grammar)
+    Parser(grammar, tables=LALR_DP)
 
 
 def test_nondeterministic_LR_raise_error():
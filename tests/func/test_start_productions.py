@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""
+Test LR tables with multiple start productions shared between parsers.
+"""
+from __future__ import unicode_literals
+import pytest
+from parglare import Grammar, Parser, GLRParser
+from parglare.exceptions import ParserInitError, SRConflicts
+from parglare.tables import create_table
+
+grammar = r"""
+Program: Stmt+;
+Stmt: ID '=' Expr ';';
+Expr: Expr '+' Term | Term;
+Term: ID | NUM | '(' Expr ')';
+
+LAYOUT: LayoutItem | LAYOUT LayoutItem;
+LayoutItem: WS | Comment | EMPTY;
+
+terminals
+ID: /[a-zA-Z_]\w*/;
+NUM: /\d+/;
+WS: /\s+/;
+Comment: /\/\/.*/;
+"""
+
+input_str = """
+a = 1 + b; // Comment
+c = (a + 2);
+"""
+
+
+def test_create_table_start_productions():
+    g = Grammar.from_string(grammar)
+    program = g.get_production_id('Program')
+    expr = g.get_production_id('Expr')
+    term = g.get_production_id('Term')
+    table = create_table(g, start_productions=[program, expr, term,
+                                               expr + 1])
+
+    assert list(table.start_states) == [program, expr, term, expr + 1]
+    assert table.start_states[program] is table.states[0]
+    # Start productions of the same non-terminal share the start state.
+    assert table.start_states[expr] is table.start_states[expr + 1]
+
+    for start_production, in_str in [(program, input_str),
+                                     (expr, '1 + (2 + a)'),
+                                     (term, '(2 + a)')]:
+        parser = Parser(g, start_production=start_production, table=table)
+        assert parser.table is table
+        assert parser.parse(in_str) == \
+            Parser(g, start_production=start_production).parse(in_str)
+
+    stmt = g.get_production_id('Stmt')
+    with pytest.raises(ParserInitError):
+        Parser(g, start_production=stmt, table=table)
+
+
+@pytest.mark.parametrize('kwargs', [{}, {'compact_table': True},
+                                    {'lazy_table': True}])
+def test_layout_parser_shares_table(kwargs):
+    g = Grammar.from_string(grammar)
+    parser = Parser(g, **kwargs)
+    assert parser.layout_parser.table is parser.table
+    assert len(parser.table.start_states) == 2
+    assert parser.parse(input_str) == [
+        ['a', '=', ['1', '+', 'b'], ';'], ['c', '=', ['(', ['a', '+', '2'],
+                                                      ')'], ';']]
+
+
+def test_layout_parser_own_table():
+    """
+    Test that the layout parser builds its own table if the main table is
+    built with different parameters.
+    """
+    g = Grammar.from_string(grammar)
+    parser = GLRParser(g)
+    assert parser.layout_parser.table is not parser.table
+    assert len(parser.table.start_states) == 1
+    assert len(parser.parse(input_str)) == 1
+
+
+def test_layout_parser_shared_table_cache(tmpdir):
+    g = Grammar.from_string(grammar)
+    Parser(g, table_cache=str(tmpdir))
+    assert len(tmpdir.listdir()) == 1
+
+    parser = Parser(Grammar.from_string(grammar), table_cache=str(tmpdir))
+    assert parser.layout_parser.table is parser.table
+    assert len(parser.table.start_states) == 2
+    assert len(parser.parse(input_str)) == 2
+
+
+def test_start_productions_conflicts():
+    """
+    Test that parsers check only conflicts of the states reachable from their
+    start state.
+    """
+    g = Grammar.from_string("""
+    S: A | B;
+    A: A '+' A | 'a';
+    B: 'b' '+' 'b';
+    """)
+    table = create_table(g, start_productions=[g.get_production_id('A'),
+                                               g.get_production_id('B')])
+    assert table.sr_conflicts
+
+    with pytest.raises(SRConflicts):
+        Parser(g, start_production=g.get_production_id('A'), table=table,
+               prefer_shifts=False)
+    parser = Parser(g, start_production=g.get_production_id('B'),
+                    table=table, prefer_shifts=False)
+    assert parser.parse('b + b') == ['b', '+', 'b']
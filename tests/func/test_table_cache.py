@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""
+Test persisting of LR tables.
+"""
+from __future__ import unicode_literals
+import os
+import pytest  # noqa
+import parglare.persist
+from parglare import Grammar, Parser, GLRParser
+from parglare.persist import grammar_fingerprint, table_file_name
+from .table_utils import table_sets
+
+grammar_str = r"""
+E: E '+' E {left, 1}
+ | E '*' E {left, 2}
+ | '(' E ')'
+ | number;
+
+terminals
+number: /\d+(\.\d+)?/;
+"""
+
+ambiguous_grammar_str = r"""
+E: E '+' E | E '*' E | '(' E ')' | number;
+
+terminals
+number: /\d+(\.\d+)?/;
+"""
+
+
+def test_table_cache_dir(tmpdir):
+    cache_dir = str(tmpdir.join('cache'))
+    g = Grammar.from_string(grammar_str)
+    parser = Parser(g, table_cache=cache_dir)
+
+    file_name = table_file_name(g, cache_dir)
+    assert os.path.exists(file_name)
+    assert os.path.basename(file_name) \
+        == '{}.pgt'.format(grammar_fingerprint(g))
+
+    g2 = Grammar.from_string(grammar_str)
+    parser2 = Parser(g2, table_cache=cache_dir)
+
+    assert table_sets(parser.table, ordered=True) == \
+        table_sets(parser2.table, ordered=True)
+    assert parser2.parse('1 + 2 * (3 + 4)') \
+        == parser.parse('1 + 2 * (3 + 4)')
+
+
+def test_table_loaded_from_cache(tmpdir, monkeypatch):
+    cache_dir = str(tmpdir)
+    Parser(Grammar.from_string(grammar_str), table_cache=cache_dir)
+
+    def create_table(*args, **kwargs):
+        assert False, 'Table should be loaded from the cache.'
+    monkeypatch.setattr(parglare.persist, 'create_table', create_table)
+
+    parser = Parser(Grammar.from_string(grammar_str), table_cache=cache_dir)
+    assert parser.parse('2 * 3 + 4') == [['2', '*', '3'], '+', '4']
+
+
+def test_table_cache_beside_grammar_file(tmpdir):
+    grammar_file = tmpdir.join('calc.pg')
+    grammar_file.write(grammar_str)
+
+    g = Grammar.from_file(str(grammar_file))
+    Parser(g, table_cache=True)
+    assert tmpdir.join('calc.pgt').check()
+
+    # Grammars from strings are not cached when cache folder is not given.
+    g = Grammar.from_string(grammar_str)
+    assert table_file_name(g, True) is None
+    Parser(g, table_cache=True)
+
+
+def test_stale_table_is_rebuilt(tmpdir, monkeypatch):
+    grammar_file = tmpdir.join('calc.pg')
+    grammar_file.write(grammar_str)
+    Parser(Grammar.from_file(str(grammar_file)), table_cache=True)
+
+    # Change priorities. Fingerprint must change and table must be rebuilt.
+    grammar_file.write(grammar_str.replace('{left, 2}', '{left, 1}'))
+    g = Grammar.from_file(str(grammar_file))
+
+    created = []
+    create_table = parglare.persist.create_table
+
+    def create_table_spy(*args, **kwargs):
+        created.append(True)
+        return create_table(*args, **kwargs)
+    monkeypatch.setattr(parglare.persist, 'create_table', create_table_spy)
+
+    parser = Parser(g, table_cache=True)
+    assert created
+    assert parser.parse('2 * 3 + 4') == [['2', '*', '3'], '+', '4']
+    assert parser.parse('2 + 3 * 4') == [['2', '+', '3'], '*', '4']
+
+    del created[:]
+    Parser(Grammar.from_file(str(grammar_file)), table_cache=True)
+    assert not created
+
+
+def test_table_cache_multiple_parsers(tmpdir):
+    """
+    Tables of LR and GLR parser for the same grammar are built with different
+    parameters and both are kept in the table file.
+    """
+    cache_dir = str(tmpdir)
+    g = Grammar.from_string(ambiguous_grammar_str)
+    glr_parser = GLRParser(g, table_cache=cache_dir)
+    lr_parser = Parser(g, table_cache=cache_dir, prefer_shifts=True)
+    assert len(os.listdir(cache_dir)) == 1
+
+    g = Grammar.from_string(ambiguous_grammar_str)
+    glr_parser2 = GLRParser(g, table_cache=cache_dir)
+    lr_parser2 = Parser(g, table_cache=cache_dir, prefer_shifts=True)
+
+    assert table_sets(glr_parser.table, ordered=True) == \
+        table_sets(glr_parser2.table, ordered=True)
+    assert table_sets(lr_parser.table, ordered=True) == \
+        table_sets(lr_parser2.table, ordered=True)
+    assert table_sets(glr_parser.table, ordered=True) != \
+        table_sets(lr_parser.table, ordered=True)
+
+    # Conflicts are recalculated on load.
+    assert len(glr_parser2.table.sr_conflicts) \
+        == len(glr_parser.table.sr_conflicts) > 0
+
+    assert len(glr_parser2.parse('1 + 2 * 3 + 4')) == 5
+
+
+def test_table_cache_layout(tmpdir):
+    """
+    Test that layout sub-parser table is cached too.
+    """
+    grammar = r"""
+    S: 'a'+;
+    LAYOUT: LayoutItem*;
+    LayoutItem: WS | Comment;
+
+    terminals
+    WS: /\s+/;
+    Comment: /\/\/.*/;
+    """
+    cache_dir = str(tmpdir)
+    Parser(Grammar.from_string(grammar), table_cache=cache_dir)
+    parser = Parser(Grammar.from_string(grammar), table_cache=cache_dir)
+    assert parser.layout_parser.table.states
+    assert parser.parse('a a // comment\n a') == ['a', 'a', 'a']
+
+
+def test_corrupted_table_file(tmpdir):
+    grammar_file = tmpdir.join('calc.pg')
+    grammar_file.write(grammar_str)
+    tmpdir.join('calc.pgt').write('{"fingerprint": ')
+
+    parser = Parser(Grammar.from_file(str(grammar_file)), table_cache=True)
+    assert parser.parse('1 + 2') == ['1', '+', '2']
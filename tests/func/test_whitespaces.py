@@ -45,3 +45,16 @@ def test_whitespace_not_used_if_layout():
     parser = Parser(g)
     with pytest.raises(ParseError):
         parser.parse('a b')
+
+
+def test_whitespace_regex_special_chars():
+    """
+    Test that whitespace characters are not interpreted as regex.
+    """
+    grammar = """
+    S: 'a'+ EOF;
+    """
+    parser = Parser(Grammar.from_string(grammar), ws='-]^\\')
+    assert parser.parse('-a]a^\\a-') == [['a', 'a', 'a'], None]
+    with pytest.raises(ParseError):
+        parser.parse('a a')
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+#######################################################################
+# Testing LR table construction speed on synthetic grammars of
+#   increasing size.
+#######################################################################
+from __future__ import print_function, unicode_literals
+
+import time
+from parglare import Grammar
+from parglare.tables import create_table
+
+
+def synthetic_grammar(size):
+    """
+    Returns a grammar string of a statement-based language with `size` kinds
+    of statements. Each kind of statement contributes a constant number of LR
+    states so the number of states grows linearly with the `size`.
+    """
+    rules = ['Program: Stmt+;',
+             'Stmt: {};'.format(' | '.join(['Stmt{}'.format(i)
+                                           for i in range(size)]))]
+    for i in range(size):
+        rules.append(
+            "Stmt{0}: 'kw{0}' ID '=' Expr ';' "
+            "| 'kw{0}' '(' Expr ')' Block "
+            "| 'kw{0}' ID '(' Args? ')' ';';".format(i))
+    rules.extend([
+        "Block: '{' Stmt* '}';",
+        "Args: Expr+[Comma];",
+        "Expr: Expr '+' Term | Expr '-' Term | Term;",
+        "Term: Term '*' Factor | Term '/' Factor | Factor;",
+        "Factor: ID | NUM | '(' Expr ')';",
+        "terminals",
+        "ID: /[a-zA-Z_]\\w*/;",
+        "NUM: /\\d+/;",
+        "Comma: ',';",
+    ])
+    return '\n'.join(rules)
+
+
+def timeit(size, **kwargs):
+    g = Grammar.from_string(synthetic_grammar(size))
+    t_start = time.time()
+    table = create_table(g, **kwargs)
+    t_end = time.time()
+    print('Size: {:5d}  States: {:6d}  Elapsed time: {:.2f} sec'
+          .format(size, len(table.states), t_end - t_start))
+
+
+def run_tests(**kwargs):
+    for size in [25, 50, 100, 200, 400]:
+        timeit(size, **kwargs)
+
+
+if __name__ == '__main__':
+    print('LALR')
+    run_tests()
+    print('LALR (DeRemer-Pennello lookaheads)')
+    run_tests(lalr_dp=True)